@@ -0,0 +1,357 @@
+"""Benchmarks for Textra's editor hot paths.
+
+Drives a real TextEditor (under Xvfb when there is no display; --withdrawn keeps the
+window unmapped) through generated workloads and records latency percentiles and the
+peak RSS of each operation (of the whole process so far where the peak can't be reset,
+i.e. outside Linux):
+
+    python benchmarks/bench_textra.py                      # 1 MB workloads
+    python benchmarks/bench_textra.py --sizes 1MB,64MB,500MB
+    python benchmarks/bench_textra.py --write-baseline     # store the results as the baseline
+    python benchmarks/bench_textra.py --tolerance 0.2      # fail if p50 regresses by more than 20%
+
+Results are compared against benchmarks/baseline.json when it exists. The baseline is
+machine specific, so record it on the machine the comparison runs on.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+import textra # Importing does no I/O; settings are loaded in main() from the scratch directory
+
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+# --- Workloads ---
+def parse_size(text):
+    text = text.strip().upper()
+    for unit, factor in UNITS.items():
+        if text.endswith(unit): return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def size_label(size):
+    for unit in ("GB", "MB", "KB"):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0: return f"{size // UNITS[unit]}{unit}"
+    return f"{size}B"
+
+def write_sized(path, size, next_chunk):
+    # Writes generated chunks until the file reaches size bytes
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        while written < size:
+            chunk = next_chunk()[:size - written]
+            f.write(chunk)
+            written += len(chunk)
+    return path
+
+def code_file(path, size, rnd):
+    counter = iter(range(1 << 62))
+    def next_chunk():
+        i = next(counter)
+        return (f"def handler_{i}(self, value, items=({i}, {rnd.randint(0, 999)})):\n"
+                f"    result = [foo(x) for x in items if x > value]  # foo {i}\n"
+                f"    return {{'id': {i}, 'result': result}}\n\n")
+    return write_sized(path, size, next_chunk)
+
+def long_line_file(path, size, rnd):
+    # Minified JSON: one line, no newline until the very end
+    counter = iter(range(1 << 62))
+    state = {"first": True}
+    def next_chunk():
+        i = next(counter)
+        prefix = '{"items":[' if state.pop("first", False) else ","
+        return f'{prefix}{{"id":{i},"name":"foo{i}","tags":["a","b"],"score":{rnd.random():.4f}}}'
+    return write_sized(path, size, next_chunk)
+
+def nested_file(path, size, rnd, depth=200):
+    def next_chunk():
+        inner = rnd.choice(("foo", "bar", "baz"))
+        return "".join("(" if i % 2 else "[" for i in range(depth)) + inner + \
+               "".join("]" if i % 2 else ")" for i in reversed(range(depth))) + "\n"
+    return write_sized(path, size, next_chunk)
+
+
+# --- Measurement ---
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+def reset_peak_rss():
+    """Restarts the peak RSS high-water mark (Linux only) so the next reading covers a single
+    operation. Returns False where it can't be reset and peaks are for the whole process."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return round(int(line.split()[1]) / 1024, 1) # kB
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError: # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1) # Bytes on macOS, KB elsewhere
+
+
+class Bench:
+    def __init__(self, root, editor, repeat):
+        self.root = root
+        self.editor = editor
+        self.repeat = repeat
+        self.results = {}
+        self.per_operation_rss = reset_peak_rss()
+
+    def pump(self, condition=lambda: False, timeout=600.0):
+        # Runs the Tk event loop until condition() holds (or once, by default)
+        deadline = time.perf_counter() + timeout
+        while True:
+            self.root.update()
+            if condition() or time.perf_counter() > deadline: return
+            time.sleep(0.001)
+
+    def record(self, name, samples):
+        self.results[name] = {
+            "n": len(samples),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "p90_ms": round(percentile(samples, 0.90) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            "max_ms": round(max(samples) * 1000, 3),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        print(f"  {name:<44}p50 {self.results[name]['p50_ms']:>10.3f} ms   "
+              f"p99 {self.results[name]['p99_ms']:>10.3f} ms")
+
+    def time_call(self, fn, iterations=None, setup=None):
+        reset_peak_rss()
+        samples = []
+        for _ in range(iterations or self.repeat):
+            if setup: setup()
+            started = time.perf_counter()
+            fn()
+            self.root.update_idletasks() # Include the layout and redraw the call caused
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    # --- Operations ---
+    def open_file(self, path):
+        """Opens path and waits until it is fully loaded; returns (seconds, text area)."""
+        editor = self.editor
+        started = time.perf_counter()
+        editor.open_file(filepath=path)
+        text_area = editor.get_current_text_area()
+        viewer = getattr(text_area, 'viewer', None)
+        if viewer is not None: self.pump(lambda: viewer.index_complete)
+        else: self.pump(lambda: not editor.is_loading(text_area))
+        return time.perf_counter() - started, text_area
+
+    def close_current(self):
+        self.editor.close_current_tab()
+        self.pump()
+
+    def bench_open(self, name, path):
+        reset_peak_rss()
+        samples = []
+        for _ in range(max(self.repeat // 5, 1)):
+            seconds, _ = self.open_file(path)
+            samples.append(seconds)
+            self.close_current()
+        self.record(f"{name}/open_file", samples)
+
+    def bench_file(self, name, path, find_term="foo"):
+        print(f"{name}:")
+        self.bench_open(name, path)
+        _, text_area = self.open_file(path)
+        editor, rnd = self.editor, random.Random(7)
+        viewer = getattr(text_area, 'viewer', None)
+        line_count = viewer.line_count() if viewer is not None else editor.get_line_count(text_area)
+
+        def jump():
+            line = rnd.randint(1, line_count)
+            if viewer is not None:
+                viewer.go_to_line(line)
+            else:
+                text_area.mark_set("insert", f"{line}.0 lineend")
+                text_area.see("insert")
+
+        self.record(f"{name}/update_status_bar", self.time_call(editor.update_status_bar, setup=jump))
+        self.record(f"{name}/redraw_line_numbers", self.time_call(
+            lambda: editor.redraw_line_numbers(force=True), setup=jump))
+        if viewer is None:
+            self.record(f"{name}/handle_bracket_matching", self.time_call(
+                lambda: editor.handle_bracket_matching(None, text_area), setup=jump))
+
+        editor.current_find_options["text"] = find_term
+        text_area.mark_set("insert", "1.0")
+        self.record(f"{name}/find_next_occurrence", self.time_call(editor.find_next_occurrence))
+
+        if viewer is None:
+            editor.show_find_replace_dialog()
+            reset_peak_rss()
+            samples = []
+            for i in range(max(self.repeat // 10, 2)):
+                # Alternate the direction so every run has the same number of matches
+                old, new = (find_term, find_term.upper()) if i % 2 == 0 else (find_term.upper(), find_term)
+                editor.find_entry.delete(0, "end")
+                editor.find_entry.insert(0, old)
+                editor.replace_entry.delete(0, "end")
+                editor.replace_entry.insert(0, new)
+                editor.current_find_options["match_case"].set(True)
+                started = time.perf_counter()
+                editor.replace_all_occurrences()
+                self.pump(lambda: not getattr(text_area, 'replace_all_pending', False))
+                self.root.update_idletasks()
+                samples.append(time.perf_counter() - started)
+            self.record(f"{name}/replace_all_occurrences", samples)
+            editor.current_find_options["match_case"].set(False)
+            editor.find_dialog.destroy()
+            text_area.edit_modified(False)
+            editor.tabs.set_dirty(editor.get_current_tab_id(), False)
+        self.close_current()
+
+    def bench_many_tabs(self, paths):
+        name = f"tabs_{len(paths)}"
+        print(f"{name}:")
+        editor = self.editor
+        reset_peak_rss()
+        open_samples = [self.open_file(path)[0] for path in paths]
+        self.record(f"{name}/open_file", open_samples)
+        tab_ids = list(editor.notebook.tabs())
+        rnd = random.Random(11)
+        self.record(f"{name}/switch_tab", self.time_call(lambda: editor.select_tab(rnd.choice(tab_ids))))
+        self.record(f"{name}/find_tab_for_path", self.time_call(
+            lambda: editor.find_tab_for_path(rnd.choice(paths)), iterations=self.repeat * 10))
+        self.record(f"{name}/apply_theme", self.time_call(
+            lambda: editor.apply_theme_globally(rnd.choice(list(textra.THEMES_DEFINITION)))))
+        editor.apply_theme_globally(textra.DEFAULT_THEME_NAME)
+        for _ in paths: self.close_current() # Leaves the Untitled tab, so the editor never empties
+
+
+# --- Baseline Comparison ---
+def compare(results, baseline, tolerance):
+    """Prints each operation's p50 against the baseline; returns the regressed operation names."""
+    regressions = []
+    print(f"\n{'operation':<46}{'baseline p50':>14}{'p50':>12}{'change':>10}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<46}{'-':>14}{result['p50_ms']:>12.3f}{'new':>10}")
+            continue
+        change = (result["p50_ms"] - previous["p50_ms"]) / previous["p50_ms"] if previous["p50_ms"] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSED"
+        print(f"{name:<46}{previous['p50_ms']:>14.3f}{result['p50_ms']:>12.3f}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def start_display():
+    """Starts Xvfb when there is no display to draw on; returns the process or None."""
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"): return None
+    if not shutil.which("Xvfb"): sys.exit("No display available; install Xvfb or set DISPLAY.")
+    display = f":{random.randint(100, 999)}"
+    process = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    os.environ["DISPLAY"] = display
+    return process
+
+
+def quiet_dialogs(module):
+    # Benchmarks must never block on a modal dialog; answer them the way a user keeping defaults would
+    messagebox = module.messagebox
+    for name in ("showinfo", "showwarning", "showerror"):
+        setattr(messagebox, name, lambda *args, **kwargs: "ok")
+    messagebox.askyesno = lambda *args, **kwargs: True
+    messagebox.askyesnocancel = lambda *args, **kwargs: False # "Don't save"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1MB", help="comma-separated file sizes, e.g. 1MB,64MB,500MB")
+    parser.add_argument("--tabs", type=int, default=100, help="tabs for the many-tabs workload (0 skips it)")
+    parser.add_argument("--repeat", type=int, default=50, help="samples per hot-path operation")
+    parser.add_argument("--withdrawn", action="store_true", help="withdraw the root window instead of showing it")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--write-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--output", help="also write the results JSON here")
+    args = parser.parse_args(argv)
+
+    # Resolved now: the run changes into a scratch directory that is deleted afterwards
+    args.baseline = os.path.abspath(args.baseline)
+    if args.output: args.output = os.path.abspath(args.output)
+    xvfb = start_display()
+    workdir = tempfile.mkdtemp(prefix="textra-bench-")
+    os.chdir(workdir) # Config, themes, journals and the search index land here, not in the user's files
+    quiet_dialogs(textra)
+    textra.load_settings()
+    textra.config.update({"restore_session": False, "fsync_on_save": False, "recent_files": [],
+                          "long_line_reformat_json": False}) # Measure long-line mode, not the pretty-printed file
+
+    rnd = random.Random(1)
+    try:
+        root = tk.Tk()
+        if args.withdrawn: root.withdraw()
+        editor = textra.TextEditor(root)
+        bench = Bench(root, editor, args.repeat)
+        bench.pump()
+        for size in map(parse_size, args.sizes.split(",")):
+            label = size_label(size)
+            bench.bench_file(f"code_{label}", code_file(os.path.join(workdir, f"code_{label}.py"), size, rnd))
+            bench.bench_file(f"long_line_{label}", long_line_file(os.path.join(workdir, f"long_{label}.json"), size, rnd))
+            bench.bench_file(f"nested_{label}", nested_file(os.path.join(workdir, f"nested_{label}.txt"), size, rnd), "bar")
+        if args.tabs:
+            bench.bench_many_tabs([code_file(os.path.join(workdir, f"tab_{i}.py"), 16 * 1024, rnd) for i in range(args.tabs)])
+        root.destroy()
+    finally:
+        if xvfb is not None: xvfb.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {"python": platform.python_version(), "tk": str(tk.TkVersion), "platform": platform.platform(),
+                 "sizes": args.sizes, "tabs": args.tabs, "repeat": args.repeat, "withdrawn": args.withdrawn,
+                 "peak_rss": "per operation" if bench.per_operation_rss else "process"},
+        "results": bench.results,
+    }
+    if args.output:
+        with open(args.output, "w") as f: json.dump(report, f, indent=2)
+    if args.write_baseline:
+        with open(args.baseline, "w") as f: json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --write-baseline to create one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("meta", {}).get("sizes") != args.sizes:
+        print("\nNote: the baseline was recorded with different --sizes; only matching operations are compared.")
+    regressions = compare(bench.results, baseline.get("results", {}), args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} operation(s) regressed by more than {args.tolerance:.0%}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,34 @@ import os
 import platform
 import json
 import re # For Find/Replace, auto-indent, bracket matching
+import bisect
+import builtins
+import codecs
+import concurrent.futures
+import ctypes
+import ctypes.util
+import fnmatch
+import io
+import itertools
+import keyword
+import mmap
+import operator
+import queue
+import random
+import sqlite3
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from collections import deque
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError: # Python < 3.11
+    import sre_parse, sre_constants
 
 # --- Configuration & Settings ---
 CONFIG_FILE = "textra_config.json"
@@ -35,7 +63,7 @@ def save_config(config_data):
     except IOError:
         messagebox.showerror("Config Error", "Could not save settings.")
 
-config = load_config()
+config = {} # Filled in by load_settings()
 
 # --- Theme Loading (similar to before, but uses global current_theme_settings) ---
 THEME_FILE = "editor_themes.json"
@@ -50,6 +78,9 @@ def load_themes_definition():
         "tab_bg": "#2B2B2B", "tab_fg": "#A9B7C6", "tab_active_bg": "#4A4D4F", "tab_active_fg": "#FFFFFF",
         "linenum_bg": "#313335", "linenum_fg": "#606366", 
         "bracket_match_bg": "#3B514D", "bracket_match_fg": "#FFEF28",
+        "search_hit_bg": "#32593D",
+        "syntax_keyword_fg": "#CC7832", "syntax_builtin_fg": "#8888C6", "syntax_string_fg": "#6A8759", "syntax_comment_fg": "#808080", "syntax_number_fg": "#6897BB",
+        "syntax_definition_fg": "#FFC66D", "syntax_property_fg": "#9876AA", "syntax_heading_fg": "#CC7832", "syntax_emphasis_fg": "#BBB529", "syntax_link_fg": "#287BDE",
         # Add other potential keys here with their defaults if needed in the future
         "button_bg": "#3C3F41", "button_fg": "#BBBBBB", 
         "button_active_bg": "#4B6EAF", "button_active_fg": "#FFFFFF",
@@ -66,6 +97,9 @@ def load_themes_definition():
             "tab_bg": "#D0D0D0", "tab_fg": "#000000", "tab_active_bg": "#FFFFFF", "tab_active_fg": "#000000",
             "linenum_bg": "#EAEAEA", "linenum_fg": "#888888", 
             "bracket_match_bg": "#A6D2FF", "bracket_match_fg": "#000000",
+            "search_hit_bg": "#FFF3A3",
+            "syntax_keyword_fg": "#0000FF", "syntax_builtin_fg": "#795E26", "syntax_string_fg": "#A31515", "syntax_comment_fg": "#008000", "syntax_number_fg": "#098658",
+            "syntax_definition_fg": "#267F99", "syntax_property_fg": "#0451A5", "syntax_heading_fg": "#800000", "syntax_emphasis_fg": "#AF00DB", "syntax_link_fg": "#0066CC",
             "button_bg": "#F0F0F0", "button_fg": "#000000",
             "button_active_bg": "#D0E0F0", "button_active_fg": "#000000",
             "indicator": "#000000"
@@ -78,6 +112,9 @@ def load_themes_definition():
             "tab_bg": "#2E3440", "tab_fg": "#E5E9F0", "tab_active_bg": "#4C566A", "tab_active_fg": "#ECEFF4",
             "linenum_bg": "#2E3440", "linenum_fg": "#4C566A",
             "bracket_match_bg": "#5E81AC", "bracket_match_fg": "#ECEFF4",
+            "search_hit_bg": "#4C566A",
+            "syntax_keyword_fg": "#81A1C1", "syntax_builtin_fg": "#88C0D0", "syntax_string_fg": "#A3BE8C", "syntax_comment_fg": "#616E88", "syntax_number_fg": "#B48EAD",
+            "syntax_definition_fg": "#8FBCBB", "syntax_property_fg": "#EBCB8B", "syntax_heading_fg": "#88C0D0", "syntax_emphasis_fg": "#D08770", "syntax_link_fg": "#5E81AC",
             "button_bg": "#3B4252", "button_fg": "#E5E9F0",
             "button_active_bg": "#4C566A", "button_active_fg": "#ECEFF4",
             "indicator": "#88C0D0"
@@ -90,6 +127,9 @@ def load_themes_definition():
             "tab_bg": "#1A1B26", "tab_fg": "#A9B1D6", "tab_active_bg": "#7AA2F7", "tab_active_fg": "#1A1B26",
             "linenum_bg": "#1A1B26", "linenum_fg": "#565F89",
             "bracket_match_bg": "#7AA2F7", "bracket_match_fg": "#1A1B26",
+            "search_hit_bg": "#3D59A1",
+            "syntax_keyword_fg": "#BB9AF7", "syntax_builtin_fg": "#2AC3DE", "syntax_string_fg": "#9ECE6A", "syntax_comment_fg": "#565F89", "syntax_number_fg": "#FF9E64",
+            "syntax_definition_fg": "#7AA2F7", "syntax_property_fg": "#73DACA", "syntax_heading_fg": "#7AA2F7", "syntax_emphasis_fg": "#E0AF68", "syntax_link_fg": "#7DCFFF",
             "button_bg": "#24283B", "button_fg": "#A9B1D6",
             "button_active_bg": "#7AA2F7", "button_active_fg": "#1A1B26",
             "indicator": "#7AA2F7"
@@ -102,6 +142,9 @@ def load_themes_definition():
             "tab_bg": "#1E1E2E", "tab_fg": "#CDD6F4", "tab_active_bg": "#89B4FA", "tab_active_fg": "#1E1E2E",
             "linenum_bg": "#1E1E2E", "linenum_fg": "#6C7086",
             "bracket_match_bg": "#89B4FA", "bracket_match_fg": "#1E1E2E",
+            "search_hit_bg": "#45475A",
+            "syntax_keyword_fg": "#CBA6F7", "syntax_builtin_fg": "#F9E2AF", "syntax_string_fg": "#A6E3A1", "syntax_comment_fg": "#6C7086", "syntax_number_fg": "#FAB387",
+            "syntax_definition_fg": "#89B4FA", "syntax_property_fg": "#89DCEB", "syntax_heading_fg": "#F38BA8", "syntax_emphasis_fg": "#F5C2E7", "syntax_link_fg": "#74C7EC",
             "button_bg": "#313244", "button_fg": "#CDD6F4",
             "button_active_bg": "#89B4FA", "button_active_fg": "#1E1E2E",
             "indicator": "#89B4FA"
@@ -114,6 +157,9 @@ def load_themes_definition():
             "tab_bg": "#282C34", "tab_fg": "#ABB2BF", "tab_active_bg": "#528BFF", "tab_active_fg": "#FFFFFF",
             "linenum_bg": "#282C34", "linenum_fg": "#495162",
             "bracket_match_bg": "#528BFF", "bracket_match_fg": "#FFFFFF",
+            "search_hit_bg": "#3E4451",
+            "syntax_keyword_fg": "#C678DD", "syntax_builtin_fg": "#56B6C2", "syntax_string_fg": "#98C379", "syntax_comment_fg": "#5C6370", "syntax_number_fg": "#D19A66",
+            "syntax_definition_fg": "#61AFEF", "syntax_property_fg": "#E06C75", "syntax_heading_fg": "#E06C75", "syntax_emphasis_fg": "#E5C07B", "syntax_link_fg": "#61AFEF",
             "button_bg": "#21252B", "button_fg": "#ABB2BF",
             "button_active_bg": "#528BFF", "button_active_fg": "#FFFFFF",
             "indicator": "#528BFF"
@@ -126,6 +172,9 @@ def load_themes_definition():
             "tab_bg": "#2D1810", "tab_fg": "#E8D3B6", "tab_active_bg": "#C17817", "tab_active_fg": "#2D1810",
             "linenum_bg": "#2D1810", "linenum_fg": "#8B5A2B",
             "bracket_match_bg": "#C17817", "bracket_match_fg": "#2D1810",
+            "search_hit_bg": "#5C3A21",
+            "syntax_keyword_fg": "#E0A458", "syntax_builtin_fg": "#D4A373", "syntax_string_fg": "#A7C080", "syntax_comment_fg": "#8C6E54", "syntax_number_fg": "#E9C46A",
+            "syntax_definition_fg": "#F4A261", "syntax_property_fg": "#DDB892", "syntax_heading_fg": "#F4A261", "syntax_emphasis_fg": "#E9C46A", "syntax_link_fg": "#87BFCF",
             "button_bg": "#3D2318", "button_fg": "#E8D3B6",
             "button_active_bg": "#C17817", "button_active_fg": "#2D1810",
             "indicator": "#C17817"
@@ -138,6 +187,9 @@ def load_themes_definition():
             "tab_bg": "#0C0C0C", "tab_fg": "#00FF9F", "tab_active_bg": "#FF00FF", "tab_active_fg": "#0C0C0C",
             "linenum_bg": "#0C0C0C", "linenum_fg": "#FF00FF",
             "bracket_match_bg": "#FF00FF", "bracket_match_fg": "#0C0C0C",
+            "search_hit_bg": "#3D003D",
+            "syntax_keyword_fg": "#FF00FF", "syntax_builtin_fg": "#00E5FF", "syntax_string_fg": "#00FF9F", "syntax_comment_fg": "#5A5A7A", "syntax_number_fg": "#FFE600",
+            "syntax_definition_fg": "#00B8FF", "syntax_property_fg": "#FF6AD5", "syntax_heading_fg": "#FF00FF", "syntax_emphasis_fg": "#FFE600", "syntax_link_fg": "#00E5FF",
             "button_bg": "#1A1A1A", "button_fg": "#00FF9F",
             "button_active_bg": "#FF00FF", "button_active_fg": "#0C0C0C",
             "indicator": "#FF00FF"
@@ -150,6 +202,9 @@ def load_themes_definition():
             "tab_bg": "#1B2B1B", "tab_fg": "#A8C6A8", "tab_active_bg": "#4A8A4A", "tab_active_fg": "#1B2B1B",
             "linenum_bg": "#1B2B1B", "linenum_fg": "#4A8A4A",
             "bracket_match_bg": "#4A8A4A", "bracket_match_fg": "#1B2B1B",
+            "search_hit_bg": "#2F4F2F",
+            "syntax_keyword_fg": "#8FBC8F", "syntax_builtin_fg": "#B5C99A", "syntax_string_fg": "#D4C98A", "syntax_comment_fg": "#5F7F5F", "syntax_number_fg": "#C9A66B",
+            "syntax_definition_fg": "#A8D5BA", "syntax_property_fg": "#9CC5A1", "syntax_heading_fg": "#C1E1C1", "syntax_emphasis_fg": "#D4C98A", "syntax_link_fg": "#7FB3D5",
             "button_bg": "#243224", "button_fg": "#A8C6A8",
             "button_active_bg": "#4A8A4A", "button_active_fg": "#1B2B1B",
             "indicator": "#4A8A4A"
@@ -162,6 +217,9 @@ def load_themes_definition():
             "tab_bg": "#2C1B2E", "tab_fg": "#FFB6C1", "tab_active_bg": "#FF8C00", "tab_active_fg": "#2C1B2E",
             "linenum_bg": "#2C1B2E", "linenum_fg": "#FF8C00",
             "bracket_match_bg": "#FF8C00", "bracket_match_fg": "#2C1B2E",
+            "search_hit_bg": "#5A3A55",
+            "syntax_keyword_fg": "#FF8C00", "syntax_builtin_fg": "#FFB347", "syntax_string_fg": "#F6D186", "syntax_comment_fg": "#8E6C88", "syntax_number_fg": "#FF6F91",
+            "syntax_definition_fg": "#FFD1DC", "syntax_property_fg": "#FFA07A", "syntax_heading_fg": "#FF8C00", "syntax_emphasis_fg": "#FF6F91", "syntax_link_fg": "#87CEFA",
             "button_bg": "#3D2739", "button_fg": "#FFB6C1",
             "button_active_bg": "#FF8C00", "button_active_fg": "#2C1B2E",
             "indicator": "#FF8C00"
@@ -174,6 +232,9 @@ def load_themes_definition():
             "tab_bg": "#0A192F", "tab_fg": "#64FFDA", "tab_active_bg": "#00B4D8", "tab_active_fg": "#0A192F",
             "linenum_bg": "#0A192F", "linenum_fg": "#00B4D8",
             "bracket_match_bg": "#00B4D8", "bracket_match_fg": "#0A192F",
+            "search_hit_bg": "#1D3A5F",
+            "syntax_keyword_fg": "#00B4D8", "syntax_builtin_fg": "#90E0EF", "syntax_string_fg": "#64FFDA", "syntax_comment_fg": "#4A6A8A", "syntax_number_fg": "#F4A261",
+            "syntax_definition_fg": "#82AAFF", "syntax_property_fg": "#C792EA", "syntax_heading_fg": "#00B4D8", "syntax_emphasis_fg": "#FFCB6B", "syntax_link_fg": "#89DDFF",
             "button_bg": "#112240", "button_fg": "#64FFDA",
             "button_active_bg": "#00B4D8", "button_active_fg": "#0A192F",
             "indicator": "#00B4D8"
@@ -182,15 +243,12 @@ def load_themes_definition():
 
     try:
         if not os.path.exists(THEME_FILE):
-            print(f"Creating theme file: {THEME_FILE}")
             with open(THEME_FILE, 'w') as f:
                 json.dump(default_themes_data, f, indent=4)
             return default_themes_data
 
-        print(f"Loading theme file: {THEME_FILE}")
         with open(THEME_FILE, 'r') as f:
             loaded_themes_from_file = json.load(f)
-            print(f"Loaded themes from file: {list(loaded_themes_from_file.keys())}")
 
             # Ensure all loaded themes have all keys from the template
             processed_themes = {}
@@ -205,177 +263,3025 @@ def load_themes_definition():
                 if default_name not in processed_themes:
                     processed_themes[default_name] = default_data.copy()
 
-            # If the file themes are outdated, overwrite the file with complete themes
-            save_updated_themes = False
-            for theme_name in loaded_themes_from_file: # Check only themes that were IN the file
-                if loaded_themes_from_file[theme_name] != processed_themes.get(theme_name):
-                    save_updated_themes = True
-                    break
-            if save_updated_themes:
-                 print(f"Updating theme file {THEME_FILE} with new/missing keys.")
-                 with open(THEME_FILE, 'w') as f:
-                    json.dump(processed_themes, f, indent=4)
-
+            # Missing keys are filled in memory only; the file is left as the user wrote it
             return processed_themes
             
     except json.JSONDecodeError:
-        print(f"Error parsing {THEME_FILE}. Using hardcoded defaults.")
         messagebox.showerror("Theme Error", f"Could not parse {THEME_FILE}. Using default themes.")
         return default_themes_data # Fallback to hardcoded complete defaults
-    except Exception as e:
-        print(f"An unexpected error occurred loading themes: {e}. Using hardcoded defaults.")
+    except Exception:
         return default_themes_data
 
-THEMES_DEFINITION = load_themes_definition()
-print(f"Available themes: {list(THEMES_DEFINITION.keys())}")
+THEMES_DEFINITION = {} # Filled in by load_settings()
+
+def load_settings():
+    """Reads the config and theme files into the module globals, once per process."""
+    if THEMES_DEFINITION: return
+    config.update(load_config())
+    THEMES_DEFINITION.update(load_themes_definition())
+
+
+def compile_theme(theme, ui_font_family):
+    """Turns a theme's colors into the option sets the editor applies: ttk styles,
+    Text widget and tag options, and menu and gutter colors. Built once per theme and
+    UI font, so switching themes is just a series of configure calls."""
+    def ui_font(size=10): return (ui_font_family, size)
+    button_bg, button_fg = theme.get('button_bg', theme['bg']), theme.get('button_fg', theme['fg'])
+    styles = [ # (style, configure options, map options)
+        ("TNotebook", {"background": theme['notebook_bg']}, None),
+        ("TNotebook.Tab", {"background": theme['tab_bg'], "foreground": theme['tab_fg'], "padding": [10, 5], "font": ui_font()},
+         {"background": [("selected", theme['tab_active_bg'])], "foreground": [("selected", theme['tab_active_fg'])]}),
+        ("TFrame", {"background": theme['bg']}, None),
+        ("TLabel", {"background": theme['bg'], "foreground": theme['fg'], "font": ui_font()}, None),
+        ("Status.TFrame", {"background": theme['statusbar_bg'], "relief": tk.FLAT}, None),
+        ("Status.TLabel", {"background": theme['statusbar_bg'], "foreground": theme['statusbar_fg'], "padding": 5, "font": ui_font(9)}, None),
+        ("TButton", {"background": button_bg, "foreground": button_fg, "padding": [10, 5], "font": ui_font()},
+         {"background": [('active', theme.get('button_active_bg', theme['menu_active_bg']))],
+          "foreground": [('active', theme.get('button_active_fg', theme['menu_active_fg']))]}),
+        ("TEntry", {"fieldbackground": theme['text_bg'], "foreground": theme['text_fg'],
+                    "insertcolor": theme['cursor_insert_color'], "padding": [5, 2], "font": ui_font()}, None),
+        ("TCheckbutton", {"background": theme['bg'], "foreground": theme['fg'],
+                          "indicatorcolor": theme.get('indicator', theme['fg']), "font": ui_font()}, None),
+        # Result lists (Find in Files)
+        ("Treeview", {"background": theme['text_bg'], "fieldbackground": theme['text_bg'], "foreground": theme['text_fg'], "font": ui_font()},
+         {"background": [("selected", theme['select_bg'])], "foreground": [("selected", theme['select_fg'])]}),
+        ("Treeview.Heading", {"background": button_bg, "foreground": button_fg}, None),
+        ("TSeparator", {"background": theme['statusbar_bg']}, None),
+    ]
+    tags = [("bracket_match", {"background": theme.get('bracket_match_bg', 'yellow'), "foreground": theme.get('bracket_match_fg', None)}),
+            ("search_hit", {"background": theme.get('search_hit_bg', None)})]
+    tags += [("syntax_" + token_type, {"foreground": theme.get(f"syntax_{token_type}_fg", None)}) for token_type in SYNTAX_TOKEN_TYPES]
+    return {
+        "styles": styles,
+        "text": {"background": theme['text_bg'], "foreground": theme['text_fg'], "selectbackground": theme['select_bg'],
+                 "selectforeground": theme['select_fg'], "insertbackground": theme['cursor_insert_color']},
+        "tags": tags,
+        "menu": {"bg": theme['menu_bg'], "fg": theme['menu_fg'], "activebackground": theme['menu_active_bg'],
+                 "activeforeground": theme['menu_active_fg'], "relief": tk.FLAT, "bd": 0},
+        "root_bg": theme['bg'],
+        "linenum_bg": theme['linenum_bg'],
+    }
+
+
+class StartupProfiler:
+    """Collects the time spent in each startup phase for --profile-startup."""
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.phases = []
+
+    def mark(self, label):
+        now = time.perf_counter()
+        self.phases.append((label, now - self.last))
+        self.last = now
+
+    def report(self):
+        lines = [f"{label:<24}{seconds * 1000:8.1f} ms" for label, seconds in self.phases]
+        lines.append(f"{'total':<24}{(self.last - self.started) * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+# --- Edit Tracking ---
+class TextChangeProxy:
+    """Sits in front of a Text widget's Tcl command and reports every insert/delete
+    to registered listeners, so per-tab engines can follow edit deltas instead of
+    rescanning the whole buffer."""
+
+    def __init__(self, text_area):
+        self.text_area = text_area
+        self.listeners = [] # Objects with before_change/after_change/invalidate
+        self._line_cache = None # Only active while listeners are being notified
+        self.version = 0 # Bumped on every edit, lets engines cache per buffer version
+        self.suspended = False # Set during bulk edits, which resync the listeners afterwards
+        self._widget_cmd = str(text_area)
+        self._orig_cmd = self._widget_cmd + "_orig"
+        self._edit_cmd = self._widget_cmd + "_edit"
+        text_area.tk.call("rename", self._widget_cmd, self._orig_cmd)
+        text_area.tk.createcommand(self._edit_cmd, self._dispatch)
+        # Only edits go through Python. Everything else reaches the real widget from Tcl,
+        # so its errors stay Tcl errors: Tk's bindings rely on catching some of them
+        # (tk_textCopy skips the clipboard when "get sel.first sel.last" fails).
+        text_area.tk.call("proc", self._widget_cmd, "operation args",
+                          f"if {{$operation in {{insert delete replace}}}} "
+                          f"{{return [{self._edit_cmd} $operation {{*}}$args]}}\n"
+                          f"return [{self._orig_cmd} $operation {{*}}$args]")
+        text_area.bind("<Destroy>", self._on_destroy, add="+")
+
+    def _on_destroy(self, event=None):
+        if event is not None and event.widget is not self.text_area: return
+        try:
+            self.text_area.tk.call("rename", self._widget_cmd, "")
+            self.text_area.tk.deletecommand(self._edit_cmd)
+        except tk.TclError: pass
+
+    def call(self, *args):
+        # Talk to the real widget command, bypassing the listeners
+        return self.text_area.tk.call((self._orig_cmd,) + args)
+
+    def index(self, index):
+        return self.call("index", index)
+
+    def get(self, start, end):
+        return self.call("get", start, end)
+
+    def get_lines(self, first_line, last_line):
+        """Text of the 1-based, inclusive line range. While listeners are being notified
+        the result is shared between them, so several engines cost one Tcl round-trip."""
+        key = (first_line, last_line)
+        if self._line_cache is not None and key in self._line_cache:
+            return self._line_cache[key]
+        text = self.call("get", f"{first_line}.0", f"{last_line}.end")
+        if self._line_cache is not None: self._line_cache[key] = text
+        return text
+
+    def _dispatch(self, operation, *args):
+        # Called for insert, delete and replace only (see __init__)
+        try:
+            if self.listeners and not self.suspended:
+                return self._tracked_edit(operation, args)
+            return self.call(operation, *args)
+        except tk.TclError:
+            # Tk's own bindings wrap many edits in catch; raising here would
+            # surface as a Python exception in the mainloop instead.
+            return ""
+
+    def _clamp_to_last_char(self, index):
+        # Tk never edits past the final newline, so neither should the deltas
+        last = self.index("end-1c")
+        return last if self.call("compare", index, ">", last) else index
+
+    def _tracked_edit(self, operation, args):
+        if operation == "insert":
+            start = self._clamp_to_last_char(self.index(args[0]))
+            end = start
+        elif operation == "delete" and len(args) > 2:
+            # Multi-range deletes are rare enough to just resync afterwards
+            result = self.call(operation, *args)
+            self.invalidate()
+            return result
+        else:
+            start = self._clamp_to_last_char(self.index(args[0]))
+            if len(args) > 1: end = self._clamp_to_last_char(self.index(args[1]))
+            else: end = self._clamp_to_last_char(self.index(f"{start}+1c"))
+            if self.call("compare", end, "<", start): end = start
+            if operation == "delete" and start == end:
+                return self.call(operation, *args)
+
+        self._line_cache = {}
+        try:
+            for listener in self.listeners:
+                listener.before_change(self, start, end)
+            self._line_cache = None
+            result = self.call(operation, *args)
+            self.version += 1
+            inserted_len = 0
+            if operation == "insert":
+                inserted_len = sum(len(chunk) for chunk in args[1::2])
+            elif operation == "replace":
+                inserted_len = sum(len(chunk) for chunk in args[2::2])
+            new_end = self.index(f"{start}+{inserted_len}c") if inserted_len else start
+            self._line_cache = {}
+            for listener in self.listeners:
+                listener.after_change(self, start, new_end)
+        finally:
+            self._line_cache = None
+        return result
+
+    def invalidate(self):
+        self.version += 1
+        for listener in self.listeners:
+            listener.invalidate()
+
+
+class EditNotifier:
+    """Listener that calls back after every edit, including bulk edits that resync
+    through invalidate(), so no key binding has to guess which keys changed text."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def before_change(self, proxy, start, end): pass
+
+    def after_change(self, proxy, start, end):
+        self.callback()
+
+    def invalidate(self):
+        self.callback()
+
+
+def _line_of(index):
+    return int(str(index).split('.')[0])
+
+
+class TextStats:
+    """Char/word/line counters kept current from edit deltas. Only the lines touched
+    by an edit are re-read, so the cost is independent of the buffer size."""
+
+    def __init__(self, content=""):
+        self.reset(content)
+        self._pending = None
+
+    @staticmethod
+    def _measure(text):
+        newlines = text.count('\n')
+        return len(text) - newlines, len(text.split()), newlines
+
+    def reset(self, content):
+        # content is the buffer without Tk's implicit trailing newline
+        self.chars, self.words, newlines = self._measure(content)
+        self.lines = newlines + 1
+        self.dirty = False
+
+    def recount(self, proxy):
+        self.reset(proxy.get("1.0", "end-1c"))
+
+    def invalidate(self):
+        self.dirty = True
+
+    def _affected_lines(self, proxy, start, end):
+        return proxy.get_lines(_line_of(start), _line_of(end))
+
+    def before_change(self, proxy, start, end):
+        if self.dirty: return
+        # Words never span a newline, so whole lines are a safe delta boundary
+        self._pending = self._measure(self._affected_lines(proxy, start, end))
+
+    def after_change(self, proxy, start, end):
+        if self.dirty or self._pending is None: return
+        chars, words, newlines = self._measure(self._affected_lines(proxy, start, end))
+        old_chars, old_words, old_newlines = self._pending
+        self.chars += chars - old_chars
+        self.words += words - old_words
+        self.lines += newlines - old_newlines
+        self._pending = None
+
+
+class LineIndex:
+    """Line lengths for one buffer, giving O(1) line counts and near-constant
+    line <-> character-offset lookups. The initial build runs on a worker thread;
+    edits made meanwhile are queued and replayed, afterwards they are applied directly.
+    Offsets are prefix-summed per block of lines and only recomputed from the first
+    block an edit touched, and only when a lookup needs them."""
+
+    BLOCK_LINES = 1024
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.ready = False
+        self._lengths = [0]     # Characters per line, including its newline
+        self._block_starts = [0] # Offset of the first line of each block, valid prefix only
+        self._pending_edit = None
+        self._replay = []       # Splices recorded while the worker is building
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def build_async(self, content):
+        with self._lock:
+            self.ready = False
+            self._replay = []
+            self._generation += 1
+            generation = self._generation
+        threading.Thread(target=self._build, args=(content, generation), daemon=True).start()
+
+    def _build(self, content, generation):
+        lengths = [len(line) + 1 for line in content.split('\n')]
+        lengths[-1] -= 1 # The last line has no newline of its own
+        with self._lock:
+            if generation != self._generation: return # Superseded by a newer build
+            self._lengths = lengths
+            self._block_starts = [0]
+            for splice in self._replay: self._apply(*splice)
+            self._replay = []
+            self.ready = True
+
+    def _apply(self, first, old_last, part_lengths):
+        was_last_line = old_last >= len(self._lengths) - 1
+        lengths = [n + 1 for n in part_lengths]
+        if was_last_line: lengths[-1] -= 1
+        self._lengths[first:old_last + 1] = lengths
+        del self._block_starts[first // self.BLOCK_LINES + 1:]
+
+    # --- Change-listener interface (see TextChangeProxy) ---
+    def before_change(self, proxy, start, end):
+        self._pending_edit = (_line_of(start) - 1, _line_of(end) - 1)
+
+    def after_change(self, proxy, start, end):
+        if self._pending_edit is None: return
+        first, old_last = self._pending_edit
+        self._pending_edit = None
+        text = proxy.get_lines(first + 1, _line_of(end))
+        splice = (first, old_last, [len(line) for line in text.split('\n')])
+        with self._lock:
+            if self.ready: self._apply(*splice)
+            else: self._replay.append(splice)
+
+    def invalidate(self):
+        self.build_async(self.proxy.get("1.0", "end-1c"))
+
+    # --- Lookups (only meaningful once ready) ---
+    @property
+    def line_count(self):
+        return len(self._lengths)
+
+    def _ensure_block_starts(self, block):
+        starts, lengths, size = self._block_starts, self._lengths, self.BLOCK_LINES
+        while len(starts) <= block:
+            b = len(starts)
+            starts.append(starts[-1] + sum(lengths[(b - 1) * size:b * size]))
+
+    def line_to_offset(self, line):
+        line0 = min(max(line - 1, 0), len(self._lengths) - 1)
+        block = line0 // self.BLOCK_LINES
+        self._ensure_block_starts(block)
+        return self._block_starts[block] + sum(self._lengths[block * self.BLOCK_LINES:line0])
+
+    def offset_to_line(self, offset):
+        """Returns (1-based line, column) for a character offset."""
+        lengths = self._lengths
+        self._ensure_block_starts((len(lengths) - 1) // self.BLOCK_LINES)
+        block = max(bisect.bisect_right(self._block_starts, offset) - 1, 0)
+        line0, line_start = block * self.BLOCK_LINES, self._block_starts[block]
+        while line0 < len(lengths) - 1 and line_start + lengths[line0] <= offset:
+            line_start += lengths[line0]
+            line0 += 1
+        return line0 + 1, offset - line_start
+
+    def index_to_offset(self, index):
+        line, col = str(index).split('.')
+        return self.line_to_offset(int(line)) + int(col)
+
+    def offset_to_index(self, offset):
+        line, col = self.offset_to_line(offset)
+        return f"{line}.{col}"
+
+
+# --- Document Model ---
+class _TextBuffer:
+    """A string pieces point into, with its newline offsets indexed on first need."""
+    __slots__ = ("text", "_newlines")
+
+    SCAN_CHARS = 4096 # Ranges up to this size are counted directly
+
+    def __init__(self, text):
+        self.text = text
+        self._newlines = None
+
+    def _newline_offsets(self):
+        if self._newlines is None:
+            # Line lengths are summed in C; newline k sits after k + 1 lines and k newlines
+            parts = self.text.split('\n')
+            self._newlines = array('q', map(operator.add, itertools.accumulate(map(len, parts[:-1])), itertools.count()))
+        return self._newlines
+
+    def count(self, start, end):
+        if end - start <= self.SCAN_CHARS: return self.text.count('\n', start, end)
+        offsets = self._newline_offsets()
+        return bisect.bisect_left(offsets, end) - bisect.bisect_left(offsets, start)
+
+    def nth_newline(self, start, end, n):
+        # Offset of the n-th (0-based) newline in [start, end), which must exist
+        if end - start <= self.SCAN_CHARS:
+            position = start - 1
+            for _ in range(n + 1): position = self.text.find('\n', position + 1, end)
+            return position
+        offsets = self._newline_offsets()
+        return offsets[bisect.bisect_left(offsets, start) + n]
+
+
+class _Piece:
+    """Treap node for one piece; nodes are never changed once built, so any root is a snapshot."""
+    __slots__ = ("buffer", "start", "length", "newlines", "priority", "left", "right", "size", "lines")
+
+    def __init__(self, buffer, start, length, newlines, priority, left=None, right=None):
+        self.buffer, self.start, self.length, self.newlines = buffer, start, length, newlines
+        self.priority, self.left, self.right = priority, left, right
+        self.size = length + (left.size if left else 0) + (right.size if right else 0)
+        self.lines = newlines + (left.lines if left else 0) + (right.lines if right else 0)
+
+    def with_children(self, left, right):
+        return _Piece(self.buffer, self.start, self.length, self.newlines, self.priority, left, right)
+
+
+def _piece_merge(a, b):
+    if a is None: return b
+    if b is None: return a
+    if a.priority > b.priority: return a.with_children(a.left, _piece_merge(a.right, b))
+    return b.with_children(_piece_merge(a, b.left), b.right)
+
+def _piece_split(node, offset):
+    # (first offset characters, the rest)
+    if node is None: return None, None
+    left_size = node.left.size if node.left else 0
+    if offset <= left_size:
+        first, rest = _piece_split(node.left, offset)
+        return first, node.with_children(rest, node.right)
+    if offset >= left_size + node.length:
+        first, rest = _piece_split(node.right, offset - left_size - node.length)
+        return node.with_children(node.left, first), rest
+    cut = offset - left_size
+    newlines = node.buffer.count(node.start, node.start + cut)
+    head = _Piece(node.buffer, node.start, cut, newlines, node.priority, node.left, None)
+    tail = _Piece(node.buffer, node.start + cut, node.length - cut, node.newlines - newlines, node.priority, None, node.right)
+    return head, tail
+
+
+class Document:
+    """The text of one buffer as a piece table, kept in a persistent treap: inserts,
+    deletes and line <-> offset lookups are O(log n), and snapshot() is O(1) and safe to
+    read from other threads. attach() keeps it in sync with a Text widget's edits."""
+
+    def __init__(self, text=""):
+        self._root = self._leaf(text)
+        self.proxy = None
+        self._pending = None
+
+    @staticmethod
+    def _leaf(text):
+        if not text: return None
+        buffer = _TextBuffer(text)
+        return _Piece(buffer, 0, len(text), text.count('\n'), random.random())
+
+    @classmethod
+    def _from_root(cls, root):
+        document = cls()
+        document._root = root
+        return document
+
+    def snapshot(self):
+        return self._from_root(self._root)
+
+    def __len__(self):
+        return self._root.size if self._root else 0
+
+    @property
+    def line_count(self):
+        return (self._root.lines if self._root else 0) + 1
+
+    # --- Editing (offsets are clamped to the document) ---
+    def _clamp(self, offset):
+        return min(max(offset, 0), len(self))
+
+    def insert(self, offset, text):
+        if not text: return
+        first, rest = _piece_split(self._root, self._clamp(offset))
+        self._root = _piece_merge(_piece_merge(first, self._leaf(text)), rest)
+
+    def delete(self, start, end):
+        start, end = self._clamp(start), self._clamp(end)
+        if end <= start: return
+        first, rest = _piece_split(self._root, start)
+        _, rest = _piece_split(rest, end - start)
+        self._root = _piece_merge(first, rest)
+
+    def replace(self, start, end, text):
+        self.delete(start, end)
+        self.insert(start, text)
+
+    def set_text(self, text):
+        self._root = self._leaf(text)
+
+    # --- Reading ---
+    def get_text(self, start=0, end=None):
+        start = self._clamp(start)
+        end = len(self) if end is None else self._clamp(end)
+        if end <= start: return ""
+        _, rest = _piece_split(self._root, start)
+        middle, _ = _piece_split(rest, end - start)
+        parts, stack, node = [], [], middle
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            parts.append(node.buffer.text[node.start:node.start + node.length])
+            node = node.right
+        return "".join(parts)
+
+    def text(self):
+        return self.get_text()
+
+    def line_to_offset(self, line):
+        """Offset of the first character of a 1-based line (clamped to the document)."""
+        remaining = min(max(line, 1), self.line_count) - 1 # Newlines before the line
+        node, base = self._root, 0
+        while remaining:
+            left_lines = node.left.lines if node.left else 0
+            left_size = node.left.size if node.left else 0
+            if remaining <= left_lines:
+                node = node.left
+            elif remaining <= left_lines + node.newlines:
+                position = node.buffer.nth_newline(node.start, node.start + node.length, remaining - left_lines - 1)
+                return base + left_size + position - node.start + 1
+            else:
+                remaining -= left_lines + node.newlines
+                base += left_size + node.length
+                node = node.right
+        return base
+
+    def offset_to_line(self, offset):
+        """Returns (1-based line, column) for a character offset."""
+        offset = self._clamp(offset)
+        node, remaining, newlines = self._root, offset, 0
+        while node:
+            left_size = node.left.size if node.left else 0
+            if remaining <= left_size:
+                node = node.left
+                continue
+            newlines += node.left.lines if node.left else 0
+            remaining -= left_size
+            if remaining <= node.length:
+                newlines += node.buffer.count(node.start, node.start + remaining)
+                break
+            newlines += node.newlines
+            remaining -= node.length
+            node = node.right
+        return newlines + 1, offset - self.line_to_offset(newlines + 1)
+
+    def get_line(self, line):
+        # Without its newline
+        if line < 1 or line > self.line_count: return ""
+        end = self.line_to_offset(line + 1) - 1 if line < self.line_count else len(self)
+        return self.get_text(self.line_to_offset(line), end)
+
+    def index_to_offset(self, index):
+        line, col = str(index).split('.')
+        line = int(line)
+        if line > self.line_count: return len(self)
+        return min(self.line_to_offset(line) + int(col), len(self))
+
+    def offset_to_index(self, offset):
+        line, col = self.offset_to_line(offset)
+        return f"{line}.{col}"
+
+    # --- Change-listener interface (see TextChangeProxy) ---
+    def attach(self, proxy):
+        self.proxy = proxy
+        proxy.listeners.append(self)
+
+    def before_change(self, proxy, start, end):
+        self._pending = (self.index_to_offset(start), self.index_to_offset(end))
+
+    def after_change(self, proxy, start, end):
+        if self._pending is None: return
+        old_start, old_end = self._pending
+        self._pending = None
+        self.replace(old_start, old_end, proxy.get(start, end) if start != end else "")
+
+    def invalidate(self):
+        if self.proxy is not None: self.set_text(self.proxy.get("1.0", "end-1c"))
+
+
+# --- Find Engine ---
+class FindEngine:
+    """Find state for one tab. The query is compiled once and every match span is
+    computed in a single finditer pass over a snapshot of the buffer, cached per
+    buffer version. Next/previous is then a bisect over the cached spans."""
+
+    MAX_VIEWPORT_HITS = 2000 # Cap on highlighted hits per redraw
+
+    def __init__(self):
+        self._regex_key = None
+        self.regex = None
+        self._spans_key = None
+        self.starts = array('q')
+        self.ends = array('q')
+        self.current = 0     # 1-based number of the selected match, 0 if none
+        self.active = False  # True while the hits should stay highlighted
+        self.has_hit_tags = False
+
+    def compile(self, search_term, match_case, use_regex):
+        key = (search_term, match_case, use_regex)
+        if key != self._regex_key:
+            pattern = search_term if use_regex else re.escape(search_term)
+            self.regex = re.compile(pattern, re.MULTILINE | (0 if match_case else re.IGNORECASE))
+            self._regex_key = key
+        return self.regex
+
+    def is_stale(self, proxy):
+        return self._spans_key != (proxy.version, self._regex_key)
+
+    def search(self, proxy, search_term, match_case, use_regex):
+        """Returns the number of matches, recomputing the spans only if the query or buffer changed."""
+        self.compile(search_term, match_case, use_regex)
+        self.active = True
+        if self.is_stale(proxy): self.refresh(proxy)
+        return len(self.starts)
+
+    def refresh(self, proxy):
+        snapshot = proxy.get("1.0", "end-1c")
+        starts, ends = array('q'), array('q')
+        for match in self.regex.finditer(snapshot):
+            if match.end() > match.start(): # Zero-length matches can't be selected
+                starts.append(match.start())
+                ends.append(match.end())
+        self.starts, self.ends = starts, ends
+        self._spans_key = (proxy.version, self._regex_key)
+        self.current = 0
+
+    def next_match(self, offset, forward):
+        """Picks the match at/after (or before) offset. Returns (match number, wrapped)."""
+        count = len(self.starts)
+        if forward:
+            i = bisect.bisect_left(self.starts, offset)
+            wrapped = i == count
+            if wrapped: i = 0
+        else:
+            i = bisect.bisect_left(self.starts, offset) - 1
+            wrapped = i < 0
+            if wrapped: i = count - 1
+        self.current = i + 1
+        return self.current, wrapped
+
+    def span(self, number):
+        return self.starts[number - 1], self.ends[number - 1]
+
+    def spans_between(self, first_offset, last_offset):
+        # Indices of the matches overlapping [first_offset, last_offset)
+        first = bisect.bisect_right(self.ends, first_offset)
+        last = bisect.bisect_left(self.starts, last_offset)
+        return range(first, min(last, first + self.MAX_VIEWPORT_HITS))
+
+    def clear(self):
+        self.active = False
+        self.current = 0
+
+
+def compute_replacement_spans(snapshot, regex, replacement, expand):
+    """Worker-thread half of Replace All. Returns (start index, end index, new text)
+    for every match in document order, with Tk indices derived from the snapshot so
+    the UI thread only has to apply them."""
+    spans = []
+    line, line_start, scanned = 1, 0, 0
+    for match in regex.finditer(snapshot):
+        start, end = match.span()
+        newlines = snapshot.count('\n', scanned, start)
+        if newlines:
+            line += newlines
+            line_start = snapshot.rfind('\n', scanned, start) + 1
+        scanned = start
+        inner_newlines = snapshot.count('\n', start, end)
+        if inner_newlines:
+            end_col = end - snapshot.rfind('\n', start, end) - 1
+            end_index = f"{line + inner_newlines}.{end_col}"
+        else:
+            end_index = f"{line}.{end - line_start}"
+        spans.append((f"{line}.{start - line_start}", end_index,
+                      match.expand(replacement) if expand else replacement))
+    return spans
+
+
+# --- Find in Files ---
+FIND_IN_FILES_DEFAULT_EXCLUDES = ".git;.hg;.svn;node_modules;__pycache__;.venv;venv;*.pyc;*.so;*.dll;*.exe;*.png;*.jpg;*.gif;*.zip"
+FIND_IN_FILES_MAX_HITS = 10000 # Results shown before the search stops itself
+FIND_IN_FILES_BATCH = 32       # Files per worker task, keeps IPC overhead low
+
+def split_globs(text):
+    return [g.strip() for g in re.split(r"[;,]", text or "") if g.strip()]
+
+def _glob_matches(rel_path, name, globs):
+    return any(fnmatch.fnmatch(name, g) or fnmatch.fnmatch(rel_path, g) for g in globs)
+
+def iter_search_files(root_dir, includes, excludes, skip_paths=()):
+    """Walks root_dir yielding files that pass the include/exclude globs. Excluded
+    directories are pruned so their contents are never listed."""
+    skip = {os.path.normcase(os.path.abspath(p)) for p in skip_paths}
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        rel_dir = os.path.relpath(dir_path, root_dir)
+        dir_names[:] = [d for d in dir_names
+                        if not _glob_matches(os.path.normpath(os.path.join(rel_dir, d)), d, excludes)]
+        for name in file_names:
+            rel_path = os.path.normpath(os.path.join(rel_dir, name))
+            if excludes and _glob_matches(rel_path, name, excludes): continue
+            if includes and not _glob_matches(rel_path, name, includes): continue
+            path = os.path.join(dir_path, name)
+            if os.path.normcase(os.path.abspath(path)) in skip: continue
+            yield path
+
+def search_text_for_hits(label, text, regex, max_hits):
+    """grep-style hits for one text: (label, line number, column, line text), one per line."""
+    hits = []
+    line_no, scanned, last_line = 1, 0, 0
+    for match in regex.finditer(text):
+        start = match.start()
+        line_no += text.count('\n', scanned, start)
+        scanned = start
+        if line_no == last_line: continue
+        last_line = line_no
+        line_start = text.rfind('\n', 0, start) + 1
+        line_end = text.find('\n', start)
+        line_text = text[line_start:line_end if line_end >= 0 else len(text)]
+        hits.append((label, line_no, start - line_start, line_text.rstrip('\r')[:300]))
+        if len(hits) >= max_hits: break
+    return hits
+
+def search_files_worker(paths, pattern, flags, max_hits_per_file=1000):
+    # Runs in a worker process, so it must stay a picklable module-level function
+    regex = re.compile(pattern, flags)
+    hits = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        if b'\0' in data[:8192]: continue # Binary file
+        text = data.decode('utf-8', errors='replace')
+        if regex.search(text) is None: continue
+        hits.extend(search_text_for_hits(path, text, regex, max_hits_per_file))
+    return hits, len(paths)
+
+def search_path_allowed(root_dir, path, includes, excludes):
+    # Same filtering as iter_search_files, for a single path under root_dir
+    rel_path = os.path.normpath(os.path.relpath(path, root_dir))
+    parts = rel_path.split(os.sep)
+    for depth in range(1, len(parts)):
+        if _glob_matches(os.path.join(*parts[:depth]), parts[depth - 1], excludes): return False
+    name = parts[-1]
+    if excludes and _glob_matches(rel_path, name, excludes): return False
+    return not includes or _glob_matches(rel_path, name, includes)
+
+def make_worker_pool():
+    try:
+        return concurrent.futures.ProcessPoolExecutor()
+    except (OSError, NotImplementedError, ImportError): # e.g. no multiprocessing support
+        return concurrent.futures.ThreadPoolExecutor()
+
+def run_in_batches(pool, fn, items, batch_size, cancel, *args):
+    """Submits items to pool in batches of fn(batch, *args), keeping a bounded number
+    in flight, and yields each batch's result as it completes. Stops once cancel is set."""
+    pending = set()
+    max_pending = 4 * (os.cpu_count() or 1)
+    def completed(block):
+        nonlocal pending
+        done, pending = concurrent.futures.wait(
+            pending, timeout=None if block else 0, return_when=concurrent.futures.FIRST_COMPLETED)
+        return [future.result() for future in done]
+    batch = []
+    for item in items:
+        if cancel.is_set(): return
+        batch.append(item)
+        if len(batch) < batch_size: continue
+        pending.add(pool.submit(fn, batch, *args))
+        batch = []
+        yield from completed(block=len(pending) >= max_pending)
+    if batch and not cancel.is_set():
+        pending.add(pool.submit(fn, batch, *args))
+    while pending and not cancel.is_set():
+        yield from completed(block=True)
+
+# --- Search Index ---
+SEARCH_INDEX_FILE = "textra_search_index.db" # Kept next to CONFIG_FILE
+SEARCH_INDEX_DEFAULT_EXCLUDES = ".git;.hg;.svn"
+TRIGRAM_RE = re.compile(rb'(?=(...))', re.DOTALL)
+TRIGRAM_CHUNK_BYTES = 1024 * 1024
+
+def extract_trigrams(data):
+    # Grams are taken from ASCII-lowercased bytes so case-insensitive queries can use them too
+    data = data.lower()
+    grams = set()
+    for start in range(0, max(len(data) - 2, 0), TRIGRAM_CHUNK_BYTES):
+        grams.update(TRIGRAM_RE.findall(data, start, start + TRIGRAM_CHUNK_BYTES + 2))
+    return array('I', sorted(int.from_bytes(gram, 'big') for gram in grams))
+
+# ASCII letters that IGNORECASE also matches outside ASCII (dotted/dotless I, KELVIN SIGN, LONG S)
+NON_ASCII_FOLDING_LETTERS = frozenset("iksIKS")
+
+def required_literals(pattern, flags):
+    """Literal runs that every match of pattern must contain. Alternations, classes and
+    optional parts end a run; an empty list means the pattern can't be narrowed. So does
+    any case folding the ASCII-lowercased index can't mirror, and inline flags, which
+    could switch folding on for part of the pattern."""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (re.error, RecursionError):
+        return []
+    if parsed.state.flags != sre_parse.parse("", flags).state.flags: return [] # Global (?i) and the like
+    nocase = bool(parsed.state.flags & re.IGNORECASE)
+    ascii_only = bool(parsed.state.flags & re.ASCII)
+    runs, run = [], []
+    def flush():
+        if run: runs.append("".join(run))
+        run.clear()
+    def walk(items):
+        for op, arg in items:
+            if op is sre_constants.LITERAL:
+                run.append(chr(arg))
+                continue
+            flush()
+            if op is sre_constants.SUBPATTERN:
+                if arg[1] or arg[2]: return False # Scoped flags such as (?i:...)
+                if not walk(arg[-1]): return False
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and arg[0] >= 1:
+                if not walk(arg[2]): return False
+            flush()
+        return True
+    if not walk(parsed): return []
+    flush()
+    runs = [r for r in runs if len(r.encode('utf-8')) >= 3]
+    if nocase and not ascii_only and any(not r.isascii() or NON_ASCII_FOLDING_LETTERS.intersection(r) for r in runs):
+        return []
+    return runs
+
+def required_trigrams(pattern, flags):
+    grams = set()
+    for literal in required_literals(pattern, flags):
+        grams.update(extract_trigrams(literal.encode('utf-8')))
+    return sorted(grams)
+
+def trigram_index_worker(paths, max_bytes):
+    # Runs in a worker process: (path, mtime, size, kind, packed grams) per readable file
+    entries = []
+    for path in paths:
+        try:
+            file_stat = os.stat(path)
+            if file_stat.st_size > max_bytes:
+                entries.append((path, file_stat.st_mtime, file_stat.st_size, TrigramIndex.UNINDEXED, b""))
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        if b'\0' in data[:8192]: # Binary, never searched
+            entries.append((path, file_stat.st_mtime, file_stat.st_size, TrigramIndex.BINARY, b""))
+        else:
+            entries.append((path, file_stat.st_mtime, file_stat.st_size, TrigramIndex.INDEXED, extract_trigrams(data).tobytes()))
+    return entries
+
+class TrigramIndex:
+    """On-disk trigram index over folders for Find in Files. A query is narrowed to the
+    files that hold every trigram of its required literals before the regex runs."""
+    INDEXED, UNINDEXED, BINARY = 0, 1, 2
+    MAX_FILE_BYTES = 16 * 1024 * 1024 # Larger files aren't indexed and are always searched
+    BATCH_FILES = 64
+
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+        self._lock = threading.Lock() # Serializes refreshes and queries
+        self._dirty_lock = threading.Lock()
+        self._dirty_paths = set() # Saved by the editor since the last refresh
+        self._root_files = {} # root id: {file id: (path, kind)}
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS roots (id INTEGER PRIMARY KEY, path TEXT UNIQUE, complete INTEGER DEFAULT 0);
+            CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, root_id INTEGER, path TEXT,
+                mtime REAL, size INTEGER, kind INTEGER, grams BLOB, UNIQUE (root_id, path));
+            CREATE TABLE IF NOT EXISTS postings (gram INTEGER, file_id INTEGER, PRIMARY KEY (gram, file_id)) WITHOUT ROWID;
+        """)
+        return db
+
+    def invalidate_path(self, path):
+        with self._dirty_lock:
+            self._dirty_paths.add(os.path.abspath(path))
+
+    def _dirty_under(self, root):
+        prefix = os.path.join(root, "")
+        with self._dirty_lock:
+            return {path for path in self._dirty_paths if path.startswith(prefix)}
+
+    def refresh(self, root_dir, excludes, cancel, on_progress=None):
+        """Brings the index for root_dir up to date, re-reading only files whose mtime or
+        size changed or that were saved from the editor. Returns False if cancelled."""
+        root = os.path.abspath(root_dir)
+        dirty = self._dirty_under(root)
+        with self._dirty_lock:
+            self._dirty_paths -= dirty
+        with self._lock:
+            db = self._connect()
+            try:
+                row = db.execute("SELECT id FROM roots WHERE path=?", (root,)).fetchone()
+                root_id = row[0] if row else db.execute("INSERT INTO roots (path) VALUES (?)", (root,)).lastrowid
+                known = {path: (file_id, mtime, size) for file_id, path, mtime, size in
+                         db.execute("SELECT id, path, mtime, size FROM files WHERE root_id=?", (root_id,))}
+                seen, changed = set(), []
+                for path in iter_search_files(root, [], excludes):
+                    if cancel.is_set(): break
+                    try:
+                        file_stat = os.stat(path)
+                    except OSError:
+                        continue
+                    seen.add(path)
+                    old = known.get(path)
+                    if old is None or path in dirty or old[1] != file_stat.st_mtime or old[2] != file_stat.st_size:
+                        changed.append(path)
+                complete = not cancel.is_set()
+                if complete:
+                    for path in known.keys() - seen: self._remove_file(db, known[path][0])
+
+                pool = make_worker_pool() if changed else None
+                try:
+                    indexed = 0
+                    for entries in run_in_batches(pool, trigram_index_worker, changed, self.BATCH_FILES,
+                                                  cancel, self.MAX_FILE_BYTES):
+                        for path, mtime, size, kind, grams in entries:
+                            if path in known: self._remove_file(db, known[path][0])
+                            file_id = db.execute(
+                                "INSERT INTO files (root_id, path, mtime, size, kind, grams) VALUES (?, ?, ?, ?, ?, ?)",
+                                (root_id, path, mtime, size, kind, grams)).lastrowid
+                            db.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?)",
+                                           ((gram, file_id) for gram in array('I', grams)))
+                        indexed += self.BATCH_FILES
+                        db.commit()
+                        if on_progress: on_progress(min(indexed, len(changed)), len(changed))
+                finally:
+                    if pool: pool.shutdown(wait=False, cancel_futures=True)
+                complete = complete and not cancel.is_set()
+                if complete: db.execute("UPDATE roots SET complete=1 WHERE id=?", (root_id,))
+                db.commit()
+                self._root_files.pop(root_id, None)
+            finally:
+                db.close()
+        if not complete:
+            with self._dirty_lock:
+                self._dirty_paths |= dirty
+        return complete
+
+    def _remove_file(self, db, file_id):
+        row = db.execute("SELECT grams FROM files WHERE id=?", (file_id,)).fetchone()
+        if row and row[0]:
+            db.executemany("DELETE FROM postings WHERE gram=? AND file_id=?",
+                           ((gram, file_id) for gram in array('I', row[0])))
+        db.execute("DELETE FROM files WHERE id=?", (file_id,))
+
+    def candidates(self, root_dir, pattern, flags):
+        """Sorted paths under root_dir that may match, or None if the folder isn't fully indexed."""
+        root = os.path.abspath(root_dir)
+        grams = required_trigrams(pattern, flags)
+        with self._lock:
+            db = self._connect()
+            try:
+                row = db.execute("SELECT id, complete FROM roots WHERE path=?", (root,)).fetchone()
+                if not (row and row[1]): return None
+                root_id = row[0]
+                files = self._root_files.get(root_id)
+                if files is None:
+                    files = {file_id: (path, kind) for file_id, path, kind in
+                             db.execute("SELECT id, path, kind FROM files WHERE root_id=?", (root_id,))}
+                    self._root_files[root_id] = files
+                if grams:
+                    file_ids = None
+                    for gram in grams:
+                        ids = {r[0] for r in db.execute("SELECT file_id FROM postings WHERE gram=?", (gram,))}
+                        file_ids = ids if file_ids is None else file_ids & ids
+                        if not file_ids: break
+                    result = {files[i][0] for i in file_ids if i in files}
+                else:
+                    result = {path for path, kind in files.values() if kind == self.INDEXED}
+                result.update(path for path, kind in files.values() if kind == self.UNINDEXED)
+            finally:
+                db.close()
+        result.update(self._dirty_under(root))
+        return sorted(result)
+
+
+# --- Line Number Gutter ---
+class LineNumberGutter:
+    """Draws line numbers on a Canvas from a pool of reusable text items. Only labels
+    and coordinates that actually changed are sent to Tk, and a redraw is skipped
+    entirely while the viewport, line count and colors stay the same."""
+
+    RIGHT_PADDING = 5
+    LEFT_PADDING = 8
+    MIN_DIGITS = 3
+
+    def __init__(self, canvas, text_area, editor_font):
+        self.canvas = canvas
+        self.text_area = text_area
+        self.editor_font = editor_font
+        self._items = []  # Canvas item ids, reused between redraws
+        self._labels = [] # Label currently shown by each item
+        self._ys = []     # y-coordinate currently used by each item
+        self._shown = 0   # Items [0, _shown) are visible, the rest hidden
+        self._x = None
+        self._fill = None
+        self._last_key = None
+        self._wrapped = True
+        self._retry_pending = False
+        self.line_number_offset = 0 # Set by MappedFileView, which shows a window of the file
+        self._digits = None
+        self._digit_width = None
+        self._width = int(canvas.cget("width"))
+
+    def invalidate(self):
+        self._last_key = None
+
+    def font_changed(self):
+        self._digit_width = None
+        self._digits = None
+        self._last_key = None
+
+    def _fit_width(self, largest_label):
+        # Size the gutter to the digit count; only re-measured when the font changes
+        digits = max(len(str(largest_label)), self.MIN_DIGITS)
+        if digits == self._digits: return
+        if self._digit_width is None: self._digit_width = self.editor_font.measure('0')
+        self._digits = digits
+        self._width = digits * self._digit_width + self.LEFT_PADDING + self.RIGHT_PADDING
+        self.canvas.config(width=self._width)
+
+    # Change-listener interface (see TextChangeProxy)
+    def before_change(self, proxy, start, end): pass
+
+    def after_change(self, proxy, start, end):
+        # With wrapping on, an edit can change line heights without changing the line count
+        if self._wrapped: self._last_key = None
+
+    def _retry_later(self):
+        if self._retry_pending: return
+        self._retry_pending = True
+        def retry():
+            self._retry_pending = False
+            self.redraw()
+        self.canvas.after(50, retry)
+
+    def _visible_rows(self, first_line, first_info, total_lines, canvas_height):
+        rows = []
+        if not self._wrapped:
+            # Every line is exactly one display line tall, no need to ask Tk per line
+            y, line_height = first_info[1], max(first_info[3], 1)
+            line_num = first_line
+            while y < canvas_height and line_num <= total_lines:
+                rows.append((line_num, y))
+                line_num += 1
+                y += line_height
+            return rows
+
+        line_num = first_line
+        while line_num <= total_lines:
+            info = first_info if line_num == first_line else self.text_area.dlineinfo(f"{line_num}.0")
+            if info is None: break # Past the bottom of the viewport
+            if info[1] >= canvas_height: break
+            rows.append((line_num, info[1]))
+            line_num += 1
+        return rows
+
+    def redraw(self, force=False):
+        text_area, canvas = self.text_area, self.canvas
+        try:
+            first_index = text_area.index("@0,0")
+            first_info = text_area.dlineinfo(first_index)
+            if first_info is None: # Not yet rendered
+                self._retry_later()
+                return
+            self._wrapped = text_area.cget("wrap") != tk.NONE
+            line_index = getattr(text_area, 'line_index', None)
+            total_lines = line_index.line_count if line_index and line_index.ready else _line_of(text_area.index("end-1c"))
+            canvas_height = canvas.winfo_height()
+        except tk.TclError: # Can happen if widget is not fully mapped
+            self._retry_later()
+            return
+
+        self._fit_width(total_lines + self.line_number_offset)
+        x = self._width - self.RIGHT_PADDING
+
+        first_line = _line_of(first_index)
+        fill = current_theme_settings['linenum_fg']
+        key = (first_line, first_info[1], first_info[3], canvas_height, x, total_lines, self._wrapped, fill,
+               self.line_number_offset)
+        if not force and key == self._last_key: return
+        self._last_key = key
+
+        if fill != self._fill or x != self._x:
+            for i, item in enumerate(self._items):
+                canvas.itemconfigure(item, fill=fill)
+                canvas.coords(item, x, self._ys[i])
+            self._fill, self._x = fill, x
+
+        rows = self._visible_rows(first_line, first_info, total_lines, canvas_height)
+        for i, (line_num, y) in enumerate(rows):
+            label = str(line_num + self.line_number_offset)
+            if i == len(self._items):
+                self._items.append(canvas.create_text(x, y, anchor=tk.NE, text=label,
+                                                      font=self.editor_font, fill=fill))
+                self._labels.append(label)
+                self._ys.append(y)
+                continue
+            item = self._items[i]
+            if self._labels[i] != label:
+                canvas.itemconfigure(item, text=label)
+                self._labels[i] = label
+            if self._ys[i] != y:
+                canvas.coords(item, x, y)
+                self._ys[i] = y
+            if i >= self._shown:
+                canvas.itemconfigure(item, state=tk.NORMAL)
+
+        for i in range(len(rows), self._shown):
+            canvas.itemconfigure(self._items[i], state=tk.HIDDEN)
+        self._shown = len(rows)
+
+
+# --- UI Refresh Scheduling ---
+# Per-part debounce in milliseconds; 0 means "on the next idle tick". Overridable
+# through the "refresh_debounce_ms" mapping in textra_config.json.
+DEFAULT_REFRESH_DEBOUNCE_MS = {"modified": 0, "status": 0, "gutter": 0, "syntax": 0, "brackets": 30, "search_hits": 100}
+# Keys that move the cursor without editing; edits are reported through the change proxy
+CURSOR_KEYSYMS = {"Left", "Right", "Up", "Down", "Home", "End", "Prior", "Next"}
+
+class RefreshScheduler:
+    """Coalesces refresh requests: event handlers only mark UI parts as dirty, and each
+    dirty part is refreshed once on the next idle tick (or after its debounce delay)."""
+
+    def __init__(self, widget, debounce_ms=None):
+        self.widget = widget
+        self.debounce_ms = dict(DEFAULT_REFRESH_DEBOUNCE_MS)
+        if debounce_ms: self.debounce_ms.update(debounce_ms)
+        self._handlers = {} # part: callback, flushed in registration order
+        self._ready = set()
+        self._timers = {}   # part: pending debounce after() id
+        self._idle_job = None
+
+    def register(self, part, callback):
+        self._handlers[part] = callback
+
+    def mark_dirty(self, *parts):
+        for part in parts:
+            delay = self.debounce_ms.get(part, 0)
+            if delay > 0:
+                if part in self._timers: self.widget.after_cancel(self._timers[part])
+                self._timers[part] = self.widget.after(delay, lambda p=part: self._debounce_elapsed(p))
+            else:
+                self._ready.add(part)
+        if self._ready and self._idle_job is None:
+            self._idle_job = self.widget.after_idle(self.flush)
+
+    def _debounce_elapsed(self, part):
+        self._timers.pop(part, None)
+        self._ready.add(part)
+        if self._idle_job is None:
+            self._idle_job = self.widget.after_idle(self.flush)
+
+    def flush(self):
+        self._idle_job = None
+        ready, self._ready = self._ready, set()
+        for part, callback in self._handlers.items():
+            if part in ready: callback()
+
+
+# --- Bracket Matching Index ---
+BRACKET_PAIRS = {'(': ')', '[': ']', '{': '}'}
+CLOSING_BRACKETS = {v: k for k, v in BRACKET_PAIRS.items()}
+
+# Which comment and string delimiters hide brackets, by file extension.
+# "multi" delimiters may span lines and are tracked as lexer state between lines.
+BRACKET_SYNTAX_PROFILES = {
+    "python": {"line_comments": ("#",), "multi": {'"""': '"""', "'''": "'''"}, "quotes": ('"', "'")},
+    "c": {"line_comments": ("//",), "multi": {"/*": "*/"}, "quotes": ('"', "'", "`")},
+    "hash": {"line_comments": ("#",), "multi": {}, "quotes": ('"', "'")},
+    "plain": {"line_comments": (), "multi": {}, "quotes": ()},
+}
+BRACKET_SYNTAX_BY_EXTENSION = {
+    ".py": "python", ".pyw": "python",
+    ".c": "c", ".h": "c", ".cc": "c", ".cpp": "c", ".hpp": "c", ".cs": "c", ".java": "c",
+    ".js": "c", ".jsx": "c", ".ts": "c", ".tsx": "c", ".json": "c", ".go": "c", ".rs": "c",
+    ".swift": "c", ".kt": "c", ".css": "c", ".scss": "c", ".php": "c",
+    ".sh": "hash", ".bash": "hash", ".rb": "hash", ".pl": "hash", ".r": "hash",
+    ".yaml": "hash", ".yml": "hash", ".toml": "hash", ".cfg": "hash", ".ini": "hash",
+}
+
+class BracketIndex:
+    """Per-line bracket positions for one tab, skipping brackets inside strings and
+    comments. Lines are lexed once (in idle-time chunks) and edits only re-lex lines
+    until the lexer state converges again, so matching walks plain Python lists
+    instead of stepping through the Text widget one character at a time."""
+
+    SCAN_WINDOW_LINES = 20000 # Upper bound for a single search
+    BLOCK_LINES = 500         # Lines fetched from Tk per get() call
+    CATCH_UP_LINES = 5000     # Lines lexed per idle step while building the index
+    CONVERGE_LIMIT = 2000     # Re-lexed lines after an edit before deferring to catch-up
+    _EMPTY = ((), "")
+
+    def __init__(self, file_path=None):
+        self.set_file_path(file_path)
+
+    def set_file_path(self, file_path):
+        ext = os.path.splitext(file_path)[1].lower() if file_path else ""
+        profile_name = BRACKET_SYNTAX_BY_EXTENSION.get(ext, "plain")
+        if getattr(self, 'profile_name', None) == profile_name: return
+        self.profile_name = profile_name
+        profile = BRACKET_SYNTAX_PROFILES[profile_name]
+        self._line_comments = profile["line_comments"]
+        self._multi = profile["multi"]
+        self._quote_end_re = {q: re.compile(r'(?:[^%s\\]|\\.)*%s' % (re.escape(q), re.escape(q)))
+                              for q in profile["quotes"]}
+        tokens = list(BRACKET_PAIRS) + list(CLOSING_BRACKETS) + list(self._line_comments) \
+                 + list(self._multi) + list(profile["quotes"])
+        tokens.sort(key=len, reverse=True) # '"""' must win over '"'
+        self._token_re = re.compile("|".join(re.escape(t) for t in tokens))
+        self.invalidate()
+
+    def invalidate(self):
+        self._records = []     # (cols, chars) for each indexed line
+        self._states = [None]  # Lexer state entering each indexed line, plus one past the end
+        self._complete = False
+        self._cache = {}
+        self._pending_edit = None
+
+    # --- Lexing ---
+    def _scan_line(self, line, state):
+        cols, chars = [], []
+        pos = 0
+        while True:
+            if state is not None: # Inside a multi-line string or comment
+                end = line.find(state, pos)
+                if end < 0: break
+                pos, state = end + len(state), None
+                continue
+            match = self._token_re.search(line, pos)
+            if not match: break
+            token, pos = match.group(), match.end()
+            if token in BRACKET_PAIRS or token in CLOSING_BRACKETS:
+                cols.append(match.start())
+                chars.append(token)
+            elif token in self._line_comments:
+                break
+            elif token in self._multi:
+                state = self._multi[token]
+            else:
+                quote_end = self._quote_end_re[token].match(line, pos)
+                if not quote_end: break # Unterminated string runs to the end of the line
+                pos = quote_end.end()
+        record = (tuple(cols), "".join(chars)) if cols else self._EMPTY
+        return record, state
+
+    @staticmethod
+    def _get_lines(proxy, first, last):
+        # 0-based inclusive line range
+        return proxy.get_lines(first + 1, last + 1).split('\n')
+
+    # --- Change-listener interface (see TextChangeProxy) ---
+    def before_change(self, proxy, start, end):
+        self._pending_edit = (_line_of(start) - 1, _line_of(end) - 1)
+
+    def after_change(self, proxy, start, end):
+        self._cache.clear()
+        if self._pending_edit is None: return
+        first, old_last = self._pending_edit
+        self._pending_edit = None
+        new_last = _line_of(end) - 1
+        indexed = len(self._records)
+        if first >= indexed: return # Nothing indexed there yet
+        if old_last >= indexed - 1:
+            # The edit reaches the unindexed tail; let catch-up redo it
+            self._truncate(first, proxy)
+            return
+
+        state = self._states[first]
+        new_records, new_states = [], []
+        for text in self._get_lines(proxy, first, new_last):
+            new_states.append(state)
+            record, state = self._scan_line(text, state)
+            new_records.append(record)
+        self._records[first:old_last + 1] = new_records
+        self._states[first:old_last + 1] = new_states
+
+        # Keep re-lexing below the edit until the state matches what was there before
+        i = new_last + 1
+        relexed = 0
+        while i < len(self._records) and self._states[i] != state:
+            if relexed >= self.CONVERGE_LIMIT:
+                self._truncate(i, proxy, state)
+                return
+            block_last = min(len(self._records) - 1, i + self.BLOCK_LINES - 1)
+            for text in self._get_lines(proxy, i, block_last):
+                if self._states[i] == state: break
+                self._states[i] = state
+                self._records[i], state = self._scan_line(text, state)
+                i += 1
+                relexed += 1
+        if i == len(self._records): self._states[i] = state
+
+    def _truncate(self, line, proxy, state=None):
+        del self._records[line:]
+        del self._states[line + 1:]
+        if state is not None: self._states[line] = state
+        self._complete = False
+        self.schedule_catch_up(proxy)
+
+    # --- Background indexing ---
+    def schedule_catch_up(self, proxy):
+        if self._complete or getattr(self, '_catch_up_job', None): return
+        self._catch_up_job = proxy.text_area.after(1, lambda: self._catch_up(proxy))
+
+    def _catch_up(self, proxy):
+        self._catch_up_job = None
+        try:
+            total = _line_of(proxy.index("end-1c"))
+            first = len(self._records)
+            last = min(total - 1, first + self.CATCH_UP_LINES - 1)
+            state = self._states[-1]
+            if first <= last:
+                for text in self._get_lines(proxy, first, last):
+                    record, state = self._scan_line(text, state)
+                    self._records.append(record)
+                    self._states.append(state)
+            if len(self._records) >= total:
+                self._complete = True
+            else:
+                self.schedule_catch_up(proxy)
+        except tk.TclError: # Widget destroyed while indexing
+            pass
+
+    # --- Matching ---
+    def _iter_records(self, proxy, first, forward, total):
+        # Yields (line, record) pairs starting at 'first', bounded by SCAN_WINDOW_LINES.
+        # Lines past the indexed region are lexed on the fly; if the gap is wider than
+        # the window, lexing restarts from a neutral state (best effort).
+        indexed = len(self._records)
+        if forward:
+            last = min(total - 1, first + self.SCAN_WINDOW_LINES)
+            line = first
+            while line <= last and line < indexed:
+                yield line, self._records[line]
+                line += 1
+            state = self._states[indexed] if line == indexed else None
+            while line <= last:
+                block_last = min(last, line + self.BLOCK_LINES - 1)
+                for text in self._get_lines(proxy, line, block_last):
+                    record, state = self._scan_line(text, state)
+                    yield line, record
+                    line += 1
+        else:
+            stop = max(0, first - self.SCAN_WINDOW_LINES)
+            if first >= indexed:
+                low = max(indexed, stop)
+                state = self._states[indexed] if low == indexed else None
+                temp = []
+                for text in self._get_lines(proxy, low, first):
+                    record, state = self._scan_line(text, state)
+                    temp.append(record)
+                for offset in range(len(temp) - 1, -1, -1):
+                    yield low + offset, temp[offset]
+                first = low - 1
+            for line in range(first, stop - 1, -1):
+                yield line, self._records[line]
+
+    def _search(self, proxy, line, col, bracket, total):
+        forward = bracket in BRACKET_PAIRS
+        target = BRACKET_PAIRS.get(bracket) or CLOSING_BRACKETS[bracket]
+        depth = 0
+        for current, (cols, chars) in self._iter_records(proxy, line, forward, total):
+            if bracket not in chars and target not in chars: continue
+            if current == line: # Only look past the starting bracket
+                k = bisect.bisect_left(cols, col)
+                positions = range(k + 1, len(cols)) if forward else range(k - 1, -1, -1)
+            else:
+                positions = range(len(cols)) if forward else range(len(cols) - 1, -1, -1)
+            for k in positions:
+                if chars[k] == bracket:
+                    depth += 1
+                elif chars[k] == target:
+                    if depth == 0: return current, cols[k]
+                    depth -= 1
+        return None
+
+    def match_at(self, proxy, line, col, total_lines):
+        """Returns the Tk indices of the bracket next to line.col and its partner, or None."""
+        key = (line, col)
+        if key in self._cache: return self._cache[key]
+        self.schedule_catch_up(proxy)
+
+        line0 = line - 1
+        _, (cols, chars) = next(self._iter_records(proxy, line0, True, total_lines))
+        result = None
+        for candidate in (col - 1, col): # Char before the cursor first, then the one at it
+            k = bisect.bisect_left(cols, candidate)
+            if k < len(cols) and cols[k] == candidate:
+                found = self._search(proxy, line0, candidate, chars[k], total_lines)
+                if found:
+                    result = (f"{line}.{candidate}", f"{found[0] + 1}.{found[1]}")
+                    break
+        if self._complete: self._cache[key] = result
+        return result
+
+
+# --- Syntax Highlighting ---
+# A lexer takes one line and the state left by the previous line and returns
+# ([(token_type, start_col, end_col), ...], state for the next line). States must
+# be comparable with ==, since re-lexing after an edit stops once they match again.
+SYNTAX_TOKEN_TYPES = ("keyword", "builtin", "string", "comment", "number",
+                      "definition", "property", "heading", "emphasis", "link")
+
+PYTHON_KEYWORDS = frozenset(keyword.kwlist)
+PYTHON_BUILTINS = frozenset(name for name in dir(builtins) if not name.startswith('_'))
+PYTHON_TOKEN_RE = re.compile(r"""
+    (?P<comment>\#.*)
+  | (?P<string>[rRbBuUfF]{0,2}(?:\"\"\"|'''|"(?:[^"\\]|\\.)*"?|'(?:[^'\\]|\\.)*'?))
+  | (?P<decorator>@[\w.]+)
+  | (?P<number>(?<![\w.])(?:0[xXoObB][\da-fA-F_]+|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d[\d_]*)?[jJ]?))
+  | (?P<name>[^\W\d]\w*)
+""", re.VERBOSE)
+
+def lex_python_line(line, state):
+    # state is the closing delimiter of an open triple-quoted string, or None
+    tokens = []
+    pos = 0
+    if state:
+        end = line.find(state)
+        if end < 0: return [("string", 0, len(line))], state
+        pos = end + 3
+        tokens.append(("string", 0, pos))
+    after_def = False
+    while True:
+        match = PYTHON_TOKEN_RE.search(line, pos)
+        if not match: break
+        kind = match.lastgroup
+        start, pos = match.span()
+        if kind == "name":
+            word = match.group()
+            if after_def:
+                tokens.append(("definition", start, pos))
+            elif word in PYTHON_KEYWORDS:
+                tokens.append(("keyword", start, pos))
+            elif word in PYTHON_BUILTINS and line[start - 1:start] != '.':
+                tokens.append(("builtin", start, pos))
+            after_def = word in ("def", "class")
+            continue
+        if kind == "string":
+            quote = match.group().lstrip("rRbBuUfF")
+            if quote in ('"""', "'''"):
+                end = line.find(quote, pos)
+                if end < 0:
+                    tokens.append(("string", start, len(line)))
+                    return tokens, quote
+                pos = end + 3
+        tokens.append(("definition" if kind == "decorator" else kind, start, pos))
+        after_def = False
+    return tokens, None
+
+JSON_TOKEN_RE = re.compile(r'(?P<string>"(?:[^"\\]|\\.)*"?)(?P<colon>\s*:)?'
+                           r'|(?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)'
+                           r'|(?P<keyword>\b(?:true|false|null)\b)')
+
+def lex_json_line(line, state):
+    tokens = []
+    for match in JSON_TOKEN_RE.finditer(line):
+        if match.group("string") is not None:
+            kind = "property" if match.group("colon") else "string"
+            tokens.append((kind, match.start(), match.end("string")))
+        else:
+            tokens.append((match.lastgroup, match.start(), match.end()))
+    return tokens, None
+
+MARKDOWN_FENCE_RE = re.compile(r" {0,3}(```|~~~)")
+MARKDOWN_BLOCK_RE = re.compile(r"(?P<heading> {0,3}#{1,6}(?:\s.*)?$)|(?P<comment> {0,3}>.*)"
+                               r"|(?P<keyword>\s*(?:[-*+]|\d+[.)])(?=\s))")
+MARKDOWN_INLINE_RE = re.compile(r"(?P<string>`[^`]+`)"
+                                r"|(?P<emphasis>\*\*[^*]+\*\*|__[^_]+__|\*[^*\s][^*]*\*|\b_[^_\s][^_]*_\b)"
+                                r"|(?P<link>!?\[[^\]]*\]\([^)]*\)|<https?://[^>\s]+>)")
+
+def lex_markdown_line(line, state):
+    # state is the fence that opened the current code block, or None
+    fence = MARKDOWN_FENCE_RE.match(line)
+    if state:
+        return [("string", 0, len(line))], None if fence and fence.group(1) == state else state
+    if fence:
+        return [("string", 0, len(line))], fence.group(1)
+    tokens = []
+    pos = 0
+    block = MARKDOWN_BLOCK_RE.match(line)
+    if block:
+        tokens.append((block.lastgroup, block.start(), block.end()))
+        if block.lastgroup != "keyword": return tokens, None # Headings and quotes take the whole line
+        pos = block.end()
+    for match in MARKDOWN_INLINE_RE.finditer(line, pos):
+        tokens.append((match.lastgroup, match.start(), match.end()))
+    return tokens, None
+
+SYNTAX_LEXERS = {"python": lex_python_line, "json": lex_json_line, "markdown": lex_markdown_line}
+SYNTAX_LANGUAGE_BY_EXTENSION = {
+    ".py": "python", ".pyw": "python", ".pyi": "python",
+    ".json": "json", ".geojson": "json", ".ipynb": "json",
+    ".md": "markdown", ".markdown": "markdown",
+}
+
+class SyntaxHighlighter:
+    """Syntax tags for one tab. The lexer state at the start of every lexed line is
+    kept, so an edit only re-lexes lines until the state converges again. Visible
+    lines are tagged first (refresh_viewport) and the rest in idle-time chunks."""
+
+    BLOCK_LINES = 500         # Lines fetched from Tk per get() call
+    CATCH_UP_LINES = 400      # Lines lexed and tagged per idle step
+    CONVERGE_LIMIT = 2000     # Re-lexed lines after an edit before deferring to catch-up
+    LEX_AHEAD_LINES = 5000    # Untagged lines lexed to reach the viewport with the right state
+    MAX_LINE_CHARS = 20000    # Longer lines are left untagged
+
+    def __init__(self, proxy, file_path=None):
+        self.proxy = proxy
+        self.language = None
+        self.lexer = None
+        self._catch_up_job = None
+        self._reset()
+        self.set_file_path(file_path)
+
+    def set_file_path(self, file_path):
+        ext = os.path.splitext(file_path)[1].lower() if file_path else ""
+        language = SYNTAX_LANGUAGE_BY_EXTENSION.get(ext)
+        if language == self.language: return
+        self.language = language
+        self.lexer = SYNTAX_LEXERS.get(language)
+        for token_type in SYNTAX_TOKEN_TYPES:
+            self.proxy.text_area.tag_remove("syntax_" + token_type, "1.0", tk.END)
+        self._reset()
+        self.schedule_catch_up()
+
+    def _reset(self):
+        self._states = [None] # Lexer state at the start of each lexed line, plus one past the end
+        self._painted = bytearray() # Per lexed line: 1 if its tags are current
+        self._paint_from = 0 # No unpainted line before this one
+        self._provisional_view = None
+        self._pending_edit = None
+        self._complete = self.lexer is None
+
+    def _lex(self, text, state):
+        if len(text) > self.MAX_LINE_CHARS: return (), state
+        return self.lexer(text, state)
+
+    def _get_lines(self, first, last):
+        # 0-based inclusive line range
+        return self.proxy.get_lines(first + 1, last + 1).split('\n')
+
+    def _paint(self, first, token_lists):
+        # Replaces the syntax tags on lines first.. with one tag add call per token type
+        last = first + len(token_lists) - 1
+        text_area = self.proxy.text_area
+        for token_type in SYNTAX_TOKEN_TYPES:
+            text_area.tag_remove("syntax_" + token_type, f"{first + 1}.0", f"{last + 1}.end")
+        ranges = {}
+        for line, tokens in enumerate(token_lists, first + 1):
+            for token_type, start, end in tokens:
+                if end > start: ranges.setdefault(token_type, []).extend((f"{line}.{start}", f"{line}.{end}"))
+        for token_type, indices in ranges.items():
+            text_area.tag_add("syntax_" + token_type, *indices)
+
+    def _lex_and_paint(self, first, last):
+        # first must not be past the lexed region
+        state = self._states[first]
+        token_lists = []
+        for line, text in enumerate(self._get_lines(first, last), first):
+            tokens, state = self._lex(text, state)
+            token_lists.append(tokens)
+            if line < len(self._painted):
+                self._painted[line] = 1
+                self._states[line + 1] = state
+            else:
+                self._painted.append(1)
+                self._states.append(state)
+        self._paint(first, token_lists)
+
+    def _lex_ahead(self, last):
+        # Extends the lexed region to 'last' without tagging
+        first = len(self._painted)
+        state = self._states[-1]
+        while first <= last:
+            block_last = min(last, first + self.BLOCK_LINES - 1)
+            for text in self._get_lines(first, block_last):
+                _, state = self._lex(text, state)
+                self._painted.append(0)
+                self._states.append(state)
+            first = block_last + 1
+
+    # --- Change-listener interface (see TextChangeProxy) ---
+    def before_change(self, proxy, start, end):
+        self._pending_edit = (_line_of(start) - 1, _line_of(end) - 1)
+
+    def after_change(self, proxy, start, end):
+        if self._pending_edit is None or self.lexer is None: return
+        first, old_last = self._pending_edit
+        self._pending_edit = None
+        self._provisional_view = None
+        new_last = _line_of(end) - 1
+        lexed = len(self._painted)
+        if first >= lexed: return # Nothing lexed there yet
+        if old_last >= lexed - 1:
+            # The edit reaches the unlexed tail; let catch-up redo it
+            self._truncate(first)
+            return
+
+        state = self._states[first]
+        new_states = []
+        for text in self._get_lines(first, new_last):
+            new_states.append(state)
+            _, state = self._lex(text, state)
+        self._states[first:old_last + 1] = new_states
+        self._painted[first:old_last + 1] = bytes(len(new_states))
+        self._paint_from = min(self._paint_from, first)
+
+        # Keep re-lexing below the edit until the state matches what was there before
+        lexed = len(self._painted)
+        i = new_last + 1
+        relexed = 0
+        while i < lexed and self._states[i] != state:
+            if relexed >= self.CONVERGE_LIMIT:
+                self._truncate(i, state)
+                return
+            block_last = min(lexed - 1, i + self.BLOCK_LINES - 1)
+            for text in self._get_lines(i, block_last):
+                if self._states[i] == state: break
+                self._states[i] = state
+                self._painted[i] = 0
+                _, state = self._lex(text, state)
+                i += 1
+                relexed += 1
+        if i == lexed: self._states[i] = state
+        self._complete = False
+        self.schedule_catch_up()
+
+    def invalidate(self):
+        self._truncate(0)
+
+    def _truncate(self, line, state=None):
+        del self._painted[line:]
+        del self._states[line + 1:]
+        if state is not None: self._states[line] = state
+        self._paint_from = min(self._paint_from, line)
+        self._complete = self.lexer is None
+        self.schedule_catch_up()
+
+    # --- Tagging ---
+    def refresh_viewport(self):
+        """Tags the visible lines that aren't current yet."""
+        if self.lexer is None: return
+        text_area = self.proxy.text_area
+        try:
+            top = _line_of(text_area.index("@0,0")) - 1
+            bottom = _line_of(text_area.index(f"@0,{text_area.winfo_height()}")) - 1
+            lexed = len(self._painted)
+            if top > lexed + self.LEX_AHEAD_LINES:
+                # Far past the lexed region: tag from a neutral state for now,
+                # catch-up retags these lines once it gets here
+                if self._provisional_view != (top, bottom):
+                    self._provisional_view = (top, bottom)
+                    state, token_lists = None, []
+                    for text in self._get_lines(top, bottom):
+                        tokens, state = self._lex(text, state)
+                        token_lists.append(tokens)
+                    self._paint(top, token_lists)
+                self.schedule_catch_up()
+                return
+            if bottom >= lexed: self._lex_ahead(bottom)
+            line = self._painted.find(0, top, bottom + 1)
+            while line >= 0:
+                run_end = line
+                while run_end < bottom and not self._painted[run_end + 1]: run_end += 1
+                self._lex_and_paint(line, run_end)
+                line = self._painted.find(0, run_end + 1, bottom + 1)
+        except tk.TclError: # Widget destroyed
+            return
+        self.schedule_catch_up()
+
+    def schedule_catch_up(self):
+        if self._complete or self._catch_up_job: return
+        self._catch_up_job = self.proxy.text_area.after(1, self._catch_up)
+
+    def _catch_up(self):
+        self._catch_up_job = None
+        try:
+            total = _line_of(self.proxy.index("end-1c"))
+            first = self._painted.find(0, self._paint_from)
+            if first < 0: first = len(self._painted)
+            last = min(total - 1, first + self.CATCH_UP_LINES - 1)
+            if first <= last: self._lex_and_paint(first, last)
+            self._paint_from = last + 1
+            if len(self._painted) >= total and self._painted.find(0) < 0:
+                self._complete = True
+            else:
+                self.schedule_catch_up()
+        except tk.TclError: # Widget destroyed while tagging
+            pass
+
+
+# --- Encodings ---
+ENCODING_SNIFF_BYTES = 64 * 1024 # Prefix of a streamed file used to pick its encoding and newlines
+FALLBACK_ENCODING = "latin-1" # Decodes any byte sequence; override with "fallback_encoding" in the config
+# UTF-32 LE first: its byte order mark starts with UTF-16 LE's
+BYTE_ORDER_MARKS = ((codecs.BOM_UTF32_LE, "utf-32-le"), (codecs.BOM_UTF32_BE, "utf-32-be"),
+                    (codecs.BOM_UTF8, "utf-8"), (codecs.BOM_UTF16_LE, "utf-16-le"),
+                    (codecs.BOM_UTF16_BE, "utf-16-be"))
+NEWLINE_NAMES = {"\n": "LF", "\r\n": "CRLF", "\r": "CR"}
+
+class TextFormat:
+    """How a file's text is stored on disk: the codec, whether it starts with a byte
+    order mark and which newline it uses. The buffer itself always holds "\n" and no
+    mark, so saving with the format the file was opened with writes it back unchanged
+    (unless it mixed newline styles)."""
+    __slots__ = ("encoding", "bom", "newline")
+
+    def __init__(self, encoding="utf-8", bom=False, newline="\n"):
+        self.encoding = encoding
+        self.bom = bom
+        self.newline = newline
+
+    @property
+    def label(self):
+        name = self.encoding.upper().replace("-LE", " LE").replace("-BE", " BE")
+        return f"{name}{' BOM' if self.bom else ''}  {NEWLINE_NAMES.get(self.newline, 'LF')}"
+
+def detect_newline(text):
+    # The first line ending decides; works on str and bytes alike
+    lf, cr = ("\n", "\r") if isinstance(text, str) else (b"\n", b"\r")
+    first_lf, first_cr = text.find(lf), text.find(cr)
+    if first_cr < 0 or 0 <= first_lf < first_cr: return "\n"
+    return "\r\n" if first_lf == first_cr + 1 else "\r"
+
+def sniff_text_format(data, complete=False):
+    """Picks the TextFormat for a file from its first bytes (all of them if complete).
+    Returns (text_format, ascii_only)."""
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if data.startswith(mark):
+            sample = data[len(mark):len(mark) + ENCODING_SNIFF_BYTES]
+            newline = detect_newline(codecs.getincrementaldecoder(encoding)("replace").decode(sample))
+            return TextFormat(encoding, True, newline), False
+    sample = data if complete else data[:ENCODING_SNIFF_BYTES]
+    if data.isascii() and b"\0" not in sample: # By far the most common case: nothing to decode
+        return TextFormat("utf-8", False, detect_newline(data)), True
+    # UTF-16 without a mark: ASCII-range text leaves every other byte zero
+    zeros_even, zeros_odd = sample[0::2].count(0), sample[1::2].count(0)
+    if len(sample) >= 4 and max(zeros_even, zeros_odd) > len(sample) // 4 and min(zeros_even, zeros_odd) == 0:
+        encoding = "utf-16-le" if zeros_odd else "utf-16-be"
+    else:
+        try:
+            # Incremental, so a character cut off at the end of a prefix doesn't count against UTF-8
+            codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+            encoding = "utf-8"
+        except UnicodeDecodeError:
+            encoding = config.get("fallback_encoding", FALLBACK_ENCODING)
+    newline = detect_newline(codecs.getincrementaldecoder(encoding)("replace").decode(sample[:ENCODING_SNIFF_BYTES]))
+    return TextFormat(encoding, False, newline), False
+
+def decode_text(data):
+    """Decodes a whole file's bytes into buffer text. Returns (text, text_format)."""
+    text_format, ascii_only = sniff_text_format(data, complete=True)
+    if ascii_only:
+        text = data.decode("ascii")
+    else:
+        try:
+            text = data.decode(text_format.encoding)
+            if text_format.bom: text = text[1:] # The mark decodes to U+FEFF
+        except UnicodeDecodeError: # A wrong guess from the sniff; keep every byte as a character
+            text_format.encoding, text_format.bom = config.get("fallback_encoding", FALLBACK_ENCODING), False
+            text = data.decode(text_format.encoding)
+    if "\r" in text: text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text, text_format
+
+def read_text_file(path):
+    with open(path, "rb") as f:
+        return decode_text(f.read())
+
+def sniff_file_format(path):
+    # TextFormat of the file at path from its first bytes, or None if it can't be read
+    if not path: return None
+    try:
+        with open(path, "rb") as f:
+            return sniff_text_format(f.read(ENCODING_SNIFF_BYTES))[0]
+    except OSError:
+        return None
+
+# --- Saving ---
+def write_file_atomic(path, content, fsync=True, encoding='utf-8', newline=None):
+    """Writes content to a temp file next to path and moves it into place, so a crash
+    mid-write leaves either the old file or the new one, never a truncated mix.
+    Symlinks are followed so the link survives; a file with several hard links is
+    rewritten in place instead, since a rename would split it from its other names."""
+    path = os.path.realpath(path)
+    try: original = os.stat(path)
+    except OSError: original = None
+    if original is not None and original.st_nlink > 1:
+        with open(path, 'w', encoding=encoding, newline=newline) as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        return
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding, newline=newline) as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if original is not None: # Keep the original permissions and, where allowed, ownership
+            try: os.chmod(temp_path, stat.S_IMODE(original.st_mode))
+            except OSError: pass
+            if hasattr(os, 'chown'):
+                try: os.chown(temp_path, original.st_uid, original.st_gid)
+                except OSError: pass # Only root may give files away
+        os.replace(temp_path, path)
+    except BaseException:
+        try: os.remove(temp_path)
+        except OSError: pass
+        raise
+    if fsync and hasattr(os, 'O_DIRECTORY'): # Persist the rename itself (POSIX)
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try: os.fsync(dir_fd)
+            finally: os.close(dir_fd)
+        except OSError:
+            pass
+
+class BackgroundSaver:
+    """Writes file snapshots on worker threads and reports each result back on the Tk
+    thread. Saves of different files run concurrently; for one path, a write that
+    was overtaken by a newer snapshot is dropped instead of clobbering it."""
+
+    POLL_MS = 30
+    MAX_WORKERS = 4
+
+    def __init__(self, widget):
+        self.widget = widget
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+        self._results = queue.Queue()
+        self._pending = {} # future: (path, on_done)
+        self._path_locks = {}
+        self._latest = {} # path: sequence number of the newest snapshot
+        self._sequence = 0
+        self._job = None
+
+    def is_saving(self, path):
+        return any(pending_path == path for pending_path, _ in self._pending.values())
+
+    def submit(self, path, content, on_done, fsync=True, text_format=None):
+        """Queues content (a string or a Document snapshot) for writing in text_format (see
+        TextFormat); on_done(error, superseded) runs on the Tk thread, error being None on
+        success. superseded is True when a newer snapshot of path made this write moot;
+        nothing was written then and the newer save reports the real outcome."""
+        self._sequence += 1
+        self._latest[path] = self._sequence
+        lock = self._path_locks.setdefault(path, threading.Lock())
+        future = self._pool.submit(self._write, path, content, lock, self._sequence, fsync, text_format or TextFormat())
+        self._pending[future] = (path, on_done)
+        future.add_done_callback(self._results.put)
+        if not self._job: self._job = self.widget.after(self.POLL_MS, self._poll)
+        return future
+
+    def _write(self, path, content, lock, sequence, fsync, text_format):
+        with lock:
+            if self._latest.get(path, sequence) > sequence: return False # A newer snapshot is on its way
+            if not isinstance(content, str): content = content.text()
+            if text_format.bom: content = '\ufeff' + content
+            write_file_atomic(path, content, fsync, text_format.encoding, text_format.newline)
+            return True
+
+    def _deliver(self, future):
+        if future not in self._pending: return # Already delivered by wait()
+        path, on_done = self._pending.pop(future)
+        if not on_done: return
+        error = future.exception()
+        on_done(error, error is None and not future.result())
+
+    def _poll(self):
+        self._job = None
+        try:
+            while True: self._deliver(self._results.get_nowait())
+        except queue.Empty:
+            pass
+        if self._pending: self._job = self.widget.after(self.POLL_MS, self._poll)
+
+    def wait(self, futures=None):
+        """Blocks until the given saves (default: all) are written and delivers their results."""
+        futures = list(self._pending) if futures is None else [f for f in futures if f in self._pending]
+        concurrent.futures.wait(futures)
+        for future in futures: self._deliver(future)
+
+
+# --- Crash Recovery ---
+RECOVERY_DIR = "textra_recovery" # Next to CONFIG_FILE, one journal per tab with unsaved edits
+RECOVERY_INTERVAL_MS = 3000 # Override with "recovery_interval_ms" in the config
+
+def _split_index(index):
+    line, col = str(index).split('.')
+    return int(line), int(col)
+
+def coalesce_journal_records(records):
+    """Merges runs of typing, backspacing and forward deletes into single records. Only
+    single-line neighbours are merged, so the index arithmetic stays within one line."""
+    merged = []
+    for record in records:
+        if merged:
+            last = merged[-1]
+            if last[0] == "i" and '\n' not in last[2]:
+                line, col = _split_index(last[1])
+                end_col = col + len(last[2])
+                if record[0] == "i" and '\n' not in record[2] and record[1] == f"{line}.{end_col}":
+                    merged[-1] = ["i", last[1], last[2] + record[2]]
+                    continue
+                if record[0] == "d":
+                    (start_line, start_col), (stop_line, stop_col) = _split_index(record[1]), _split_index(record[2])
+                    if start_line == stop_line == line and stop_col == end_col and start_col >= col:
+                        # Backspacing over just-typed text
+                        if start_col > col: merged[-1] = ["i", last[1], last[2][:start_col - col]]
+                        else: merged.pop()
+                        continue
+            elif last[0] == "d" and record[0] == "d":
+                (line, start_col), (stop_line, stop_col) = _split_index(last[1]), _split_index(last[2])
+                (new_line, new_start), (new_stop_line, new_stop) = _split_index(record[1]), _split_index(record[2])
+                if line == stop_line == new_line == new_stop_line:
+                    if new_stop == start_col: # Backspace run
+                        merged[-1] = ["d", record[1], last[2]]
+                        continue
+                    if new_start == start_col: # Forward-delete run
+                        merged[-1] = ["d", last[1], f"{line}.{stop_col + new_stop - new_start}"]
+                        continue
+        merged.append(record)
+    return merged
+
+def write_journal(path, header, records):
+    # header is only given when the journal is (re)started, which replaces the file
+    base = header["base"] if header else None
+    if base and base["kind"] == "text" and not isinstance(base["text"], str):
+        # A Document snapshot; joined here on the writer thread rather than on the Tk thread
+        header = dict(header, base=dict(base, text=base["text"].text()))
+    lines = "".join(json.dumps(record) + '\n' for record in records)
+    if header is None:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    write_file_atomic(path, json.dumps(header) + '\n' + lines, fsync=False)
+
+def read_journal(path):
+    """(header, records) of a journal file, or None if it can't be read. A torn last
+    line from a crash mid-append is dropped."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            records = []
+            for line in f:
+                try: records.append(json.loads(line))
+                except json.JSONDecodeError: break
+        return header, records
+    except (OSError, ValueError):
+        return None
+
+def _remove_quietly(path):
+    try: os.remove(path)
+    except OSError: pass
+
+def _pid_alive(pid):
+    if not pid or pid == os.getpid(): return False
+    if os.name != 'posix': return False # No side-effect-free probe; treat as crashed
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError: # Exists, but belongs to someone else
+        return True
+    return True
+
+class EditJournal:
+    """Edit deltas of one tab since its last save, so the tab can be rebuilt after a
+    crash. Records are Tk indices, replayed in order on top of the base: the file as
+    last saved, a text snapshot, or nothing for a new tab."""
+
+    def __init__(self, title, file_path=None):
+        self.journal_id = uuid.uuid4().hex
+        self.path = os.path.join(RECOVERY_DIR, self.journal_id + ".jsonl")
+        self.title = title
+        self.paused = False # Set while a loader fills the buffer
+        self.on_disk = False
+        self._pending_edit = None
+        self.reset(file_path)
+
+    def reset(self, file_path):
+        """The buffer now matches file_path on disk, as decoded by read_text_file."""
+        self.base = {"kind": "empty"}
+        if file_path:
+            try:
+                file_stat = os.stat(file_path)
+                self.base = {"kind": "file", "path": file_path, "mtime": file_stat.st_mtime,
+                             "size": file_stat.st_size}
+            except OSError:
+                pass
+        self._restart()
+
+    def set_snapshot(self, text):
+        # text: a string or a Document snapshot (see write_journal)
+        self.base = {"kind": "text", "path": self.base.get("path"), "text": text}
+        self._restart()
+
+    def _restart(self):
+        self.records = [] # Everything since the base
+        self.unwritten = 0 # Trailing records not yet handed to the writer
+        self.rewrite = True
+        self.needs_snapshot = False
+        self.compact_at = RecoveryManager.COMPACT_RECORDS
+
+    @property
+    def has_changes(self):
+        return bool(self.records) or self.base["kind"] == "text"
+
+    def header(self):
+        return {"pid": os.getpid(), "title": self.title, "base": self.base}
+
+    # --- Change-listener interface (see TextChangeProxy) ---
+    def before_change(self, proxy, start, end):
+        self._pending_edit = (start, end)
+
+    def after_change(self, proxy, start, end):
+        if self._pending_edit is None or self.paused: return
+        old_start, old_end = self._pending_edit
+        self._pending_edit = None
+        if old_end != old_start:
+            self.records.append(["d", old_start, old_end])
+            self.unwritten += 1
+        if end != start:
+            self.records.append(["i", start, proxy.get(start, end)])
+            self.unwritten += 1
+
+    def invalidate(self):
+        if not self.paused: self.needs_snapshot = True
+
+class RecoveryManager:
+    """Writes tab journals to RECOVERY_DIR on a timer and finds the ones left behind by
+    a crash. A tick only slices new records off each journal and hands them to a
+    writer thread, so its cost doesn't depend on the buffer sizes."""
+
+    COMPACT_RECORDS = 5000    # Journals past this many records are coalesced and rewritten
+    SNAPSHOT_MAX_CHARS = 1024 * 1024 # Buffers up to this size may be snapshotted instead
+
+    def __init__(self, widget, interval_ms=RECOVERY_INTERVAL_MS):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.journals = {} # EditJournal: TextChangeProxy
+        self._writer = concurrent.futures.ThreadPoolExecutor(max_workers=1) # Keeps writes in order
+        self._job = widget.after(interval_ms, self._tick)
+
+    def track(self, journal, proxy):
+        self.journals[journal] = proxy
+
+    def discard(self, journal):
+        if self.journals.pop(journal, None) is not None and journal.on_disk:
+            self._writer.submit(_remove_quietly, journal.path)
+        journal.on_disk = False
+
+    def shutdown(self):
+        # Clean exit: nothing is left to recover
+        for journal in list(self.journals): self.discard(journal)
+        if self._job: self.widget.after_cancel(self._job)
+        self._job = None
+        self._writer.shutdown(wait=True)
+
+    def _tick(self):
+        try:
+            self.flush()
+        finally:
+            self._job = self.widget.after(self.interval_ms, self._tick)
+
+    def flush(self):
+        for journal, proxy in list(self.journals.items()):
+            if journal.paused: continue
+            if journal.needs_snapshot: journal.set_snapshot(proxy.text_area.document.snapshot())
+            if not journal.has_changes:
+                if journal.on_disk:
+                    self._writer.submit(_remove_quietly, journal.path)
+                    journal.on_disk = False
+                continue
+            if len(journal.records) >= journal.compact_at: self._compact(journal, proxy)
+            if journal.rewrite:
+                header, records = journal.header(), list(journal.records)
+            elif journal.unwritten:
+                header, records = None, journal.records[-journal.unwritten:]
+            else:
+                continue
+            journal.rewrite, journal.unwritten, journal.on_disk = False, 0, True
+            self._writer.submit(write_journal, journal.path, header, records)
+
+    def _compact(self, journal, proxy):
+        journal.records = coalesce_journal_records(journal.records)
+        journal.rewrite = True
+        if len(journal.records) >= self.COMPACT_RECORDS and \
+                _line_of(proxy.index("end-1c")) * 80 < self.SNAPSHOT_MAX_CHARS: # Size estimated from the line count
+            journal.set_snapshot(proxy.text_area.document.snapshot())
+        journal.compact_at = max(self.COMPACT_RECORDS, 2 * len(journal.records))
+
+    def find_orphans(self):
+        """(path, header, records) of journals whose editor is no longer running."""
+        orphans = []
+        try:
+            names = sorted(os.listdir(RECOVERY_DIR))
+        except OSError:
+            return orphans
+        tracked = {journal.path for journal in self.journals}
+        for name in names:
+            path = os.path.join(RECOVERY_DIR, name)
+            if not name.endswith(".jsonl") or path in tracked: continue
+            journal = read_journal(path)
+            if journal is None: continue
+            if _pid_alive(journal[0].get("pid")): continue # Another Textra window owns it
+            orphans.append((path, journal[0], journal[1]))
+        return orphans
+
+
+# --- Lazy Tabs ---
+MAX_MATERIALIZED_TABS = 12 # Override with "max_materialized_tabs" in the config (0 keeps every tab built)
+
+class TabDocument:
+    """What a tab without widgets keeps until it's shown: content is None for a file
+    that is (re)read from disk at that point."""
+    __slots__ = ("title", "file_path", "content", "cursor", "yview")
+
+    def __init__(self, title, file_path=None, content=None, cursor="1.0", yview=0.0):
+        self.title = title
+        self.file_path = file_path
+        self.content = content
+        self.cursor = cursor
+        self.yview = yview
+
+# --- Tab Registry ---
+def normalize_path(path):
+    # Key for "is this file already open": absolute, symlinks resolved, case-folded where the OS ignores case
+    return os.path.normcase(os.path.realpath(path))
+
+class TabRecord:
+    """What the editor knows about one tab. text_area and line_numbers are None while
+    the tab is lazy, in which case lazy holds its TabDocument."""
+    __slots__ = ("tab_id", "text_area", "line_numbers", "file_path", "dirty", "lazy", "last_used")
+
+    def __init__(self, tab_id):
+        self.tab_id = tab_id
+        self.text_area = None
+        self.line_numbers = None
+        self.file_path = None
+        self.dirty = False
+        self.lazy = None
+        self.last_used = 0 # Use counter value, for evicting idle tabs
+
+    @property
+    def document(self):
+        return self.text_area.document if self.text_area is not None else None
+
+
+class TabRegistry:
+    """Maps tab ids to TabRecords and open file paths to tab ids, so finding a tab's
+    widgets or the tab a file is open in never walks the widget tree."""
+
+    def __init__(self):
+        self._records = {}
+        self._by_path = {} # normalize_path(file_path): tab_id
+
+    def __contains__(self, tab_id):
+        return tab_id in self._records
+
+    def get(self, tab_id):
+        return self._records.get(tab_id)
+
+    def add(self, tab_id):
+        record = self._records.get(tab_id)
+        if record is None: record = self._records[tab_id] = TabRecord(tab_id)
+        return record
+
+    def remove(self, tab_id):
+        record = self._records.pop(tab_id, None)
+        if record is not None: self._unindex(record)
+
+    def set_path(self, tab_id, file_path):
+        record = self._records[tab_id]
+        self._unindex(record)
+        record.file_path = file_path
+        if file_path: self._by_path[normalize_path(file_path)] = tab_id
+
+    def _unindex(self, record):
+        if not record.file_path: return
+        key = normalize_path(record.file_path)
+        if self._by_path.get(key) == record.tab_id: del self._by_path[key]
+
+    def find_path(self, file_path):
+        tab_id = self._by_path.get(normalize_path(file_path))
+        return self._records.get(tab_id) if tab_id else None
+
+    def is_dirty(self, tab_id):
+        record = self._records.get(tab_id)
+        return bool(record and record.dirty)
+
+    def set_dirty(self, tab_id, dirty):
+        record = self._records.get(tab_id)
+        if record is not None: record.dirty = dirty
+
+    def is_lazy(self, tab_id):
+        record = self._records.get(tab_id)
+        return bool(record and record.lazy)
+
+    def lazy_tab_ids(self):
+        return [tab_id for tab_id, record in self._records.items() if record.lazy]
+
+    def file_paths(self):
+        return [record.file_path for record in self._records.values() if record.file_path]
+
+# --- Long Lines ---
+# Tk lays out and measures a whole logical line at once, so a minified file with one
+# multi-megabyte line makes every scroll, click and keystroke crawl. Such files are
+# shown with their lines cut at a fixed column by soft breaks: newlines tagged
+# "soft_break" that exist only in the widget and never reach the disk or the clipboard.
+LONG_LINE_THRESHOLD = 20000 # Characters; override with "long_line_threshold" in the config (0 disables)
+LONG_LINE_SEGMENT_CHARS = 2000 # Override with "long_line_segment_chars"
+LONG_LINE_SNIFF_BYTES = 1024 * 1024 # How much of a streamed file is checked for long lines
+SOFT_BREAK_TAG = "soft_break"
+
+def longest_line_length(data):
+    # Works on str and bytes alike
+    return max(map(len, data.split(b'\n' if isinstance(data, bytes) else '\n')))
+
+class LineSegmenter:
+    """Cuts lines longer than width into width-sized segments. Text is fed in chunks;
+    the column of the line in progress carries over between them."""
+
+    def __init__(self, width):
+        self.width = max(int(width), 1)
+        self._column = 0
+
+    def feed(self, text):
+        """Returns the text as a list of pieces, with None wherever a soft break goes."""
+        pieces, run = [], []
+        lines = text.split('\n')
+        for i, line in enumerate(lines):
+            if i: run.append('\n'); self._column = 0
+            position = 0
+            while self._column + len(line) - position > self.width:
+                take = self.width - self._column
+                run.append(line[position:position + take])
+                pieces.append(''.join(run)); pieces.append(None)
+                run = []
+                position += take
+                self._column = 0
+            run.append(line[position:])
+            self._column += len(line) - position
+        pieces.append(''.join(run))
+        return pieces
+
+def segmented_insert_args(pieces):
+    """Text.insert arguments (chars, tags, chars, tags, ...) for LineSegmenter output."""
+    args = []
+    for piece in pieces:
+        if piece is None: args += ['\n', (SOFT_BREAK_TAG,)]
+        elif piece: args += [piece, ()]
+    return args
+
+class WithoutSoftBreaks:
+    """A Document snapshot with the characters at the given (sorted) offsets left out.
+    The text is only assembled when the saver asks for it, off the Tk thread."""
+
+    def __init__(self, snapshot, offsets):
+        self.snapshot = snapshot
+        self.offsets = offsets
+
+    def text(self):
+        text = self.snapshot.text()
+        pieces, previous = [], 0
+        for offset in self.offsets:
+            pieces.append(text[previous:offset])
+            previous = offset + 1
+        pieces.append(text[previous:])
+        return ''.join(pieces)
+
+# --- Streaming File Loading ---
+STREAM_OPEN_THRESHOLD_BYTES = 4 * 1024 * 1024 # Override with "stream_open_threshold_bytes" in the config
+
+class FileStreamLoader:
+    """Reads a file on a worker thread and feeds it into a Text widget in batches from
+    the Tk event loop, so the first screen is usable while the rest is still loading."""
+
+    CHUNK_CHARS = 256 * 1024
+    CHUNK_BYTES = 256 * 1024
+    CHUNKS_PER_TICK = 4 # Bounds the time spent inserting per event-loop tick
+    POLL_MS = 15
+
+    def __init__(self, text_area, file_path, on_progress=None, on_done=None,
+                 segment_width=None, reformat_json=False, text_format=None):
+        self.text_area = text_area
+        self.file_path = file_path
+        # Decoded with it, chunk by chunk; its encoding is updated if the fallback is needed
+        self.text_format = text_format or TextFormat()
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.segment_width = segment_width # Cut long lines with soft breaks (see LineSegmenter)
+        self.reformat_json = reformat_json # Pretty-print the file instead; falls back to segmenting
+        self.reformatted = False
+        self.reformat_error = None
+        self.total_bytes = max(os.path.getsize(file_path), 1)
+        self.bytes_read = 0
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self._queue = queue.Queue(maxsize=16) # Bounded so a slow UI caps memory use
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._job = None
+
+    @property
+    def progress(self):
+        return min(self.bytes_read / self.total_bytes, 1.0)
+
+    def start(self):
+        # Loaded chunks are not user edits, so keep them out of the undo stack
+        self.text_area.config(undo=False)
+        self._thread.start()
+        self._job = self.text_area.after(self.POLL_MS, self._poll)
+
+    def cancel(self):
+        if self.done: return
+        self._cancel_event.set()
+        self.cancelled = True
+        if self._job:
+            try: self.text_area.after_cancel(self._job)
+            except tk.TclError: pass
+        self._finish()
+
+    def _read(self):
+        try:
+            if self.reformat_json and self._read_reformatted_json(): return
+            if not self._read_decoded():
+                # Not in the sniffed encoding after all, and non-ASCII text already went out decoded with it
+                self._put(("restart", None, 0))
+                self._read_decoded()
+            self._put(("eof", None, None))
+        except Exception as e:
+            self._put(("error", e, None))
+
+    def _read_decoded(self):
+        """Decodes the file chunk by chunk into the queue. When the sniffed encoding stops
+        fitting, text_format switches to the fallback encoding: on the spot if everything
+        so far was ASCII (which reads the same in it), else by returning False."""
+        text_format = self.text_format
+        decoder = codecs.getincrementaldecoder(text_format.encoding)()
+        segmenter = LineSegmenter(self.segment_width) if self.segment_width else None
+        first, ascii_so_far, pending_cr = True, True, ""
+        with open(self.file_path, 'rb') as raw:
+            while not self._cancel_event.is_set():
+                data = raw.read(self.CHUNK_BYTES)
+                try:
+                    text = decoder.decode(data, final=not data)
+                except UnicodeDecodeError:
+                    fallback = config.get("fallback_encoding", FALLBACK_ENCODING)
+                    if text_format.bom or text_format.encoding == fallback: raise
+                    text_format.encoding = fallback
+                    if not ascii_so_far: return False
+                    # A failed decode leaves the decoder's buffer as it was; take it over
+                    pending = decoder.getstate()[0] + data
+                    decoder = codecs.getincrementaldecoder(fallback)()
+                    text = decoder.decode(pending, final=not data)
+                if first:
+                    if text_format.bom and text.startswith('\ufeff'): text = text[1:]
+                    first = False
+                if ascii_so_far and not text.isascii(): ascii_so_far = False
+                # Universal newlines; a trailing "\r" waits in case the next chunk starts with "\n"
+                text, pending_cr = pending_cr + text, ""
+                if data and text.endswith('\r'): text, pending_cr = text[:-1], '\r'
+                if '\r' in text: text = text.replace('\r\n', '\n').replace('\r', '\n')
+                if text: self._put(("data", segmenter.feed(text) if segmenter else text, raw.tell()))
+                if not data: break
+        return True
+
+    def _read_reformatted_json(self):
+        # Returns False (after noting why) when the file is not valid JSON
+        with open(self.file_path, 'r', encoding=self.text_format.encoding, newline=None) as f:
+            try:
+                if self.text_format.bom: f.read(1) # json.load refuses a byte order mark
+                text = json.dumps(json.load(f), indent=2, ensure_ascii=False) + '\n'
+            except ValueError as e:
+                self.reformat_error = e
+                return False
+        self.reformatted = True
+        for start in range(0, len(text), self.CHUNK_CHARS):
+            if self._cancel_event.is_set(): break
+            end = min(start + self.CHUNK_CHARS, len(text))
+            self._put(("data", text[start:end], self.total_bytes * end // len(text)))
+        self._put(("eof", None, None))
+        return True
+
+    def _put(self, item):
+        while not self._cancel_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _poll(self):
+        self._job = None
+        try:
+            for _ in range(self.CHUNKS_PER_TICK):
+                kind, payload, position = self._queue.get_nowait()
+                if kind == "data":
+                    # Keep the modified flag meaning "the user edited this tab"
+                    modified = self.text_area.edit_modified()
+                    if isinstance(payload, list): # Segmented, soft breaks tagged in the same call
+                        self.text_area.insert("end-1c", *segmented_insert_args(payload))
+                    else:
+                        self.text_area.insert("end-1c", payload)
+                    self.text_area.edit_modified(modified)
+                    self.bytes_read = position
+                elif kind == "restart": # Read again in the fallback encoding
+                    modified = self.text_area.edit_modified()
+                    self.text_area.delete("1.0", "end-1c")
+                    self.text_area.edit_modified(modified)
+                    self.bytes_read = position
+                else:
+                    if kind == "error": self.error = payload
+                    self._finish()
+                    return
+        except queue.Empty:
+            pass
+        except tk.TclError: # Tab was closed while loading
+            self._cancel_event.set()
+            self.cancelled = True
+            self.done = True
+            return
+        if self.on_progress: self.on_progress(self)
+        self._job = self.text_area.after(self.POLL_MS, self._poll)
+
+    def _finish(self):
+        self.done = True
+        try:
+            self.text_area.config(undo=True)
+            self.text_area.edit_reset()
+        except tk.TclError:
+            return
+        if self.on_done: self.on_done(self)
+
+
+# --- Memory-Mapped Viewer ---
+VIEWER_THRESHOLD_BYTES = 256 * 1024 * 1024 # Override with "viewer_threshold_bytes" in the config
+
+class MappedFileView:
+    """Read-only view of a file too large for a Text widget. The file is memory-mapped
+    and only a window of lines around the viewport is decoded into the widget. Lines
+    are located through a sparse index of newline counts per fixed-size block, so
+    memory stays proportional to the viewport rather than the file."""
+
+    INDEX_BLOCK_BYTES = 64 * 1024
+    WINDOW_LINES = 600
+    SEARCH_CHUNK_BYTES = 4 * 1024 * 1024
+    SEARCH_OVERLAP_BYTES = 64 * 1024 # Backward search finds matches up to this long across chunk edges
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.mm)
+        self.text_area = None
+        self.scrollbar = None
+        self.window_start = 1 # Absolute line shown on the widget's first line
+        self.window_end = 0
+        self.index_complete = False
+        # _block_newlines[b] = newlines in the file before block b
+        self._block_newlines = array('q', [0])
+        self.closed = threading.Event()
+        self.search = None # Token of the Find running on a worker, see find_in_viewer
+        self._shift_job = None
+        threading.Thread(target=self._build_index, daemon=True).start()
+
+    def close(self, event=None):
+        if event is not None and event.widget is not self.text_area: return
+        self.closed.set()
+        try:
+            self.mm.close()
+            self._file.close()
+        except (ValueError, OSError):
+            pass
+
+    # --- Line index ---
+    def _build_index(self):
+        block = self.INDEX_BLOCK_BYTES
+        try:
+            for start in range(0, self.size, block):
+                if self.closed.is_set(): return
+                self._block_newlines.append(self._block_newlines[-1] + self.mm[start:start + block].count(b'\n'))
+            self.index_complete = True
+        except ValueError: # Map closed underneath us
+            pass
+
+    @property
+    def index_progress(self):
+        if self.index_complete: return 1.0
+        return min((len(self._block_newlines) - 1) * self.INDEX_BLOCK_BYTES / max(self.size, 1), 1.0)
+
+    def line_count(self):
+        newlines = self._block_newlines[-1]
+        if self.index_complete: return newlines + 1
+        indexed_bytes = (len(self._block_newlines) - 1) * self.INDEX_BLOCK_BYTES
+        if not indexed_bytes: return max(self.window_end, 1)
+        return max(int(newlines * self.size / indexed_bytes) + 1, self.window_end) # Estimate
+
+    def line_start(self, line):
+        """Byte offset where 1-based 'line' starts, or None if not indexed yet."""
+        if line <= 1: return 0
+        target = line - 1 # Newlines before the start of the line
+        counts = self._block_newlines
+        block = bisect.bisect_left(counts, target) - 1
+        if block + 1 >= len(counts): return None
+        pos = block * self.INDEX_BLOCK_BYTES
+        for _ in range(target - counts[block]):
+            pos = self.mm.find(b'\n', pos) + 1
+        return pos
+
+    def line_of_offset(self, offset):
+        block = min(offset // self.INDEX_BLOCK_BYTES, len(self._block_newlines) - 1)
+        base = block * self.INDEX_BLOCK_BYTES
+        return self._block_newlines[block] + self.mm[base:offset].count(b'\n') + 1
+
+    def offset_of(self, local_line, col):
+        # Widget position -> byte offset in the file. The widget shows the bytes decoded with
+        # errors="replace", so columns are counted the same way rather than re-encoded.
+        start = self.line_start(self.window_start + local_line - 1)
+        end = self.mm.find(b'\n', start)
+        raw = self.mm[start:end if end >= 0 else self.size]
+        if raw.isascii(): return start + min(col, len(raw))
+        low, high = 0, len(raw) # Longest prefix that decodes to at most col characters
+        while low < high:
+            middle = (low + high + 1) // 2
+            if len(raw[:middle].decode('utf-8', errors='replace')) <= col: low = middle
+            else: high = middle - 1
+        return start + low
+
+    def position_of(self, offset):
+        # Byte offset -> (absolute line, character column)
+        line = self.line_of_offset(offset)
+        line_start = self.line_start(line)
+        return line, len(self.mm[line_start:offset].decode('utf-8', errors='replace'))
+
+    # --- Window rendering ---
+    def attach(self, text_area, scrollbar):
+        self.text_area = text_area
+        self.scrollbar = scrollbar
+        text_area.bind("<Destroy>", self.close, add="+")
+        self.show(1)
+
+    def show(self, first_line):
+        """Loads the window starting at first_line. Returns False if the line isn't indexed yet."""
+        first_line = max(1, first_line)
+        if self.index_complete:
+            first_line = min(first_line, max(1, self.line_count() - self.WINDOW_LINES + 1))
+        start = self.line_start(first_line)
+        if start is None: return False
+        end, lines = start, 0
+        while lines < self.WINDOW_LINES:
+            newline = self.mm.find(b'\n', end)
+            if newline < 0:
+                end = self.size
+                break
+            end, lines = newline + 1, lines + 1
+        text = self.mm[start:end].decode('utf-8', errors='replace')
+        if end < self.size and text.endswith('\n'): text = text[:-1]
+
+        text_area = self.text_area
+        text_area.config(state=tk.NORMAL)
+        text_area.delete("1.0", tk.END)
+        text_area.insert("1.0", text)
+        text_area.config(state=tk.DISABLED)
+        text_area.edit_modified(False)
+        text_area.edit_reset()
+        self.window_start = first_line
+        self.window_end = first_line + text.count('\n')
+        text_area.gutter.line_number_offset = first_line - 1
+        return True
+
+    def on_yview(self, first, last):
+        # Called from the widget's yscrollcommand; slides the window near its edges
+        total = self.line_count()
+        window_lines = self.window_end - self.window_start + 1
+        if self.scrollbar:
+            top = (self.window_start - 1 + first * window_lines) / total
+            self.scrollbar.set(top, top + (last - first) * window_lines / total)
+        if self._shift_job: return
+        if (last >= 1.0 and self.window_end < total) or (first <= 0.0 and self.window_start > 1):
+            self._shift_job = self.text_area.after_idle(self._shift_window)
+
+    def _shift_window(self):
+        self._shift_job = None
+        top_local = _line_of(self.text_area.index("@0,0"))
+        top = self.window_start + top_local - 1
+        at_bottom = self.text_area.yview()[1] >= 1.0
+        new_start = top - (self.WINDOW_LINES // 4 if at_bottom else self.WINDOW_LINES * 3 // 4)
+        self.scroll_to(top, max(1, new_start))
+
+    def scroll_to(self, line, window_start=None):
+        if window_start is None: window_start = max(1, line - self.WINDOW_LINES // 3)
+        if not (self.window_start <= line <= self.window_end and window_start == self.window_start):
+            if not self.show(window_start): return False
+        self.text_area.yview(f"{line - self.window_start + 1}.0")
+        return True
+
+    def on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.scroll_to(int(float(args[0]) * self.line_count()) + 1)
+        elif action == "scroll":
+            self.text_area.yview_scroll(int(args[0]), args[1])
+
+    def go_to_line(self, line):
+        if not self.scroll_to(line): return False
+        local = f"{line - self.window_start + 1}.0"
+        self.text_area.mark_set(tk.INSERT, local)
+        self.text_area.see(local)
+        return True
+
+    # --- Search ---
+    @staticmethod
+    def compile_search(search_term, nocase, use_regex):
+        pattern = search_term.encode('utf-8')
+        if not use_regex: pattern = re.escape(pattern)
+        return re.compile(pattern, re.MULTILINE | (re.IGNORECASE if nocase else 0))
+
+    def find(self, regex, offset, forward):
+        """Searches the mapped bytes with a compiled bytes regex; returns a (start, end) byte
+        span or None. Scans the whole file at worst, so call it off the UI thread."""
+        if forward:
+            match = regex.search(self.mm, offset)
+            return match.span() if match else None
+        chunk_end = offset
+        while chunk_end > 0 and not self.closed.is_set():
+            chunk_start = max(0, chunk_end - self.SEARCH_CHUNK_BYTES)
+            # Matches must start in this chunk but may run into the one searched before it
+            last = None
+            for match in regex.finditer(self.mm, chunk_start, min(offset, chunk_end + self.SEARCH_OVERLAP_BYTES)):
+                if match.start() >= chunk_end: break
+                last = match
+            if last: return last.span()
+            chunk_end = chunk_start
+        return None
+
+    def select_span(self, span, forward=True):
+        (start_line, start_col), (end_line, end_col) = self.position_of(span[0]), self.position_of(span[1])
+        if not self.scroll_to(start_line): return
+        if end_line > self.window_end: # Match runs past the window; select what is shown
+            end_line, end_col = self.window_end, 0
+        text_area = self.text_area
+        start = f"{start_line - self.window_start + 1}.{start_col}"
+        end = f"{end_line - self.window_start + 1}.{end_col}"
+        text_area.tag_remove(tk.SEL, "1.0", tk.END)
+        text_area.tag_add(tk.SEL, start, end)
+        text_area.tag_add("found", start, end)
+        text_area.mark_set(tk.INSERT, end if forward else start)
+        text_area.see(start)
+
+# --- File Watching ---
+FILE_WATCH_INTERVAL_MS = 1000 # Override with "file_watch_interval_ms" in the config
+TAIL_APPEND_LIMIT_BYTES = 1024 * 1024 # Bigger appends reload the file; override with "tail_append_limit_bytes"
+TAIL_CHECK_CHARS = 64 # Buffer characters compared with the file to tell an append from a rewrite
+
+def file_signature(path):
+    # What stays the same while a file is unchanged; None if it is gone
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return None
+    return (file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino)
+
+class InotifyWatch:
+    """Linux inotify through ctypes: watches directories and reports the names changed in
+    them, read without blocking. Directories rather than files, so that files replaced by
+    a rename (git checkouts, atomic saves) keep being noticed."""
+
+    IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+    IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+    IN_Q_OVERFLOW = 0x4000
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct("iIII") # wd, mask, cookie, name length
+
+    @classmethod
+    def create(cls):
+        """Returns an InotifyWatch, or None where inotify isn't available."""
+        if not sys.platform.startswith("linux"): return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        return cls(libc, fd) if fd >= 0 else None
+
+    def __init__(self, libc, fd):
+        self._libc = libc
+        self.fd = fd
+        self._directories = {} # watch descriptor: directory
+        self._descriptors = {} # directory: watch descriptor
+
+    def add(self, directory):
+        """Returns False if the directory can't be watched (e.g. the watch limit is reached)."""
+        if directory in self._descriptors: return True
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0: return False
+        self._descriptors[directory] = wd
+        self._directories[wd] = directory
+        return True
+
+    def remove(self, directory):
+        wd = self._descriptors.pop(directory, None)
+        if wd is None: return
+        del self._directories[wd]
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        """Returns the paths changed since the last call, or None if the kernel dropped events."""
+        paths, overflowed = set(), False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return None if overflowed else paths
+            except OSError:
+                return None
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & self.IN_Q_OVERFLOW: overflowed = True
+                directory = self._directories.get(wd)
+                if directory is not None and name: paths.add(os.path.join(directory, os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+class FileWatcher:
+    """Notices open files changing on disk. Directories are watched with inotify where
+    possible; other files are stat'ed a batch per tick, round robin. A path counts as
+    changed once its file_signature differs from the one recorded by watch(), so events
+    caused by our own saves are dropped once the save re-records the file."""
+
+    STATS_PER_TICK = 50
+
+    def __init__(self, widget, list_paths, on_change, interval_ms=FILE_WATCH_INTERVAL_MS):
+        self.widget = widget
+        self.list_paths = list_paths # Returns the paths that should be watched
+        self.on_change = on_change   # on_change(path, old, new signature); False means "ask again later"
+        self.interval_ms = interval_ms
+        self._inotify = InotifyWatch.create()
+        self._signatures = {} # path: signature when last recorded
+        self._real_paths = {} # realpath: path, to match inotify events to watched paths
+        self._polled = deque() # Paths not covered by inotify
+        self._suspects = set() # Paths to stat on the next tick
+        self._job = widget.after(interval_ms, self._tick)
+
+    def watch(self, path):
+        """Records path's current state; later changes are reported against it."""
+        if path not in self._signatures:
+            real_path = os.path.realpath(path)
+            if self._inotify is not None and self._inotify.add(os.path.dirname(real_path)):
+                self._real_paths[real_path] = path
+            else:
+                self._polled.append(path)
+        self._signatures[path] = file_signature(path)
+        self._suspects.discard(path)
+
+    def forget(self, path):
+        if path not in self._signatures: return
+        del self._signatures[path]
+        self._suspects.discard(path)
+        if path in self._polled: self._polled.remove(path)
+        real_path = os.path.realpath(path)
+        if self._real_paths.pop(real_path, None) is not None:
+            directory = os.path.dirname(real_path)
+            if not any(os.path.dirname(other) == directory for other in self._real_paths):
+                self._inotify.remove(directory)
+
+    def has_changed(self, path):
+        return path in self._signatures and file_signature(path) != self._signatures[path]
+
+    def _tick(self):
+        self._job = None
+        open_paths = set(self.list_paths())
+        for path in [path for path in self._signatures if path not in open_paths]: self.forget(path)
+        for path in open_paths.difference(self._signatures): self.watch(path) # e.g. restored session tabs
+        if self._inotify is not None:
+            changed = self._inotify.read()
+            if changed is None: # Events were lost: check everything once
+                self._suspects.update(self._signatures)
+            else:
+                self._suspects.update(self._real_paths[path] for path in changed if path in self._real_paths)
+        for _ in range(min(self.STATS_PER_TICK, len(self._polled))):
+            self._suspects.add(self._polled[0])
+            self._polled.rotate(-1)
+        for path in list(self._suspects):
+            old, new = self._signatures.get(path), file_signature(path)
+            if path not in self._signatures or new == old:
+                self._suspects.discard(path)
+            elif self.on_change(path, old, new) is not False and path in self._signatures:
+                self._signatures[path] = new
+                self._suspects.discard(path)
+        self._job = self.widget.after(self.interval_ms, self._tick)
+
+    def shutdown(self):
+        if self._job: self.widget.after_cancel(self._job)
+        self._job = None
+        if self._inotify is not None: self._inotify.close()
+        self._inotify = None
+
+# --- Instrumentation ---
+class CountingTkApp:
+    """Stands in for the Tk interpreter object and counts call()s, so each handler's
+    Tcl round-trips can be attributed. Widgets pick it up from their master when created."""
+
+    def __init__(self, tkapp):
+        self._tkapp = tkapp
+        self.calls = 0
+
+    def call(self, *args):
+        self.calls += 1
+        return self._tkapp.call(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._tkapp, name)
+
+
+class HandlerStats:
+    __slots__ = ("count", "total", "max", "tcl_calls", "recent")
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.tcl_calls = 0
+        self.recent = deque(maxlen=window) # Durations of the latest calls, for rolling percentiles
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered: return 0.0
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class Instrumentation:
+    """Opt-in timers and counters for event handlers. wrap() returns the handler itself
+    when disabled, so there's no cost unless Textra was started with --instrument (or
+    "instrumentation": true in the config)."""
+
+    WINDOW = 500 # Calls per handler kept for the rolling percentiles
+    MAX_TRACE_EVENTS = 200000
+    HEARTBEAT_MS = 100 # Event-loop lag probe
+
+    def __init__(self, root, enabled=False):
+        self.root = root
+        self.enabled = enabled
+        self.stats = {}
+        self.trace = deque(maxlen=self.MAX_TRACE_EVENTS)
+        self.loop_lag = deque(maxlen=50)
+        self.tkapp = None
+        self._origin = time.perf_counter()
+        if enabled:
+            # Must happen before any widget other than the root exists
+            self.tkapp = root.tk = CountingTkApp(root.tk)
+            self._heartbeat(time.perf_counter())
+
+    def wrap(self, name, handler):
+        if not self.enabled: return handler
+        def timed(*args, **kwargs):
+            tcl_before = self.tkapp.calls
+            started = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                self.record(name, started, time.perf_counter() - started, self.tkapp.calls - tcl_before)
+        return timed
+
+    def record(self, name, started, elapsed, tcl_calls):
+        stats = self.stats.get(name)
+        if stats is None: stats = self.stats[name] = HandlerStats(self.WINDOW)
+        stats.count += 1
+        stats.total += elapsed
+        stats.max = max(stats.max, elapsed)
+        stats.tcl_calls += tcl_calls
+        stats.recent.append(elapsed)
+        self.trace.append((name, started, elapsed, tcl_calls))
+
+    def _heartbeat(self, expected):
+        self.loop_lag.append(max(time.perf_counter() - expected, 0.0))
+        expected = time.perf_counter() + self.HEARTBEAT_MS / 1000 # Taken now, when the callback is scheduled
+        self.root.after(self.HEARTBEAT_MS, lambda: self._heartbeat(expected))
+
+    def pending_callbacks(self):
+        # after() callbacks waiting to run, the closest thing to Tk's event queue length
+        return len(self.root.tk.splitlist(self.root.tk.call("after", "info")))
+
+    def reset(self):
+        self.stats.clear()
+        self.trace.clear()
+        self.loop_lag.clear()
+
+    def summary(self):
+        """Rows of (name, calls, p50 ms, p99 ms, max ms, Tcl calls per call), slowest p99 first."""
+        rows = []
+        for name, stats in self.stats.items():
+            rows.append((name, stats.count, percentile(stats.recent, 0.5) * 1000, percentile(stats.recent, 0.99) * 1000,
+                         stats.max * 1000, stats.tcl_calls / stats.count))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    def write_trace(self, path):
+        """Writes the recorded calls in the Trace Event Format (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        events = [{"name": name, "cat": name.split(":", 1)[0], "ph": "X", "pid": pid, "tid": 1,
+                   "ts": round((started - self._origin) * 1e6, 1), "dur": round(elapsed * 1e6, 1),
+                   "args": {"tcl_calls": tcl_calls}}
+                  for name, started, elapsed, tcl_calls in self.trace]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
 
 class TextEditor:
-    def __init__(self, root):
+    def __init__(self, root, profiler=None, instrument=None):
+        load_settings() # No-op if __main__ already did
         self.root = root
+        self.perf = Instrumentation(root, config.get("instrumentation", False) if instrument is None else instrument)
+        self.performance_dialog = None
         self.root.title(f"Textra - Untitled") # Renamed
         self.root.geometry("1000x700") # Slightly larger for more features
 
-        self.unsaved_changes = {} # tab_id: boolean
+        self.tabs = TabRegistry() # tab_id: widgets, path, unsaved flag and lazy state
+        self.tab_use_counter = 0
+        self.compiled_themes = {} # (theme name, UI font family): option sets from compile_theme
+        self.theme_generation = 0 # Bumped per theme switch; text areas remember the one they were styled for
         self.current_find_options = {"text": "", "match_case": tk.BooleanVar(), "regex": tk.BooleanVar(), "direction_down": tk.BooleanVar(value=True)}
         self.find_dialog = None # To keep track of find dialog
+        self.find_in_files_dialog = None
+        self.find_in_files_search = None # Running search: cancel event, result queue, counters
+        self.search_index = TrigramIndex(SEARCH_INDEX_FILE)
+        self.saver = BackgroundSaver(self.root)
+        self.recovery = RecoveryManager(self.root, config.get("recovery_interval_ms", RECOVERY_INTERVAL_MS))
+        self.file_watcher = FileWatcher(self.root, self.tabs.file_paths,
+                                        self.perf.wrap("watch:file_changed", self.on_file_changed_on_disk),
+                                        config.get("file_watch_interval_ms", FILE_WATCH_INTERVAL_MS))
 
         self.editor_font = font.Font(family=config["font_family"], size=config["font_size"])
 
+        # Text-change events only mark parts of the UI dirty; this flushes them once per idle tick
+        self.refresh_scheduler = RefreshScheduler(self.root, config.get("refresh_debounce_ms"))
+        timed = self.perf.wrap
+        self.refresh_scheduler.register("modified", timed("refresh:modified", self.refresh_unsaved_marker))
+        self.refresh_scheduler.register("status", timed("refresh:status", self.update_status_bar))
+        self.refresh_scheduler.register("gutter", timed("refresh:gutter", self.redraw_line_numbers))
+        self.refresh_scheduler.register("syntax", timed("refresh:syntax", self.refresh_syntax_highlighting))
+        self.refresh_scheduler.register("brackets", timed("refresh:brackets", self.refresh_bracket_matching))
+        self.refresh_scheduler.register("search_hits", timed("refresh:search_hits", self.refresh_search_hits))
+
         # Apply theme first, before creating any widgets
-        print(f"Applying theme: {config['theme']}")
+        if profiler: profiler.mark("editor state")
         self.apply_theme_globally(config["theme"])
         self.configure_styles()
+        if profiler: profiler.mark("theme and styles")
 
         self.create_widgets()
         self.create_menu()
+        if profiler: profiler.mark("widgets and menus")
         
         self.update_status_bar()
-        self.create_new_tab(title="Untitled")
+        restored = self.restore_from_journals()
+        if not self.restore_session() and not restored:
+            self.create_new_tab(title="Untitled")
+        if profiler: profiler.mark("tabs")
 
         self.root.protocol("WM_DELETE_WINDOW", self.exit_editor)
-        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.notebook.bind("<<NotebookTabChanged>>", timed("tabs:<<NotebookTabChanged>>", self.on_tab_changed))
 
         # Auto-save config on exit
         self.root.bind("<Destroy>", lambda e: save_config(config) if e.widget == self.root else None)
 
     def apply_theme_globally(self, theme_name):
         global current_theme_settings
-        print(f"Applying theme: {theme_name}")
-        print(f"Available themes: {list(THEMES_DEFINITION.keys())}")
         if theme_name in THEMES_DEFINITION:
             config["theme"] = theme_name # Update config
             current_theme_settings = THEMES_DEFINITION[theme_name].copy()  # Make a copy to avoid reference issues
-            print(f"Applied theme settings: {list(current_theme_settings.keys())}")
         else: # Fallback if theme name is invalid
-            print(f"Theme {theme_name} not found, using default: {DEFAULT_THEME_NAME}")
             config["theme"] = DEFAULT_THEME_NAME
             current_theme_settings = THEMES_DEFINITION[DEFAULT_THEME_NAME].copy()  # Make a copy to avoid reference issues
-            print(f"Applied default theme settings: {list(current_theme_settings.keys())}")
+        
+        self.theme_generation += 1
+        compiled = self.get_compiled_theme()
         
         # Apply to root and other non-ttk elements directly affected
-        self.root.configure(bg=current_theme_settings['bg'])
+        self.root.configure(bg=compiled["root_bg"])
         
         # Re-configure styles and existing widgets
         if hasattr(self, 'style'): self.configure_styles()
         if hasattr(self, 'status_bar'): self.status_bar.config(background=current_theme_settings['statusbar_bg'], foreground=current_theme_settings['statusbar_fg'])
         if hasattr(self, 'menu_bar'): self.configure_menu_theme_colors()
-        if hasattr(self, 'notebook'):
-            for tab_id in self.notebook.tabs():
-                frame = self.notebook.nametowidget(tab_id)
-                # First child is the Frame holding LineNumbers and Text
-                content_frame = frame.winfo_children()[0]
-                line_numbers = content_frame.winfo_children()[0] # Assuming LineNumbers is first
-                text_area = content_frame.winfo_children()[1]    # Assuming Text is second
-                
-                self.configure_text_area_theme(text_area)
-                if isinstance(line_numbers, tk.Canvas): # LineNumbers widget
-                    line_numbers.config(bg=current_theme_settings['linenum_bg'])
-                    self.redraw_line_numbers(text_area, line_numbers) # Redraw with new colors
-
-    def configure_styles(self):
-        self.style = ttk.Style()
-        available_themes = self.style.theme_names()
-        if 'clam' in available_themes: self.style.theme_use('clam')
-        elif 'alt' in available_themes: self.style.theme_use('alt')
-
-        # Configure modern notebook style
-        self.style.configure("TNotebook", background=current_theme_settings['notebook_bg'])
-        
-        # Fix the tab style mapping
-        self.style.configure("TNotebook.Tab",
-            background=current_theme_settings['tab_bg'],
-            foreground=current_theme_settings['tab_fg'],
-            padding=[10, 5],
-            font=(self.editor_font.cget("family"), 10)
-        )
-        self.style.map("TNotebook.Tab",
-            background=[("selected", current_theme_settings['tab_active_bg'])],
-            foreground=[("selected", current_theme_settings['tab_active_fg'])]
-        )
-
-        # Configure modern frame style
-        self.style.configure("TFrame", background=current_theme_settings['bg'])
-        
-        # Configure modern label style
-        self.style.configure("TLabel", 
-            background=current_theme_settings['bg'], 
-            foreground=current_theme_settings['fg'],
-            font=(self.editor_font.cget("family"), 10)
-        )
-
-        # Configure modern status bar style
-        self.style.configure("Status.TFrame", 
-            background=current_theme_settings['statusbar_bg'],
-            relief=tk.FLAT
-        )
-        self.style.configure("Status.TLabel", 
-            background=current_theme_settings['statusbar_bg'], 
-            foreground=current_theme_settings['statusbar_fg'],
-            padding=5,
-            font=(self.editor_font.cget("family"), 9)
-        )
-
-        # Configure modern button style
-        self.style.configure("TButton", 
-            background=current_theme_settings.get('button_bg', current_theme_settings['bg']),
-            foreground=current_theme_settings.get('button_fg', current_theme_settings['fg']),
-            padding=[10, 5],
-            font=(self.editor_font.cget("family"), 10)
-        )
-        self.style.map("TButton",
-            background=[('active', current_theme_settings.get('button_active_bg', current_theme_settings['menu_active_bg']))],
-            foreground=[('active', current_theme_settings.get('button_active_fg', current_theme_settings['menu_active_fg']))]
-        )
-
-        # Configure modern entry style
-        self.style.configure("TEntry", 
-            fieldbackground=current_theme_settings['text_bg'],
-            foreground=current_theme_settings['text_fg'],
-            insertcolor=current_theme_settings['cursor_insert_color'],
-            padding=[5, 2],
-            font=(self.editor_font.cget("family"), 10)
-        )
+        # Only the visible tab is restyled now; the others catch up when selected (see on_tab_changed)
+        text_area = self.get_current_text_area() if hasattr(self, 'notebook') else None
+        if text_area:
+            self.restyle_text_area(text_area)
+            self.redraw_line_numbers(text_area)
 
-        # Configure modern checkbutton style
-        self.style.configure("TCheckbutton", 
-            background=current_theme_settings['bg'],
-            foreground=current_theme_settings['fg'],
-            indicatorcolor=current_theme_settings.get('indicator', current_theme_settings['fg']),
-            font=(self.editor_font.cget("family"), 10)
-        )
+    def get_compiled_theme(self):
+        key = (config["theme"], self.editor_font.cget("family"))
+        compiled = self.compiled_themes.get(key)
+        if compiled is None:
+            compiled = self.compiled_themes[key] = compile_theme(current_theme_settings, key[1])
+        return compiled
 
-        # Configure modern separator style
-        self.style.configure("TSeparator", 
-            background=current_theme_settings['statusbar_bg']
-        )
+    def configure_styles(self):
+        if not hasattr(self, 'style'):
+            self.style = ttk.Style()
+            available_themes = self.style.theme_names()
+            if 'clam' in available_themes: self.style.theme_use('clam')
+            elif 'alt' in available_themes: self.style.theme_use('alt')
+        for style_name, options, mapping in self.get_compiled_theme()["styles"]:
+            self.style.configure(style_name, **options)
+            if mapping: self.style.map(style_name, **mapping)
 
     def configure_text_area_theme(self, text_area):
+        # Called once per text area; later theme switches only go through restyle_text_area
         text_area.config(
-            background=current_theme_settings['text_bg'],
-            foreground=current_theme_settings['text_fg'],
-            selectbackground=current_theme_settings['select_bg'],
-            selectforeground=current_theme_settings['select_fg'],
-            insertbackground=current_theme_settings['cursor_insert_color'],
             undo=True,
             wrap=tk.WORD if config["word_wrap"] else tk.NONE,
             font=self.editor_font,
@@ -383,10 +3289,21 @@ class TextEditor:
             # For bracket matching
             highlightthickness=0, bd=0 # Remove default border if any
         )
-        # Configure bracket matching tags
-        text_area.tag_configure("bracket_match", 
-                                background=current_theme_settings.get('bracket_match_bg', 'yellow'),
-                                foreground=current_theme_settings.get('bracket_match_fg', None)) # None means use default fg
+        self.restyle_text_area(text_area)
+        # Every find hit in the viewport; kept below the selection so the current match stands out
+        text_area.tag_lower("search_hit")
+        # Syntax colors only set the foreground and sit below every other tag
+        for token_type in SYNTAX_TOKEN_TYPES:
+            text_area.tag_lower("syntax_" + token_type)
+
+    def restyle_text_area(self, text_area):
+        compiled = self.get_compiled_theme()
+        text_area.config(**compiled["text"])
+        for tag, options in compiled["tags"]:
+            text_area.tag_configure(tag, **options)
+        line_numbers = getattr(text_area, 'line_numbers_canvas', None)
+        if line_numbers is not None: line_numbers.config(bg=compiled["linenum_bg"])
+        text_area.theme_generation = self.theme_generation
 
 
     def create_widgets(self):
@@ -411,24 +3328,14 @@ class TextEditor:
 
         self.status_label_info = ttk.Label(self.status_bar_frame, text="", style="Status.TLabel", anchor=tk.E)
         self.status_label_info.pack(side=tk.RIGHT, padx=8, pady=4)
-    
-    def get_current_text_content_frame(self):
-        try:
-            current_tab_main_frame_name = self.notebook.select()
-            if not current_tab_main_frame_name: return None
-            current_tab_main_frame = self.notebook.nametowidget(current_tab_main_frame_name)
-            # The content_frame is the first child of the main_frame (which is the tab itself)
-            return current_tab_main_frame.winfo_children()[0] 
-        except (tk.TclError, IndexError):
-            return None
 
+        # Only packed while the current tab is still streaming in its file
+        self.cancel_load_button = ttk.Button(self.status_bar_frame, text="Cancel Loading", command=self.cancel_current_load)
+        self.cancel_load_button_shown = False
+    
     def get_current_text_area(self):
-        content_frame = self.get_current_text_content_frame()
-        if content_frame:
-            # Text area is the second child of content_frame (after line_numbers Canvas)
-            try: return content_frame.winfo_children()[1]
-            except IndexError: return None
-        return None
+        record = self.tabs.get(self.get_current_tab_id())
+        return record.text_area if record else None
 
     def get_current_tab_id(self):
         """Returns the ID of the currently selected tab, or None if no tabs exist."""
@@ -437,17 +3344,31 @@ class TextEditor:
         except tk.TclError:
             return None
 
+    def get_line_count(self, text_area):
+        line_index = getattr(text_area, 'line_index', None)
+        if line_index and line_index.ready: return line_index.line_count
+        return int(text_area.index('end-1c').split('.')[0])
+
+    def index_to_offset(self, text_area, index):
+        line_index = text_area.line_index
+        if line_index.ready: return line_index.index_to_offset(text_area.index(index))
+        counted = text_area.count("1.0", index, "chars")
+        return counted[0] if counted else 0
+
+    def offset_to_index(self, text_area, offset):
+        line_index = text_area.line_index
+        if line_index.ready: return line_index.offset_to_index(offset)
+        return text_area.index(f"1.0+{offset}c")
+
     def get_current_line_numbers_canvas(self):
-        content_frame = self.get_current_text_content_frame()
-        if content_frame:
-            # Line numbers canvas is the first child of content_frame
-            try: return content_frame.winfo_children()[0]
-            except IndexError: return None
-        return None
+        record = self.tabs.get(self.get_current_tab_id())
+        return record.line_numbers if record else None
 
-    def create_new_tab(self, title="Untitled", content="", file_path=None):
-        tab_main_frame = ttk.Frame(self.notebook, style="TFrame")
-        tab_main_frame.pack(fill=tk.BOTH, expand=True)
+    def create_new_tab(self, title="Untitled", content="", file_path=None, tab_frame=None, text_format=None):
+        # tab_frame: an existing, still empty tab to build the widgets in (see materialize_tab)
+        # text_format: how the file is stored on disk (see TextFormat), kept for saving
+        tab_main_frame = tab_frame or ttk.Frame(self.notebook, style="TFrame")
+        if tab_frame is None: tab_main_frame.pack(fill=tk.BOTH, expand=True)
 
         # Create a content frame with modern styling
         content_frame = ttk.Frame(tab_main_frame, style="TFrame")
@@ -466,24 +3387,53 @@ class TextEditor:
         text_area.insert(tk.END, content)
         text_area.edit_modified(False)
 
+        # Route edits through the change proxy so per-tab engines see the deltas
+        text_area.change_proxy = TextChangeProxy(text_area)
+        text_area.document = Document(content) # Lets find, save and search read snapshots off the UI thread
+        text_area.document.attach(text_area.change_proxy)
+        text_area.stats = TextStats(content)
+        text_area.change_proxy.listeners.append(text_area.stats)
+        text_area.gutter = LineNumberGutter(line_numbers, text_area, self.editor_font)
+        text_area.change_proxy.listeners.append(text_area.gutter)
+        text_area.bracket_index = BracketIndex(file_path)
+        text_area.change_proxy.listeners.append(text_area.bracket_index)
+        text_area.highlighter = SyntaxHighlighter(text_area.change_proxy, file_path)
+        text_area.change_proxy.listeners.append(text_area.highlighter)
+        text_area.line_index = LineIndex(text_area.change_proxy)
+        text_area.line_index.build_async(content)
+        text_area.change_proxy.listeners.append(text_area.line_index)
+        text_area.find_engine = FindEngine()
+        text_area.text_format = text_format or TextFormat(newline=os.linesep)
+        text_area.journal = EditJournal(title, file_path)
+        text_area.change_proxy.listeners.append(text_area.journal)
+        self.recovery.track(text_area.journal, text_area.change_proxy)
+        text_area.change_proxy.listeners.append(EditNotifier(self.on_text_change)) # Typing, paste, undo, auto-indent
+
         # Link scrolling with proper command handling
         def on_scroll(*args):
             self.on_text_scroll(*args, text_area=text_area, line_numbers=line_numbers)
         
-        text_area.config(yscrollcommand=on_scroll)
+        timed = self.perf.wrap
+        text_area.config(yscrollcommand=timed("text:yscrollcommand", on_scroll))
         
-        # Bindings
-        text_area.bind("<KeyRelease>", self.on_text_change)
-        text_area.bind("<ButtonRelease-1>", self.on_text_change)
-        text_area.bind("<FocusIn>", self.on_text_change)
-        text_area.bind("<Return>", lambda e, ta=text_area: self.handle_auto_indent(e, ta))
-        text_area.bind("<KeyPress>", lambda e, ta=text_area: self.handle_bracket_matching(e, ta))
-
-        self.notebook.add(tab_main_frame, text=title)
-        self.notebook.select(tab_main_frame)
-
-        tab_id = self.notebook.select()
-        self.unsaved_changes[tab_id] = False
+        # Bindings (they only mark UI parts dirty, see RefreshScheduler). Edits are
+        # reported by the EditNotifier above; these only follow the cursor.
+        text_area.bind("<KeyRelease>", timed("text:<KeyRelease>", self.on_cursor_key))
+        text_area.bind("<ButtonRelease-1>", timed("text:<ButtonRelease-1>", self.on_cursor_move))
+        text_area.bind("<FocusIn>", timed("text:<FocusIn>", self.on_cursor_move))
+        text_area.bind("<Return>", timed("text:<Return>", lambda e, ta=text_area: self.handle_auto_indent(e, ta)))
+
+        if tab_frame is None:
+            self.notebook.add(tab_main_frame, text=title)
+            self.notebook.select(tab_main_frame)
+        else:
+            self.notebook.tab(tab_main_frame, text=title)
+
+        tab_id = str(tab_main_frame)
+        record = self.tabs.add(tab_id)
+        record.text_area, record.line_numbers, record.lazy, record.dirty = text_area, line_numbers, None, False
+        self.tabs.set_path(tab_id, file_path)
+        self.touch_tab(tab_id)
         text_area.file_path = file_path
         
         text_area.line_numbers_canvas = line_numbers
@@ -493,10 +3443,87 @@ class TextEditor:
         self.on_text_change()
         text_area.focus_set()
         
-        if file_path:
+        if file_path and tab_frame is None:
             self.add_recent_file(file_path)
+        self.evict_idle_tabs()
         return text_area
 
+    # --- Lazy Tabs ---
+    def add_lazy_tab(self, title, file_path=None, content=None, cursor="1.0", yview=0.0):
+        """Adds a tab that has no widgets yet; they're built when it is first shown."""
+        tab_frame = ttk.Frame(self.notebook, style="TFrame")
+        self.notebook.add(tab_frame, text=title)
+        tab_id = str(tab_frame)
+        self.tabs.add(tab_id).lazy = TabDocument(title, file_path, content, cursor, yview)
+        self.tabs.set_path(tab_id, file_path)
+        return tab_id
+
+    def get_text_area_for_tab(self, tab_id):
+        record = self.tabs.get(tab_id)
+        return record.text_area if record else None
+
+    def iter_text_areas(self):
+        # (tab id, text area) for every tab with widgets, in tab order
+        for tab_id in self.notebook.tabs():
+            text_area = self.get_text_area_for_tab(tab_id)
+            if text_area is not None: yield tab_id, text_area
+
+    def select_tab(self, tab_id):
+        """Selects a tab and builds its widgets right away if needed; returns its text area."""
+        self.notebook.select(tab_id)
+        if self.tabs.is_lazy(tab_id): self.materialize_tab(tab_id)
+        return self.get_text_area_for_tab(tab_id)
+
+    def materialize_tab(self, tab_id):
+        record = self.tabs.get(tab_id)
+        document, record.lazy = record.lazy, None
+        tab_frame = self.notebook.nametowidget(tab_id)
+        if document.file_path and document.content is None:
+            text_area = self.load_file_into_tab(document.file_path, tab_frame)
+        else:
+            text_area = self.create_new_tab(document.title, document.content or "", document.file_path, tab_frame)
+        if text_area is None or getattr(text_area, 'viewer', None): return
+        text_area.mark_set(tk.INSERT, document.cursor)
+        text_area.after_idle(lambda: text_area.yview_moveto(document.yview))
+
+    def touch_tab(self, tab_id):
+        record = self.tabs.get(tab_id)
+        if record is None: return
+        self.tab_use_counter += 1
+        record.last_used = self.tab_use_counter
+
+    def evict_idle_tabs(self):
+        """Tears down the widgets of the least recently used clean tabs beyond the limit."""
+        limit = config.get("max_materialized_tabs", MAX_MATERIALIZED_TABS)
+        if not limit: return
+        current = self.get_current_tab_id()
+        candidates = sorted(((self.tabs.get(tab_id).last_used, tab_id, text_area)
+                             for tab_id, text_area in self.iter_text_areas()), key=lambda item: item[0])
+        excess = len(candidates) - limit
+        for _, tab_id, text_area in candidates:
+            if excess <= 0: break
+            if tab_id == current or not self.can_evict_tab(tab_id, text_area): continue
+            self.evict_tab(tab_id, text_area)
+            excess -= 1
+
+    def can_evict_tab(self, tab_id, text_area):
+        return not (self.tabs.is_dirty(tab_id) or text_area.edit_modified()
+                    or self.is_loading(text_area) or getattr(text_area, 'viewer', None)
+                    or getattr(text_area, 'replace_all_pending', False)
+                    or (text_area.file_path and self.saver.is_saving(text_area.file_path)))
+
+    def evict_tab(self, tab_id, text_area):
+        file_path = text_area.file_path
+        record = self.tabs.get(tab_id)
+        record.lazy = TabDocument(
+            self.notebook.tab(tab_id, "text"), file_path,
+            None if file_path else text_area.get("1.0", "end-1c"), # Files are re-read when shown again
+            text_area.index(tk.INSERT), text_area.yview()[0])
+        record.text_area = record.line_numbers = None
+        self.recovery.discard(text_area.journal)
+        for child in self.notebook.nametowidget(tab_id).winfo_children():
+            child.destroy()
+
     def on_text_scroll(self, *args, text_area, line_numbers):
         # Handle scroll commands properly
         if args:
@@ -504,98 +3531,33 @@ class TextEditor:
                 text_area.yview_moveto(args[1])
             elif args[0] == "scroll":
                 text_area.yview_scroll(args[1], args[2])
-        # Redraw line numbers based on new view
-        self.redraw_line_numbers(text_area, line_numbers)
-
-    def redraw_line_numbers(self, text_area=None, line_numbers_canvas=None):
+        viewer = getattr(text_area, 'viewer', None)
+        if viewer and len(args) == 2:
+            viewer.on_yview(float(args[0]), float(args[1]))
+        # Redraw line numbers based on new view, coalesced with any pending refresh.
+        # Hidden tabs get redrawn when they are selected again.
+        self.refresh_scheduler.mark_dirty("gutter", "syntax", "search_hits")
+
+    def redraw_line_numbers(self, text_area=None, line_numbers_canvas=None, force=False):
         if text_area is None: text_area = self.get_current_text_area()
-        if line_numbers_canvas is None: line_numbers_canvas = self.get_current_line_numbers_canvas()
-
-        if not text_area or not line_numbers_canvas: return
-
-        line_numbers_canvas.delete("all")
-        
-        # Get the first visible line index
-        first_visible_char_index = text_area.index("@0,0")
-        first_visible_line = int(first_visible_char_index.split('.')[0])
-        
-        # Get the y-offset of the first visible line
-        try:
-            dlineinfo_first = text_area.dlineinfo(first_visible_char_index)
-            if dlineinfo_first is None: # Not yet rendered
-                line_numbers_canvas.after(50, lambda ta=text_area, ln=line_numbers_canvas: self.redraw_line_numbers(ta, ln))
-                return
-            y_offset = dlineinfo_first[1] # y-coordinate of the baseline
-            line_height = dlineinfo_first[3] # height of the line
-            char_height_approx = self.editor_font.metrics('linespace') # Approx line height
-        except tk.TclError: # Can happen if widget is not fully mapped
-             line_numbers_canvas.after(50, lambda ta=text_area, ln=line_numbers_canvas: self.redraw_line_numbers(ta, ln))
-             return
-
-
-        # Iterate through visible lines
-        current_line_num = first_visible_line
-        total_lines = int(text_area.index('end-1c').split('.')[0])
-
-        y = (line_height // 2) - y_offset # Start drawing from a bit above the first line's baseline
-                                          # Adjust y to align with text lines
-        
-        while y < line_numbers_canvas.winfo_height() and current_line_num <= total_lines :
-            line_index = f"{current_line_num}.0"
-            dlineinfo = text_area.dlineinfo(line_index)
-            if dlineinfo is None: # Line not visible or doesn't exist
-                if current_line_num > total_lines + 5 : # safety break
-                    break
-                current_line_num +=1
-                y += char_height_approx # Increment by approx height if dlineinfo fails
-                continue
-
-            # x, y_pos, width, height, baseline = dlineinfo # Unpack all
-            y_pos_line_baseline = dlineinfo[1] # y-coordinate of baseline for THIS line
-            current_line_height = dlineinfo[3]
-
-            # Calculate drawing y: relative to canvas top, aligning with text line's vertical center
-            # The y from dlineinfo is relative to the text widget's top visible part.
-            # We need to map this to the line_numbers_canvas.
-            # The y_offset was for the *first* line's baseline.
-            draw_y = y_pos_line_baseline - y_offset + (current_line_height // 2)
-
-
-            # Add 2px padding from right edge of canvas
-            line_numbers_canvas.create_text(
-                line_numbers_canvas.winfo_width() - 5, draw_y,
-                anchor=tk.NE, text=str(current_line_num),
-                font=self.editor_font, fill=current_theme_settings['linenum_fg']
-            )
-            
-            if current_line_num == total_lines and text_area.get(f"{current_line_num}.end-1c", f"{current_line_num}.end").strip() == "":
-                 # If the last line is empty, dlineinfo might give small height, so break
-                 if not text_area.get(f"{current_line_num}.0", f"{current_line_num}.end-1c").strip():
-                    break
+        if not text_area: return
 
+        gutter = getattr(text_area, 'gutter', None)
+        if gutter: gutter.redraw(force=force)
 
-            current_line_num += 1
-            # y += current_line_height # This was the issue, y should track the actual drawing position based on dlineinfo
-            y = draw_y + (current_line_height // 2) # Next estimated position
 
-        # If the text area is scrolled all the way to the bottom, ensure last line number is visible
-        # This is a heuristic, dlineinfo is more reliable
-        last_line_on_screen_index = text_area.index(f"@0,{text_area.winfo_height()}")
-        last_line_num_on_screen = int(last_line_on_screen_index.split('.')[0])
+    def on_text_change(self, event=None):
+        # Held keys and auto-repeat fire this many times per frame; the scheduler
+        # collapses them into a single refresh of each part.
+        self.refresh_scheduler.mark_dirty("modified", "status", "gutter", "syntax", "brackets", "search_hits")
 
-        if last_line_num_on_screen >= total_lines and y < line_numbers_canvas.winfo_height():
-            dlineinfo_last = text_area.dlineinfo(f"{total_lines}.0")
-            if dlineinfo_last:
-                draw_y = dlineinfo_last[1] - y_offset + (dlineinfo_last[3] // 2)
-                if line_numbers_canvas.find_withtag(str(total_lines)) == (): # if not already drawn
-                    line_numbers_canvas.create_text(
-                        line_numbers_canvas.winfo_width() - 5, draw_y,
-                        anchor=tk.NE, text=str(total_lines),
-                        font=self.editor_font, fill=current_theme_settings['linenum_fg']
-                    )
+    def on_cursor_move(self, event=None):
+        self.refresh_scheduler.mark_dirty("status", "brackets")
 
+    def on_cursor_key(self, event):
+        if event.keysym.replace("KP_", "") in CURSOR_KEYSYMS: self.on_cursor_move()
 
-    def on_text_change(self, event=None):
+    def refresh_unsaved_marker(self):
         text_area = self.get_current_text_area()
         if not text_area: return
 
@@ -603,35 +3565,59 @@ class TextEditor:
         tab_id = self.get_current_tab_id()
         if tab_id:
             if text_area.edit_modified():
-                if not self.unsaved_changes.get(tab_id, False):
-                    self.unsaved_changes[tab_id] = True
+                if not self.tabs.is_dirty(tab_id):
+                    self.tabs.set_dirty(tab_id, True)
                     current_tab_text = self.notebook.tab(tab_id, "text")
                     if not current_tab_text.endswith("*"):
                         self.notebook.tab(tab_id, text=current_tab_text + "*")
-        
-        self.update_status_bar()
-        self.redraw_line_numbers(text_area, text_area.line_numbers_canvas)
-        
-        # For bracket matching, needs to be triggered on cursor move or key press
-        # We'll call it from keypress too for immediacy.
-        # And also here for selection changes/mouse clicks.
-        if event and event.type == tk.EventType.ButtonRelease or event and event.type == tk.EventType.FocusIn:
-            self.handle_bracket_matching(event, text_area)
 
+    def refresh_syntax_highlighting(self):
+        text_area = self.get_current_text_area()
+        if text_area and not getattr(text_area, 'viewer', None): text_area.highlighter.refresh_viewport()
 
-    def update_status_bar(self, event=None):
+    def refresh_bracket_matching(self):
+        text_area = self.get_current_text_area()
+        if text_area: self.handle_bracket_matching(None, text_area)
+
+
+    def update_status_bar(self, event=None, force_recount=False):
         text_area = self.get_current_text_area()
         if text_area:
             cursor_pos = text_area.index(tk.INSERT)
             line, col = map(int, cursor_pos.split('.'))
+            viewer = getattr(text_area, 'viewer', None)
+            if viewer:
+                # Counting words would mean reading the whole mapped file
+                self.status_label_main.config(text=f"  Ln {viewer.window_start + line - 1}, Col {col+1}")
+                info_status = f"Read-only  Size: {viewer.size:,} bytes  Lines: {viewer.line_count():,}"
+                if not viewer.index_complete: info_status += f" (indexing {viewer.index_progress:.0%})"
+                self.status_label_info.config(text=info_status)
+                return
             main_status = f"  Ln {line}, Col {col+1}"
 
-            # Word and Char count
-            content = text_area.get("1.0", tk.END)
-            char_count = len(content.replace('\n', '')) # Exclude newlines from char count for typical display
-            word_count = len(content.split())
-
-            info_status = f"Chars: {char_count}  Words: {word_count}"
+            # Word, Char and Line count, maintained incrementally from edit deltas
+            stats = getattr(text_area, 'stats', None)
+            if stats is None: return
+            if force_recount or stats.dirty:
+                stats.recount(text_area.change_proxy)
+
+            info_status = f"Chars: {stats.chars}  Words: {stats.words}  Lines: {stats.lines}  {text_area.text_format.label}"
+            if getattr(text_area, 'long_line_mode', None):
+                info_status = f"Long lines split at {text_area.long_line_mode:,}    {info_status}"
+            engine = text_area.find_engine
+            if engine.active and engine.current and not engine.is_stale(text_area.change_proxy):
+                info_status = f"Match {engine.current} of {len(engine.starts)}    {info_status}"
+            loading = self.is_loading(text_area)
+            if loading:
+                info_status = f"Loading {text_area.loader.progress:.0%}    {info_status}"
+            if getattr(text_area, 'replace_all_pending', False):
+                info_status = f"Replacing...    {info_status}"
+            if text_area.file_path and self.saver.is_saving(text_area.file_path):
+                info_status = f"Saving...    {info_status}"
+            if loading != self.cancel_load_button_shown:
+                if loading: self.cancel_load_button.pack(side=tk.RIGHT, padx=4, pady=2)
+                else: self.cancel_load_button.pack_forget()
+                self.cancel_load_button_shown = loading
 
             # Selection count
             if text_area.tag_ranges(tk.SEL):
@@ -653,96 +3639,109 @@ class TextEditor:
         text_area = self.get_current_text_area()
         if text_area and hasattr(text_area, 'file_path') and text_area.file_path:
             base_name = os.path.basename(text_area.file_path)
-            self.root.title(f"Textra - {base_name}{' *' if self.unsaved_changes.get(self.get_current_tab_id()) else ''}")
+            self.root.title(f"Textra - {base_name}{' *' if self.tabs.is_dirty(self.get_current_tab_id()) else ''}")
         elif text_area:
             tab_text = self.notebook.tab(self.notebook.select(), 'text').replace("*","")
-            self.root.title(f"Textra - {tab_text}{' *' if self.unsaved_changes.get(self.get_current_tab_id()) else ''}")
+            self.root.title(f"Textra - {tab_text}{' *' if self.tabs.is_dirty(self.get_current_tab_id()) else ''}")
         else:
             self.root.title("Textra")
             
     def on_tab_changed(self, event=None):
-        self.update_window_title()
-        self.on_text_change() # This will update status bar and line numbers
+        tab_id = self.get_current_tab_id()
+        if self.tabs.is_lazy(tab_id): self.materialize_tab(tab_id)
+        if tab_id:
+            self.touch_tab(tab_id)
+            self.evict_idle_tabs()
         text_area = self.get_current_text_area()
+        if text_area and text_area.theme_generation != self.theme_generation:
+            self.restyle_text_area(text_area) # Theme changed while this tab was hidden
+        self.update_window_title()
+        self.on_text_change() # Schedules status bar, line numbers and bracket matching
         if text_area:
             text_area.focus_set()
             self.apply_word_wrap_to_current_tab() # Ensure wrap state is correct
-            self.handle_bracket_matching(None, text_area) # Update bracket matching for new tab
 
     def create_menu(self):
+        timed = self.perf.wrap # Handlers are only wrapped when instrumentation is on
         self.menu_bar = tk.Menu(self.root) # No special styling here, done in apply_theme
         self.root.config(menu=self.menu_bar)
 
         # File Menu
         self.file_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="File", menu=self.file_menu)
-        self.file_menu.add_command(label="New Tab", accelerator=self.get_accelerator("N"), command=self.new_file)
-        self.file_menu.add_command(label="Open...", accelerator=self.get_accelerator("O"), command=self.open_file)
+        self.file_menu.add_command(label="New Tab", accelerator=self.get_accelerator("N"), command=timed("menu:New Tab", self.new_file))
+        self.file_menu.add_command(label="Open...", accelerator=self.get_accelerator("O"), command=timed("menu:Open...", self.open_file))
         
         self.recent_files_menu = tk.Menu(self.file_menu, tearoff=0)
         self.file_menu.add_cascade(label="Open Recent", menu=self.recent_files_menu)
         self.populate_recent_files_menu()
         
         self.file_menu.add_separator()
-        self.file_menu.add_command(label="Save", accelerator=self.get_accelerator("S"), command=self.save_file)
-        self.file_menu.add_command(label="Save As...", accelerator=self.get_accelerator("Shift+S"), command=self.save_as_file)
-        self.file_menu.add_command(label="Save All", command=self.save_all_files)
+        self.file_menu.add_command(label="Save", accelerator=self.get_accelerator("S"), command=timed("menu:Save", self.save_file))
+        self.file_menu.add_command(label="Save As...", accelerator=self.get_accelerator("Shift+S"), command=timed("menu:Save As...", self.save_as_file))
+        self.file_menu.add_command(label="Save All", command=timed("menu:Save All", self.save_all_files))
         self.file_menu.add_separator()
-        self.file_menu.add_command(label="Close Tab", accelerator=self.get_accelerator("W"), command=self.close_current_tab)
-        self.file_menu.add_command(label="Close All Tabs", command=self.close_all_tabs)
+        self.file_menu.add_command(label="Close Tab", accelerator=self.get_accelerator("W"), command=timed("menu:Close Tab", self.close_current_tab))
+        self.file_menu.add_command(label="Close All Tabs", command=timed("menu:Close All Tabs", self.close_all_tabs))
         self.file_menu.add_separator()
-        self.file_menu.add_command(label="Exit", accelerator=self.get_accelerator("Q"), command=self.exit_editor)
+        self.file_menu.add_command(label="Exit", accelerator=self.get_accelerator("Q"), command=timed("menu:Exit", self.exit_editor))
 
         # Edit Menu
         self.edit_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Edit", menu=self.edit_menu)
-        self.edit_menu.add_command(label="Undo", accelerator=self.get_accelerator("Z"), command=self.edit_undo)
-        self.edit_menu.add_command(label="Redo", accelerator=self.get_accelerator_redo(), command=self.edit_redo)
+        self.edit_menu.add_command(label="Undo", accelerator=self.get_accelerator("Z"), command=timed("menu:Undo", self.edit_undo))
+        self.edit_menu.add_command(label="Redo", accelerator=self.get_accelerator_redo(), command=timed("menu:Redo", self.edit_redo))
         self.edit_menu.add_separator()
-        self.edit_menu.add_command(label="Cut", accelerator=self.get_accelerator("X"), command=self.edit_cut)
-        self.edit_menu.add_command(label="Copy", accelerator=self.get_accelerator("C"), command=self.edit_copy)
-        self.edit_menu.add_command(label="Paste", accelerator=self.get_accelerator("V"), command=self.edit_paste)
+        self.edit_menu.add_command(label="Cut", accelerator=self.get_accelerator("X"), command=timed("menu:Cut", self.edit_cut))
+        self.edit_menu.add_command(label="Copy", accelerator=self.get_accelerator("C"), command=timed("menu:Copy", self.edit_copy))
+        self.edit_menu.add_command(label="Paste", accelerator=self.get_accelerator("V"), command=timed("menu:Paste", self.edit_paste))
         self.edit_menu.add_separator()
-        self.edit_menu.add_command(label="Select All", accelerator=self.get_accelerator("A"), command=self.edit_select_all)
+        self.edit_menu.add_command(label="Select All", accelerator=self.get_accelerator("A"), command=timed("menu:Select All", self.edit_select_all))
         self.edit_menu.add_separator()
-        self.edit_menu.add_command(label="Go to Line...", accelerator=self.get_accelerator("G"), command=self.go_to_line)
+        self.edit_menu.add_command(label="Go to Line...", accelerator=self.get_accelerator("G"), command=timed("menu:Go to Line...", self.go_to_line))
 
         # Search Menu
         self.search_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Search", menu=self.search_menu)
-        self.search_menu.add_command(label="Find/Replace...", accelerator=self.get_accelerator("F"), command=self.show_find_replace_dialog)
-        self.search_menu.add_command(label="Find Next", accelerator="F3", command=lambda: self.find_next_occurrence(direction="down"))
-        self.search_menu.add_command(label="Find Previous", accelerator="Shift+F3", command=lambda: self.find_next_occurrence(direction="up"))
+        self.search_menu.add_command(label="Find/Replace...", accelerator=self.get_accelerator("F"), command=timed("menu:Find/Replace...", self.show_find_replace_dialog))
+        self.search_menu.add_command(label="Find Next", accelerator="F3", command=timed("menu:Find Next", lambda: self.find_next_occurrence(direction="down")))
+        self.search_menu.add_command(label="Find Previous", accelerator="Shift+F3", command=timed("menu:Find Previous", lambda: self.find_next_occurrence(direction="up")))
+        self.search_menu.add_separator()
+        self.search_menu.add_command(label="Find in Files...", accelerator=self.get_accelerator("Shift+F"), command=timed("menu:Find in Files...", self.show_find_in_files_dialog))
         
         # View Menu
         self.view_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="View", menu=self.view_menu)
         
         self.word_wrap_var = tk.BooleanVar(value=config.get("word_wrap", True))
-        self.view_menu.add_checkbutton(label="Word Wrap", variable=self.word_wrap_var, command=self.toggle_word_wrap)
+        self.view_menu.add_checkbutton(label="Word Wrap", variable=self.word_wrap_var, command=timed("menu:Word Wrap", self.toggle_word_wrap))
 
         self.theme_submenu = tk.Menu(self.view_menu, tearoff=0)
         self.view_menu.add_cascade(label="Themes", menu=self.theme_submenu)
         for theme_name_key in THEMES_DEFINITION.keys(): # Use THEMES_DEFINITION
-            self.theme_submenu.add_command(label=theme_name_key, command=lambda t=theme_name_key: self.apply_theme_globally(t))
+            self.theme_submenu.add_command(label=theme_name_key, command=timed("menu:Themes", lambda t=theme_name_key: self.apply_theme_globally(t)))
+        
+        self.view_menu.add_separator()
+        self.view_menu.add_command(label="Performance...", command=self.show_performance_overlay)
         
         # Tools Menu (placeholder for future, or for Font Settings)
         self.tools_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="Tools", menu=self.tools_menu)
-        self.tools_menu.add_command(label="Font Settings...", command=self.show_font_dialog)
+        self.tools_menu.add_command(label="Font Settings...", command=timed("menu:Font Settings...", self.show_font_dialog))
 
         # Keyboard shortcuts
         mod_key = "Command" if platform.system() == "Darwin" else "Control"
-        self.root.bind(f"<{mod_key}-n>", lambda e: self.new_file())
-        self.root.bind(f"<{mod_key}-o>", lambda e: self.open_file())
-        self.root.bind(f"<{mod_key}-s>", lambda e: self.save_file())
-        self.root.bind(f"<{mod_key}-Shift-s>", lambda e: self.save_as_file())
-        self.root.bind(f"<{mod_key}-w>", lambda e: self.close_current_tab())
-        self.root.bind(f"<{mod_key}-q>", lambda e: self.exit_editor())
-        self.root.bind(f"<{mod_key}-f>", lambda e: self.show_find_replace_dialog())
-        self.root.bind("<F3>", lambda e: self.find_next_occurrence(direction="down"))
-        self.root.bind("<Shift-F3>", lambda e: self.find_next_occurrence(direction="up"))
-        self.root.bind(f"<{mod_key}-g>", lambda e: self.go_to_line())
+        self.root.bind(f"<{mod_key}-n>", timed(f"key:<{mod_key}-n>", lambda e: self.new_file()))
+        self.root.bind(f"<{mod_key}-o>", timed(f"key:<{mod_key}-o>", lambda e: self.open_file()))
+        self.root.bind(f"<{mod_key}-s>", timed(f"key:<{mod_key}-s>", lambda e: self.save_file()))
+        self.root.bind(f"<{mod_key}-Shift-s>", timed(f"key:<{mod_key}-Shift-s>", lambda e: self.save_as_file()))
+        self.root.bind(f"<{mod_key}-w>", timed(f"key:<{mod_key}-w>", lambda e: self.close_current_tab()))
+        self.root.bind(f"<{mod_key}-q>", timed(f"key:<{mod_key}-q>", lambda e: self.exit_editor()))
+        self.root.bind(f"<{mod_key}-f>", timed(f"key:<{mod_key}-f>", lambda e: self.show_find_replace_dialog()))
+        self.root.bind(f"<{mod_key}-Shift-F>", timed(f"key:<{mod_key}-Shift-F>", lambda e: self.show_find_in_files_dialog()))
+        self.root.bind("<F3>", timed("key:<F3>", lambda e: self.find_next_occurrence(direction="down")))
+        self.root.bind("<Shift-F3>", timed("key:<Shift-F3>", lambda e: self.find_next_occurrence(direction="up")))
+        self.root.bind(f"<{mod_key}-g>", timed(f"key:<{mod_key}-g>", lambda e: self.go_to_line()))
         # Standard edit shortcuts are handled by Text widget or explicitly via menu commands for clarity
 
         # Apply theme to menus after all menus are created
@@ -751,48 +3750,18 @@ class TextEditor:
     def configure_menu_theme_colors(self):
         if not hasattr(self, 'menu_bar'): # Check if menu_bar itself exists
             return
-        
-        self.menu_bar.config(bg=current_theme_settings['menu_bg'], fg=current_theme_settings['menu_fg'],
-                             activebackground=current_theme_settings['menu_active_bg'],
-                             activeforeground=current_theme_settings['menu_active_fg'],
-                             relief=tk.FLAT, bd=0)
-        
-        # This inner function is fine as is, it operates on the 'menu' object passed to it.
-        def _configure_submenu(menu): 
-            menu.config(bg=current_theme_settings['menu_bg'], fg=current_theme_settings['menu_fg'],
-                        activebackground=current_theme_settings['menu_active_bg'],
-                        activeforeground=current_theme_settings['menu_active_fg'],
-                        relief=tk.FLAT, tearoff=0, bd=0)
-            # Iterate over menu items to style them individually if needed, especially for active state
-            for i in range(menu.index(tk.END) + 1 if menu.index(tk.END) is not None else 0):
-                item_type = menu.type(i)
-                if item_type == "cascade":
-                    # This cascades to submenus like recent_files_menu if 'menu' is file_menu
-                    submenu_widget_name = menu.entrycget(i, "menu")
-                    if submenu_widget_name: # Ensure the submenu actually exists
-                        submenu = menu.nametowidget(submenu_widget_name)
-                        _configure_submenu(submenu) 
-                elif item_type in ["command", "checkbutton", "radiobutton"]:
-                    # This styles individual items within the 'menu'
-                    # Note: Direct background styling of individual menu items might be limited by OS/theme
-                    menu.entryconfigure(i, 
-                                        activebackground=current_theme_settings['menu_active_bg'],
-                                        activeforeground=current_theme_settings['menu_active_fg']
-                                        # background=current_theme_settings['menu_bg'] # Often overridden by OS
-                                        )
-
-        # Check for existence of each top-level menu attribute before trying to configure it
-        if hasattr(self, 'file_menu'):
-            _configure_submenu(self.file_menu)
-        if hasattr(self, 'edit_menu'): # This check will prevent the AttributeError
-            _configure_submenu(self.edit_menu)
-        if hasattr(self, 'view_menu'):
-            _configure_submenu(self.view_menu)
-        if hasattr(self, 'search_menu'):
-            _configure_submenu(self.search_menu)
-        if hasattr(self, 'tools_menu'):
-            _configure_submenu(self.tools_menu)
-        # _configure_submenu(self.settings_menu) # If we add a dedicated settings menu
+        if not hasattr(self, 'themed_menus'):
+            # The menu tree is fixed once built; entries inherit their menu's colors
+            self.themed_menus, pending = [], [self.menu_bar]
+            while pending:
+                menu = pending.pop()
+                self.themed_menus.append(menu)
+                for i in range(menu.index(tk.END) + 1 if menu.index(tk.END) is not None else 0):
+                    if menu.type(i) == "cascade" and menu.entrycget(i, "menu"):
+                        pending.append(menu.nametowidget(menu.entrycget(i, "menu")))
+        options = self.get_compiled_theme()["menu"]
+        for menu in self.themed_menus:
+            menu.config(**options)
 
     def get_accelerator(self, key_char_combo):
         # key_char_combo can be "N", "Shift+S", etc.
@@ -840,60 +3809,285 @@ class TextEditor:
 
     def open_file(self, event=None, filepath=None): # Modified to accept filepath
         if not filepath:
-            filepath = filedialog.askopenfilename(
+            filepaths = filedialog.askopenfilenames(
                 defaultextension=".txt",
                 filetypes=[("Text Files", "*.txt"), ("Python Files", "*.py"), ("Markdown", "*.md"), ("All Files", "*.*")]
             )
+            if not filepaths: return
+            # Only the last file is loaded now; the others get lazy tabs
+            for path in filepaths[:-1]:
+                if not self.find_tab_for_path(path)[0]:
+                    self.add_lazy_tab(os.path.basename(path), file_path=path)
+                    self.add_recent_file(path)
+            filepath = filepaths[-1]
         if not filepath: return
 
-        for tab_id in self.notebook.tabs():
-            frame = self.notebook.nametowidget(tab_id)
-            content_frame = frame.winfo_children()[0]
-            text_area = content_frame.winfo_children()[1]
-            if hasattr(text_area, 'file_path') and text_area.file_path == filepath:
-                self.notebook.select(tab_id)
-                messagebox.showinfo("Info", f"{os.path.basename(filepath)} is already open.")
-                return
+        tab_id, _ = self.find_tab_for_path(filepath)
+        if tab_id:
+            self.select_tab(tab_id)
+            messagebox.showinfo("Info", f"{os.path.basename(filepath)} is already open.")
+            return
+
+        self.load_file_into_tab(filepath)
 
+    def load_file_into_tab(self, filepath, tab_frame=None):
+        """Opens filepath in a new tab (or the given empty one), picking the editor, the
+        streaming loader or the read-only viewer by size. Returns the text area or None."""
         try:
-            with open(filepath, "r", encoding='utf-8') as f:
-                content = f.read()
-            self.create_new_tab(title=os.path.basename(filepath), content=content, file_path=filepath)
+            self.file_watcher.watch(filepath) # Before reading, so a change made meanwhile isn't missed
+            file_size = os.path.getsize(filepath)
+            if file_size >= config.get("viewer_threshold_bytes", VIEWER_THRESHOLD_BYTES):
+                return self.open_file_viewer(filepath, tab_frame)
+            if file_size >= config.get("stream_open_threshold_bytes", STREAM_OPEN_THRESHOLD_BYTES):
+                with open(filepath, "rb") as f:
+                    prefix = f.read(LONG_LINE_SNIFF_BYTES)
+                text_format, _ = sniff_text_format(prefix)
+                return self.open_file_streaming(filepath, tab_frame, self.has_long_lines(prefix), text_format)
+            content, text_format = read_text_file(filepath)
+            if self.has_long_lines(content): # Rare; read again so the segmenting happens off the Tk thread
+                return self.open_file_streaming(filepath, tab_frame, long_lines=True, text_format=text_format)
+            return self.create_new_tab(title=os.path.basename(filepath), content=content, file_path=filepath,
+                                       tab_frame=tab_frame, text_format=text_format)
         except Exception as e:
             messagebox.showerror("Error Opening File", f"Could not open file: {e}")
+            if tab_frame is not None: # A lazy tab whose file went away
+                self.remove_tab(str(tab_frame))
+                if not self.notebook.tabs(): self.new_file()
+            return None
 
-    def save_file(self, event=None, text_area_to_save=None, tab_id_to_save=None):
+    def open_file_streaming(self, filepath, tab_frame=None, long_lines=False, text_format=None):
+        text_format = text_format or sniff_file_format(filepath)
+        text_area = self.create_new_tab(title=os.path.basename(filepath), file_path=filepath, tab_frame=tab_frame,
+                                        text_format=text_format)
+        text_area.journal.paused = True # The loaded text is the base, not an edit
+        segment_width = None
+        reformat_json = long_lines and self.should_reformat_json(filepath)
+        if long_lines:
+            segment_width = max(int(config.get("long_line_segment_chars", LONG_LINE_SEGMENT_CHARS)), 1)
+            if not reformat_json: self.enable_long_line_mode(text_area, segment_width)
+        text_area.loader = FileStreamLoader(text_area, filepath,
+                                            on_progress=self.on_load_progress, on_done=self.on_load_done,
+                                            segment_width=segment_width, reformat_json=reformat_json,
+                                            text_format=text_area.text_format)
+        text_area.loader.start()
+        self.refresh_scheduler.mark_dirty("status")
+        return text_area
+
+    def open_file_viewer(self, filepath, tab_frame=None):
+        viewer = MappedFileView(filepath)
+        text_area = self.create_new_tab(title=f"{os.path.basename(filepath)} (read-only)", file_path=filepath, tab_frame=tab_frame)
+        scrollbar = ttk.Scrollbar(text_area.master, orient=tk.VERTICAL, command=viewer.on_scrollbar)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text_area.viewer = viewer
+        text_area.highlighter.set_file_path(None) # Only a window of the file is ever in the widget
+        self.recovery.discard(text_area.journal) # Read-only, nothing to recover
+        viewer.attach(text_area, scrollbar)
+        self.poll_viewer_index(viewer)
+        self.refresh_scheduler.mark_dirty("status", "gutter", "syntax")
+        return text_area
+
+    def has_long_lines(self, data):
+        threshold = config.get("long_line_threshold", LONG_LINE_THRESHOLD)
+        return bool(threshold) and longest_line_length(data) >= threshold
+
+    def should_reformat_json(self, filepath):
+        if os.path.splitext(filepath)[1].lower() != ".json": return False
+        choice = config.get("long_line_reformat_json", "ask")
+        if choice != "ask": return bool(choice)
+        return messagebox.askyesno("Long Lines", f"{os.path.basename(filepath)} has very long lines.\n\n"
+                                   "Reformat the JSON with indentation? (No splits the lines for display only.)")
+
+    def enable_long_line_mode(self, text_area, segment_width):
+        """Switches a tab to showing its lines split by soft breaks (see LineSegmenter)."""
+        text_area.long_line_mode = segment_width
+        text_area.config(wrap=self.wrap_mode_for(text_area))
+        text_area.highlighter.set_file_path(None) # Tokens and strings would be cut at every soft break
+        self.recovery.discard(text_area.journal) # A replayed journal would turn soft breaks into real ones
+        text_area.bind("<<Copy>>", lambda e: self.copy_without_soft_breaks(text_area))
+        text_area.bind("<<Cut>>", lambda e: self.copy_without_soft_breaks(text_area, cut=True))
+        self.refresh_scheduler.mark_dirty("status", "syntax")
+
+    def copy_without_soft_breaks(self, text_area, cut=False):
+        if not text_area.tag_ranges(tk.SEL): return "break"
+        first, last = text_area.index(tk.SEL_FIRST), text_area.index(tk.SEL_LAST)
+        pieces, position = [], first
+        while True:
+            soft_break = text_area.tag_nextrange(SOFT_BREAK_TAG, position, last)
+            if not soft_break: break
+            pieces.append(text_area.get(position, soft_break[0]))
+            position = soft_break[1]
+        pieces.append(text_area.get(position, last))
+        self.root.clipboard_clear()
+        self.root.clipboard_append(''.join(pieces))
+        if cut: text_area.delete(first, last)
+        return "break"
+
+    # --- External Changes ---
+    def on_file_changed_on_disk(self, path, old, new):
+        """FileWatcher callback: reloads or extends clean tabs and asks before touching edited
+        ones. Returns False while the tab is busy, to be called again on a later tick."""
+        record = self.tabs.find_path(path)
+        if record is None or record.lazy: return True # Lazy tabs read the file when shown
+        text_area, tab_id = record.text_area, record.tab_id
+        if getattr(text_area, 'viewer', None): return True # Shows a fixed mapping of the file
+        if (self.is_loading(text_area) or self.saver.is_saving(path)
+                or getattr(text_area, 'replace_all_pending', False)):
+            return False
+        name = os.path.basename(path)
+        if new is None: # Deleted or moved away; a save would bring it back
+            text_area.journal.needs_snapshot = True
+            self.mark_tab_unsaved(tab_id)
+            return True
+        dirty = self.tabs.is_dirty(tab_id) or text_area.edit_modified()
+        if not dirty and old is not None and self.append_file_tail(text_area, path, old, new): return True
+        if dirty or not config.get("auto_reload_clean_tabs", True):
+            question = (f"{name} changed on disk. Reload it and lose your unsaved changes?" if dirty
+                        else f"{name} changed on disk. Reload it?")
+            if not messagebox.askyesno("File Changed", question):
+                text_area.journal.needs_snapshot = True # The journal's base file is gone
+                self.mark_tab_unsaved(tab_id) # The tab no longer matches the file
+                return True
+        self.reload_tab(tab_id, text_area)
+        return True
+
+    def reload_tab(self, tab_id, text_area):
+        # Rebuilt from disk the way an evicted tab is, keeping the cursor and scroll position
+        self.tabs.set_dirty(tab_id, False)
+        tab_text = self.notebook.tab(tab_id, "text")
+        if tab_text.endswith("*"): self.notebook.tab(tab_id, text=tab_text[:-1])
+        self.evict_tab(tab_id, text_area)
+        if tab_id == self.get_current_tab_id():
+            self.materialize_tab(tab_id)
+            self.on_tab_changed()
+        self.update_window_title()
+
+    def append_file_tail(self, text_area, path, old, new):
+        """Inserts only the bytes added to the end of path since the old signature. Returns
+        False when the change is not a plain append, or too large to take this way."""
+        (_, old_size, old_inode), (_, new_size, new_inode) = old, new
+        if (new_inode != old_inode or not 0 < old_size < new_size or getattr(text_area, 'long_line_mode', None)
+                or new_size - old_size > config.get("tail_append_limit_bytes", TAIL_APPEND_LIMIT_BYTES)):
+            return False
+        text_format = text_area.text_format
+        try:
+            # The end of the buffer, as stored on disk, must still sit right before the new bytes
+            tail = text_area.get(f"end-{TAIL_CHECK_CHARS + 1}c", "end-1c")
+            expected = tail.replace("\n", text_format.newline).encode(text_format.encoding)
+            start = old_size - len(expected)
+            if start < 0: return False
+            with open(path, "rb") as f:
+                f.seek(start)
+                data = f.read(new_size - start)
+            if not data.startswith(expected): return False
+            added = data[len(expected):].decode(text_format.encoding)
+        except (OSError, UnicodeError):
+            return False
+        if "\r" in added: added = added.replace("\r\n", "\n").replace("\r", "\n")
+        following = text_area.yview()[1] >= 1.0 # Keep tailing if the end was in view
+        undo = text_area.cget("undo")
+        text_area.journal.paused = True
+        text_area.config(undo=False) # Not an edit of ours to undo
+        text_area.insert("end-1c", added)
+        text_area.config(undo=undo)
+        text_area.edit_modified(False)
+        text_area.journal.paused = False
+        text_area.journal.reset(path)
+        if following: text_area.see("end-1c")
+        self.refresh_scheduler.mark_dirty("status", "gutter", "syntax", "brackets")
+        return True
+
+    def poll_viewer_index(self, viewer):
+        # Keep the status bar's indexing progress current until the line index is done
+        if viewer.closed.is_set(): return
+        if viewer.text_area is self.get_current_text_area():
+            self.refresh_scheduler.mark_dirty("status")
+        if not viewer.index_complete:
+            self.root.after(250, lambda: self.poll_viewer_index(viewer))
+
+    def is_loading(self, text_area):
+        loader = getattr(text_area, 'loader', None)
+        return loader is not None and not loader.done
+
+    def cancel_current_load(self):
+        text_area = self.get_current_text_area()
+        if text_area and self.is_loading(text_area):
+            text_area.loader.cancel()
+
+    def on_load_progress(self, loader):
+        if loader.text_area is self.get_current_text_area():
+            self.refresh_scheduler.mark_dirty("status", "gutter", "syntax")
+
+    def on_load_done(self, loader):
+        text_area = loader.text_area
+        tab_id = str(text_area.master.master) # Text -> content frame -> tab frame
+        filename = os.path.basename(loader.file_path)
+        text_area.journal.paused = False
+        if loader.error is not None or (loader.cancelled and not text_area.edit_modified()):
+            self.recovery.discard(text_area.journal)
+            if tab_id in self.notebook.tabs():
+                self.remove_tab(tab_id)
+                if not self.notebook.tabs(): self.new_file()
+            if loader.error is not None:
+                messagebox.showerror("Error Opening File", f"Could not open file: {loader.error}")
+        elif loader.cancelled:
+            # Edited before the load was cancelled: keep the text, but never let a save
+            # of the partial buffer overwrite the full file.
+            text_area.file_path = None
+            self.tabs.set_path(tab_id, None)
+            self.tabs.set_dirty(tab_id, True)
+            self.notebook.tab(tab_id, text=f"{filename} (partial)*")
+            text_area.journal.title = f"{filename} (partial)"
+            text_area.journal.needs_snapshot = True
+            self.update_window_title()
+        elif loader.reformatted: # The buffer no longer matches the file
+            text_area.journal.needs_snapshot = True
+            text_area.edit_modified(True)
+            self.mark_tab_unsaved(tab_id)
+        elif text_area.edit_modified(): # Typed into while loading
+            text_area.journal.needs_snapshot = True
+        else:
+            text_area.journal.reset(loader.file_path)
+        if loader.reformat_error is not None and loader.error is None:
+            # Segmented instead; the soft breaks are already in the buffer
+            self.enable_long_line_mode(text_area, loader.segment_width)
+            messagebox.showinfo("Long Lines", f"{filename} is not valid JSON ({loader.reformat_error}), "
+                                              "so its long lines were split for display instead.")
+        self.refresh_scheduler.mark_dirty("status", "gutter", "syntax", "brackets")
+
+    def save_file(self, event=None, text_area_to_save=None, tab_id_to_save=None, wait=False):
         current_text_area = text_area_to_save if text_area_to_save else self.get_current_text_area()
         if not current_text_area: return False
 
         current_tab_id = tab_id_to_save if tab_id_to_save else self.get_current_tab_id()
         current_file_path = getattr(current_text_area, 'file_path', None)
 
-        if current_file_path:
-            try:
-                content = current_text_area.get("1.0", tk.END).rstrip('\n') + '\n' # Ensure trailing newline
-                with open(current_file_path, "w", encoding='utf-8') as f:
-                    f.write(content)
-                
-                self.unsaved_changes[current_tab_id] = False
-                current_text_area.edit_modified(False)
-                tab_text = self.notebook.tab(current_tab_id, "text")
-                if tab_text.endswith("*"):
-                    self.notebook.tab(current_tab_id, text=tab_text[:-1])
-                self.update_window_title()
-                self.add_recent_file(current_file_path) # Update MRU
-                return True
-            except Exception as e:
-                messagebox.showerror("Error Saving File", f"Could not save file: {e}")
+        if self.is_loading(current_text_area):
+            messagebox.showwarning("Save", f"{os.path.basename(current_file_path)} is still loading.")
+            return False
+        if getattr(current_text_area, 'viewer', None):
+            messagebox.showinfo("Save", f"{os.path.basename(current_file_path)} is open in the read-only viewer.")
+            return False
+
+        if current_file_path and self.file_watcher.has_changed(current_file_path):
+            if not messagebox.askyesno("Save", f"{os.path.basename(current_file_path)} changed on disk since it was "
+                                               "opened. Overwrite it with this version?"):
                 return False
+        if current_file_path:
+            return self.start_save(current_text_area, current_tab_id, current_file_path, wait=wait)
         else:
-            return self.save_as_file(text_area_to_save=current_text_area, tab_id_to_save=current_tab_id)
+            return self.save_as_file(text_area_to_save=current_text_area, tab_id_to_save=current_tab_id, wait=wait)
 
-    def save_as_file(self, event=None, text_area_to_save=None, tab_id_to_save=None):
+    def save_as_file(self, event=None, text_area_to_save=None, tab_id_to_save=None, wait=False):
         current_text_area = text_area_to_save if text_area_to_save else self.get_current_text_area()
         if not current_text_area: return False
 
         current_tab_id = tab_id_to_save if tab_id_to_save else self.get_current_tab_id()
+        if self.is_loading(current_text_area):
+            messagebox.showwarning("Save As", "This file is still loading.")
+            return False
+        if getattr(current_text_area, 'viewer', None):
+            messagebox.showinfo("Save As", "Files open in the read-only viewer can't be saved from Textra.")
+            return False
         
         initial_filename = self.notebook.tab(current_tab_id, "text").replace("*","")
         if initial_filename.lower().startswith("untitled"):
@@ -906,37 +4100,100 @@ class TextEditor:
         )
         if not filepath: return False
 
-        try:
-            content = current_text_area.get("1.0", tk.END).rstrip('\n') + '\n'
-            with open(filepath, "w", encoding='utf-8') as f:
-                f.write(content)
-            
-            current_text_area.file_path = filepath
-            self.unsaved_changes[current_tab_id] = False
-            current_text_area.edit_modified(False)
-            self.notebook.tab(current_tab_id, text=os.path.basename(filepath))
-            self.update_window_title()
-            self.add_recent_file(filepath) # Update MRU
-            return True
-        except Exception as e:
-            messagebox.showerror("Error Saving File", f"Could not save file: {e}")
-            return False
+        current_text_area.file_path = filepath
+        self.tabs.set_path(current_tab_id, filepath)
+        current_text_area.bracket_index.set_file_path(filepath)
+        if not getattr(current_text_area, 'long_line_mode', None):
+            current_text_area.highlighter.set_file_path(filepath)
+        current_text_area.journal.title = os.path.basename(filepath)
+        # Unsaved under the new name until the write lands
+        self.tabs.set_dirty(current_tab_id, True)
+        self.notebook.tab(current_tab_id, text=os.path.basename(filepath) + "*")
+        self.update_window_title()
+        return self.start_save(current_text_area, current_tab_id, filepath, wait=wait)
+
+    def start_save(self, text_area, tab_id, file_path, wait=False, on_saved=None):
+        """Snapshots the buffer and writes it on a worker thread. Returns True once the
+        write is queued, or with wait=True, once it has succeeded."""
+        snapshot = text_area.document.snapshot() # Joined into one string by the writer thread
+        version = text_area.change_proxy.version
+        if getattr(text_area, 'long_line_mode', None):
+            soft_breaks = text_area.tag_ranges(SOFT_BREAK_TAG)[::2]
+            snapshot = WithoutSoftBreaks(snapshot, [snapshot.index_to_offset(str(index)) for index in soft_breaks])
+        outcome = {}
+        def on_done(error, superseded):
+            outcome["error"] = error
+            if superseded:
+                pass # Only the newest generation may clear the "*"; it reports on its own
+            elif error:
+                self.mark_tab_unsaved(tab_id)
+                messagebox.showerror("Error Saving File", f"Could not save {os.path.basename(file_path)}: {error}")
+            else:
+                self.search_index.invalidate_path(file_path)
+                self.file_watcher.watch(file_path) # Our own write, not an outside change
+                self.mark_tab_saved(text_area, tab_id, version)
+            self.refresh_scheduler.mark_dirty("status")
+            if on_saved: on_saved(error)
+        future = self.saver.submit(file_path, snapshot, on_done, fsync=config.get("fsync_on_save", True),
+                                   text_format=text_area.text_format)
+        self.add_recent_file(file_path) # Update MRU
+        self.refresh_scheduler.mark_dirty("status")
+        if not wait: return True
+        self.saver.wait([future])
+        return outcome.get("error") is None
+
+    def mark_tab_saved(self, text_area, tab_id, version):
+        if tab_id not in self.notebook.tabs(): return # Closed while writing
+        if text_area.change_proxy.version != version:
+            # Edited while writing, still unsaved; the journal's base file just changed under it
+            text_area.journal.needs_snapshot = True
+            return
+        text_area.journal.reset(text_area.file_path)
+        self.tabs.set_dirty(tab_id, False)
+        text_area.edit_modified(False)
+        tab_text = self.notebook.tab(tab_id, "text")
+        if tab_text.endswith("*"):
+            self.notebook.tab(tab_id, text=tab_text[:-1])
+        self.update_window_title()
+
+    def mark_tab_unsaved(self, tab_id):
+        if tab_id not in self.notebook.tabs(): return
+        self.tabs.set_dirty(tab_id, True)
+        tab_text = self.notebook.tab(tab_id, "text")
+        if not tab_text.endswith("*"):
+            self.notebook.tab(tab_id, text=tab_text + "*")
 
     def save_all_files(self):
-        saved_any = False
-        for tab_id in list(self.notebook.tabs()): # Iterate over a copy
+        # Files with a path are written concurrently; untitled tabs each need a Save As dialog
+        outcome = {"pending": 0, "saved": 0, "failed": [], "queued": False}
+        def report():
+            if outcome["failed"]:
+                messagebox.showwarning("Save All", f"Could not save {', '.join(outcome['failed'])}. Save All operation may be incomplete.")
+            elif outcome["saved"]:
+                messagebox.showinfo("Save All", "All changed files saved.")
+        def saved_callback(name):
+            def on_saved(error):
+                outcome["pending"] -= 1
+                if error: outcome["failed"].append(name)
+                else: outcome["saved"] += 1
+                if outcome["queued"] and not outcome["pending"]: report()
+            return on_saved
+
+        for tab_id, text_area in list(self.iter_text_areas()): # Lazy tabs are never unsaved
+            file_path = getattr(text_area, 'file_path', None)
+            if file_path and not self.tabs.is_dirty(tab_id): continue
+            name = self.notebook.tab(tab_id, "text").rstrip("*")
+            if file_path and not self.is_loading(text_area) and not getattr(text_area, 'viewer', None):
+                outcome["pending"] += 1
+                self.start_save(text_area, tab_id, file_path, on_saved=saved_callback(name))
+                continue
             self.notebook.select(tab_id) # Switch to tab to ensure context
-            frame = self.notebook.nametowidget(tab_id)
-            content_frame = frame.winfo_children()[0]
-            text_area = content_frame.winfo_children()[1]
-            if self.unsaved_changes.get(tab_id, False) or not getattr(text_area, 'file_path', None):
-                if self.save_file(text_area_to_save=text_area, tab_id_to_save=tab_id):
-                    saved_any = True
-                else: # Save was cancelled or failed for this tab
-                    messagebox.showwarning("Save All", f"Could not save {self.notebook.tab(tab_id,'text')}. Save All operation may be incomplete.")
-                    # Optionally break or ask user if they want to continue saving others
-        if saved_any:
-            messagebox.showinfo("Save All", "All changed files saved.")
+            if self.save_file(text_area_to_save=text_area, tab_id_to_save=tab_id, wait=True):
+                outcome["saved"] += 1
+            else: # Save was cancelled or failed for this tab
+                outcome["failed"].append(name)
+        outcome["queued"] = True
+        if not outcome["pending"]: report()
 
 
     def close_current_tab(self, event=None):
@@ -945,16 +4202,20 @@ class TextEditor:
             if not self.notebook.tabs(): self.exit_editor(force_close_if_empty=True)
             return
 
-        if self.unsaved_changes.get(current_tab_id, False):
+        if self.tabs.is_dirty(current_tab_id):
             text_area = self.get_current_text_area()
             filename = os.path.basename(getattr(text_area, 'file_path', None) or self.notebook.tab(current_tab_id, "text").replace("*",""))
             response = messagebox.askyesnocancel("Unsaved Changes", f"Do you want to save changes to {filename}?")
             if response is True: # Yes
-                if not self.save_file(): return # Save failed or was cancelled
+                if not self.save_file(wait=True): return # Save failed or was cancelled
             elif response is None: return # Cancel
-        
-        self.notebook.forget(current_tab_id)
-        if current_tab_id in self.unsaved_changes: del self.unsaved_changes[current_tab_id]
+
+        text_area = self.get_current_text_area()
+        if text_area and self.is_loading(text_area):
+            text_area.loader.on_done = None # The tab is going away anyway
+            text_area.loader.cancel()
+        if text_area: self.recovery.discard(text_area.journal)
+        self.remove_tab(current_tab_id)
         
         if not self.notebook.tabs():
             self.update_window_title()
@@ -962,7 +4223,20 @@ class TextEditor:
         else:
             self.on_tab_changed() # To update title and focus
 
+    def remove_tab(self, tab_id):
+        """Takes a tab out of the notebook and destroys its widgets. Destroying them is what
+        closes a viewer's memory map and file handle (see MappedFileView.attach)."""
+        self.notebook.forget(tab_id)
+        self.tabs.remove(tab_id)
+        self.notebook.nametowidget(tab_id).destroy()
+
     def close_all_tabs(self):
+        # Lazy tabs have nothing to save; drop them first so closing the others doesn't build them
+        for tab_id in self.tabs.lazy_tab_ids():
+            self.remove_tab(tab_id)
+        if not self.notebook.tabs():
+            self.exit_editor(force_close_if_empty=True)
+            return
         # Iterate backwards because closing modifies the list of tabs
         for tab_id in reversed(list(self.notebook.tabs())):
             self.notebook.select(tab_id) # Bring tab to front
@@ -976,7 +4250,12 @@ class TextEditor:
 
     def exit_editor(self, event=None, force_close_if_empty=False):
         if force_close_if_empty and not self.notebook.tabs():
+            self.save_session()
             save_config(config)
+            self.stop_find_in_files()
+            self.saver.wait() # Let in-flight saves land before quitting
+            self.recovery.shutdown()
+            self.file_watcher.shutdown()
             self.root.quit()
             return
 
@@ -984,11 +4263,9 @@ class TextEditor:
         tabs_to_save_ids = []
 
         for tab_id in self.notebook.tabs():
-            if self.unsaved_changes.get(tab_id, False):
+            if self.tabs.is_dirty(tab_id):
                 tabs_to_save_ids.append(tab_id)
-                frame = self.notebook.nametowidget(tab_id)
-                content_frame = frame.winfo_children()[0]
-                text_area = content_frame.winfo_children()[1]
+                text_area = self.get_text_area_for_tab(tab_id)
                 filename = os.path.basename(getattr(text_area, 'file_path', None) or self.notebook.tab(tab_id, "text").replace("*",""))
                 pending_saves_filenames.append(filename)
 
@@ -1001,10 +4278,8 @@ class TextEditor:
             if response is True: # Yes, save
                 for tab_id in tabs_to_save_ids:
                     self.notebook.select(tab_id)
-                    frame = self.notebook.nametowidget(tab_id)
-                    content_frame = frame.winfo_children()[0]
-                    text_area = content_frame.winfo_children()[1]
-                    if not self.save_file(text_area_to_save=text_area, tab_id_to_save=tab_id):
+                    text_area = self.get_text_area_for_tab(tab_id)
+                    if not self.save_file(text_area_to_save=text_area, tab_id_to_save=tab_id, wait=True):
                         messagebox.showwarning("Exit Cancelled", f"Could not save {self.notebook.tab(tab_id,'text')}. Exiting cancelled.")
                         return # Don't exit
                 # All successfully saved
@@ -1012,9 +4287,117 @@ class TextEditor:
                 return
             # If False (No, don't save), proceed to quit
         
+        self.save_session()
         save_config(config) # Save settings like theme, font, recent files
+        self.stop_find_in_files()
+        self.saver.wait() # Let in-flight saves land before quitting
+        self.recovery.shutdown()
+        self.file_watcher.shutdown()
         self.root.quit()
 
+    # --- Session ---
+    def save_session(self):
+        """Records the open files, their cursor and scroll positions and the active tab in the config."""
+        tabs, active = [], None
+        current = self.get_current_tab_id()
+        for tab_id in self.notebook.tabs():
+            record = self.tabs.get(tab_id)
+            if record is None: continue
+            document = record.lazy
+            if document is not None:
+                file_path, cursor, yview = document.file_path, document.cursor, document.yview
+            else:
+                text_area = record.text_area
+                if text_area is None: continue
+                file_path, cursor, yview = text_area.file_path, text_area.index(tk.INSERT), text_area.yview()[0]
+            if not file_path: continue # Untitled text is covered by crash recovery, not the session
+            if tab_id == current: active = len(tabs)
+            tabs.append({"path": file_path, "cursor": cursor, "yview": round(yview, 6)})
+        config["session"] = {"tabs": tabs, "active": active or 0}
+
+    def restore_session(self):
+        """Reopens the tabs of the last session. Only the active one is read now; the rest
+        are lazy tabs read when first shown. Returns True if any tab was restored."""
+        session = config.get("session")
+        if not config.get("restore_session", True) or not isinstance(session, dict): return False
+        entries = session.get("tabs") or []
+        active, active_index = None, session.get("active", 0)
+        for i, entry in enumerate(entries):
+            file_path = entry.get("path") if isinstance(entry, dict) else None
+            if not file_path or not os.path.isfile(file_path): continue
+            tab_id, _ = self.find_tab_for_path(file_path) # Already restored from a journal
+            if tab_id is None:
+                tab_id = self.add_lazy_tab(os.path.basename(file_path), file_path, None,
+                                           entry.get("cursor", "1.0"), entry.get("yview", 0.0))
+            if active is None or i <= active_index: active = tab_id
+        if active is None: return False
+        self.select_tab(active)
+        self.update_window_title()
+        return True
+
+    # --- Crash Recovery ---
+    def restore_from_journals(self):
+        """Offers to rebuild tabs from journals left by a crash. Returns True if any tab was restored."""
+        orphans = self.recovery.find_orphans()
+        if not orphans: return False
+        titles = "\n - ".join(header.get("title", "Untitled") for _, header, _ in orphans)
+        if not messagebox.askyesno("Recover Unsaved Work",
+                                   f"Textra did not shut down cleanly. Restore unsaved changes in:\n - {titles}"):
+            for journal_path, _, _ in orphans: _remove_quietly(journal_path)
+            return False
+
+        restored, failed = 0, []
+        for journal_path, header, records in orphans:
+            title = header.get("title", "Untitled")
+            base = header.get("base", {"kind": "empty"})
+            content = self.read_journal_base(base)
+            if content is None:
+                failed.append(title)
+                continue
+            text_area = self.create_new_tab(title=title, content=content, file_path=base.get("path"),
+                                            text_format=sniff_file_format(base.get("path")))
+            # Replay straight into the widget, then let the per-tab engines resync once
+            proxy = text_area.change_proxy
+            replayed = True
+            try:
+                for record in records:
+                    if record[0] == "i": proxy.call("insert", record[1], record[2])
+                    else: proxy.call("delete", record[1], record[2])
+            except (tk.TclError, IndexError):
+                replayed = False
+                failed.append(title)
+            journal = text_area.journal
+            journal.paused = True
+            proxy.invalidate()
+            journal.paused = False
+            if replayed:
+                journal.base, journal.records, journal.rewrite = base, records, True
+                _remove_quietly(journal_path)
+            else: # Keep the original journal; the new one starts from what's actually in the buffer
+                journal.needs_snapshot = True
+            text_area.edit_reset()
+            text_area.edit_modified(True)
+            self.mark_tab_unsaved(self.get_current_tab_id())
+            restored += 1
+        if failed:
+            messagebox.showwarning("Recover Unsaved Work",
+                                   "Could not fully restore:\n - " + "\n - ".join(failed) +
+                                   "\nTheir files changed on disk since, or the journal is damaged."
+                                   f"\nTheir journals were kept in {RECOVERY_DIR}.")
+        return restored > 0
+
+    def read_journal_base(self, base):
+        # Text the journal's records apply to, or None if a file base changed since
+        if base["kind"] == "text": return base["text"]
+        if base["kind"] != "file": return ""
+        try:
+            file_stat = os.stat(base["path"])
+            if (file_stat.st_mtime, file_stat.st_size) != (base["mtime"], base["size"]): return None
+            content, _ = read_text_file(base["path"])
+        except (OSError, UnicodeDecodeError, KeyError):
+            return None
+        return content
+
     # --- Recent Files ---
     def add_recent_file(self, filepath):
         if filepath in config["recent_files"]:
@@ -1036,7 +4419,67 @@ class TextEditor:
                     display_name = "..." + filepath[-67:]
                 self.recent_files_menu.add_command(label=f"{i+1}. {display_name}", 
                                                  command=lambda fp=filepath: self.open_file(filepath=fp))
-        self.configure_menu_theme_colors() # Re-apply theme to this dynamic menu
+
+    # --- Performance Overlay ---
+    def show_performance_overlay(self):
+        if not self.perf.enabled:
+            messagebox.showinfo("Performance",
+                                "Handler timing is off. Start Textra with --instrument, or set "
+                                "\"instrumentation\": true in textra_config.json, to collect it.")
+            return
+        if self.performance_dialog and self.performance_dialog.winfo_exists():
+            self.performance_dialog.lift()
+            return
+
+        dialog = tk.Toplevel(self.root)
+        self.performance_dialog = dialog
+        dialog.title("Performance")
+        dialog.transient(self.root)
+        dialog.geometry("720x420")
+        dialog.configure(bg=current_theme_settings['bg'])
+        dialog.bind('<Escape>', lambda e: dialog.destroy())
+
+        main_fr = ttk.Frame(dialog, padding=10)
+        main_fr.pack(expand=True, fill=tk.BOTH)
+        status_label = ttk.Label(main_fr, text="")
+        status_label.pack(fill=tk.X, pady=(0, 5))
+
+        columns = ("calls", "p50", "p99", "max", "tcl")
+        table = ttk.Treeview(main_fr, columns=("name",) + columns, show="headings")
+        table.heading("name", text="Handler")
+        table.column("name", width=260)
+        for column, heading in zip(columns, ("Calls", "p50 ms", "p99 ms", "Max ms", "Tcl calls/call")):
+            table.heading(column, text=heading)
+            table.column(column, width=80, anchor=tk.E, stretch=False)
+        table.pack(fill=tk.BOTH, expand=True)
+
+        def save_trace():
+            path = filedialog.asksaveasfilename(parent=dialog, defaultextension=".json", initialfile="textra_trace.json",
+                                                filetypes=[("Trace Files", "*.json"), ("All Files", "*.*")])
+            if not path: return
+            try:
+                count = self.perf.write_trace(path)
+            except OSError as e:
+                messagebox.showerror("Save Trace", f"Could not write trace: {e}", parent=dialog)
+                return
+            messagebox.showinfo("Save Trace", f"Wrote {count} events. Open the file in chrome://tracing or ui.perfetto.dev.", parent=dialog)
+
+        button_frame = ttk.Frame(main_fr)
+        button_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(button_frame, text="Reset", command=self.perf.reset).pack(side=tk.LEFT, padx=3)
+        ttk.Button(button_frame, text="Save Trace...", command=save_trace).pack(side=tk.LEFT, padx=3)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.RIGHT, padx=3)
+
+        def refresh():
+            if not dialog.winfo_exists(): return
+            lag = self.perf.loop_lag
+            status_label.config(text=f"Queued callbacks: {self.perf.pending_callbacks()}    "
+                                     f"Event-loop lag p50/p99: {percentile(lag, 0.5) * 1000:.1f} / {percentile(lag, 0.99) * 1000:.1f} ms")
+            table.delete(*table.get_children())
+            for name, calls, p50, p99, longest, tcl_calls in self.perf.summary():
+                table.insert("", tk.END, values=(name, calls, f"{p50:.2f}", f"{p99:.2f}", f"{longest:.2f}", f"{tcl_calls:.1f}"))
+            dialog.after(1000, refresh)
+        refresh()
 
     # --- Go To Line ---
     def go_to_line(self, event=None):
@@ -1047,13 +4490,23 @@ class TextEditor:
         if line_num_str:
             try:
                 line_num = int(line_num_str)
-                total_lines = int(text_area.index('end-1c').split('.')[0])
+                viewer = getattr(text_area, 'viewer', None)
+                if viewer:
+                    total_lines = viewer.line_count()
+                    if not 1 <= line_num <= total_lines:
+                        messagebox.showwarning("Invalid Line", f"Line number must be between 1 and {total_lines}.")
+                    elif not viewer.go_to_line(line_num):
+                        messagebox.showinfo("Go To Line", "That part of the file is still being indexed, try again shortly.")
+                    else:
+                        text_area.focus_set()
+                        self.refresh_scheduler.mark_dirty("status", "gutter", "syntax", "brackets")
+                    return
+                total_lines = self.get_line_count(text_area)
                 if 1 <= line_num <= total_lines:
                     text_area.mark_set(tk.INSERT, f"{line_num}.0")
                     text_area.see(f"{line_num}.0")
                     text_area.focus_set()
-                    self.update_status_bar()
-                    self.redraw_line_numbers()
+                    self.refresh_scheduler.mark_dirty("status", "gutter", "syntax", "brackets")
                 else:
                     messagebox.showwarning("Invalid Line", f"Line number must be between 1 and {total_lines}.")
             except ValueError:
@@ -1134,13 +4587,11 @@ class TextEditor:
                 self.editor_font.config(family=new_family, size=new_size)
                 config["font_family"] = new_family
                 config["font_size"] = new_size
-                for tab_id in self.notebook.tabs():
-                    frame = self.notebook.nametowidget(tab_id)
-                    content_frame = frame.winfo_children()[0]
-                    text_area = content_frame.winfo_children()[1]
-                    line_numbers = content_frame.winfo_children()[0]
+                for tab_id, text_area in self.iter_text_areas():
+                    line_numbers = text_area.line_numbers_canvas
                     text_area.config(font=self.editor_font, tabs=(self.editor_font.measure('    ')))
-                    self.redraw_line_numbers(text_area, line_numbers)
+                    text_area.gutter.font_changed()
+                    self.redraw_line_numbers(text_area, line_numbers, force=True)
                 font_dialog.destroy()
             except tk.TclError as e:
                 messagebox.showerror("Font Error", f"Could not apply font: {e}", parent=font_dialog)
@@ -1175,7 +4626,12 @@ class TextEditor:
     def apply_word_wrap_to_current_tab(self):
         text_area = self.get_current_text_area()
         if text_area:
-            text_area.config(wrap=tk.WORD if config["word_wrap"] else tk.NONE)
+            text_area.config(wrap=self.wrap_mode_for(text_area))
+
+    def wrap_mode_for(self, text_area):
+        if not config["word_wrap"]: return tk.NONE
+        # Segments of a long line are mostly one "word"; WORD wrap would re-scan each for break points
+        return tk.CHAR if getattr(text_area, 'long_line_mode', None) else tk.WORD
 
 
     # --- Auto Indentation ---
@@ -1215,63 +4671,14 @@ class TextEditor:
     def handle_bracket_matching(self, event, text_area):
         text_area.tag_remove("bracket_match", "1.0", tk.END) # Clear previous matches
 
-        # Get char before cursor
-        cursor_index = text_area.index(tk.INSERT)
-        char_before_cursor_index = text_area.index(f"{cursor_index}-1c")
-        char_before = text_area.get(char_before_cursor_index)
-
-        # Get char at cursor (or after if at end of line)
-        char_at_cursor = text_area.get(cursor_index)
-
-        brackets = {'(': ')', '[': ']', '{': '}'}
-        closing_brackets = {v: k for k, v in brackets.items()}
-
-        def find_match(start_char, start_index, direction):
-            match_char = brackets.get(start_char) or closing_brackets.get(start_char)
-            if not match_char: return None
-
-            level = 1
-            current_index = text_area.index(f"{start_index}{direction}1c") # Move one char in direction
-
-            while True:
-                if direction == '+': # Searching forward
-                    if text_area.compare(current_index, ">=", tk.END): break
-                else: # Searching backward
-                    if text_area.compare(current_index, "<=", "1.0"): break
-                
-                char_at_current = text_area.get(current_index)
-
-                if char_at_current == start_char: # e.g. another '(' when searching for ')'
-                    level += 1
-                elif char_at_current == match_char:
-                    level -= 1
-                    if level == 0:
-                        return current_index
-                
-                current_index = text_area.index(f"{current_index}{direction}1c")
-            return None
-
-        match_found_indices = []
+        bracket_index = getattr(text_area, 'bracket_index', None)
+        if bracket_index is None: return
 
-        # Check character before cursor
-        if char_before in brackets: # Opening bracket
-            match_index = find_match(char_before, char_before_cursor_index, '+')
-            if match_index: match_found_indices = [char_before_cursor_index, match_index]
-        elif char_before in closing_brackets: # Closing bracket
-            match_index = find_match(char_before, char_before_cursor_index, '-')
-            if match_index: match_found_indices = [char_before_cursor_index, match_index]
-        
-        # If no match from char_before, try char_at_cursor (useful if cursor is just before an opening bracket)
-        if not match_found_indices:
-            if char_at_cursor in brackets:
-                match_index = find_match(char_at_cursor, cursor_index, '+')
-                if match_index: match_found_indices = [cursor_index, match_index]
-            elif char_at_cursor in closing_brackets:
-                match_index = find_match(char_at_cursor, cursor_index, '-')
-                if match_index: match_found_indices = [cursor_index, match_index]
-
-        if match_found_indices:
-            for idx in match_found_indices:
+        line, col = map(int, text_area.index(tk.INSERT).split('.'))
+        total_lines = self.get_line_count(text_area)
+        match = bracket_index.match_at(text_area.change_proxy, line, col, total_lines)
+        if match:
+            for idx in match:
                 text_area.tag_add("bracket_match", idx, f"{idx}+1c")
 
 
@@ -1320,10 +4727,10 @@ class TextEditor:
         options_frame = ttk.Frame(main_fr)
         options_frame.grid(row=2, column=0, columnspan=3, pady=5, sticky=tk.W)
         
-        self.current_find_options["match_case"] = tk.BooleanVar(value=self.current_find_options.get("match_case_val", False))
+        self.current_find_options["match_case"] = tk.BooleanVar(value=self.current_find_options["match_case"].get())
         ttk.Checkbutton(options_frame, text="Match Case", variable=self.current_find_options["match_case"]).pack(side=tk.LEFT, padx=3)
         
-        self.current_find_options["regex"] = tk.BooleanVar(value=self.current_find_options.get("regex_val", False))
+        self.current_find_options["regex"] = tk.BooleanVar(value=self.current_find_options["regex"].get())
         ttk.Checkbutton(options_frame, text="Regex", variable=self.current_find_options["regex"]).pack(side=tk.LEFT, padx=3)
         
         direction_frame = ttk.Frame(main_fr) # Separate frame for radio buttons
@@ -1356,10 +4763,267 @@ class TextEditor:
         self.find_dialog.geometry(f"+{x}+{y}")
 
 
+    # --- Find in Files ---
+    def show_find_in_files_dialog(self):
+        if self.find_in_files_dialog and self.find_in_files_dialog.winfo_exists():
+            self.find_in_files_dialog.lift()
+            self.fif_find_entry.focus_set()
+            return
+
+        dialog = tk.Toplevel(self.root)
+        self.find_in_files_dialog = dialog
+        dialog.title("Find in Files")
+        dialog.transient(self.root)
+        dialog.geometry("760x520")
+        dialog.protocol("WM_DELETE_WINDOW", self._close_find_in_files_dialog)
+        dialog.configure(bg=current_theme_settings['bg'])
+        dialog.bind('<Escape>', lambda e: self._close_find_in_files_dialog())
+
+        main_fr = ttk.Frame(dialog, padding=10)
+        main_fr.pack(expand=True, fill=tk.BOTH)
+        main_fr.columnconfigure(1, weight=1)
+
+        ttk.Label(main_fr, text="Find:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        self.fif_find_entry = ttk.Entry(main_fr)
+        self.fif_find_entry.grid(row=0, column=1, columnspan=2, sticky=tk.EW, pady=2, padx=5)
+        self.fif_find_entry.insert(0, self.current_find_options["text"])
+
+        ttk.Label(main_fr, text="Folder:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        self.fif_folder_entry = ttk.Entry(main_fr)
+        self.fif_folder_entry.grid(row=1, column=1, sticky=tk.EW, pady=2, padx=5)
+        current_text_area = self.get_current_text_area()
+        start_folder = os.path.dirname(current_text_area.file_path) if current_text_area and current_text_area.file_path else os.getcwd()
+        self.fif_folder_entry.insert(0, config.get("find_in_files_folder", start_folder))
+        def browse():
+            folder = filedialog.askdirectory(parent=dialog, initialdir=self.fif_folder_entry.get() or None)
+            if folder:
+                self.fif_folder_entry.delete(0, tk.END)
+                self.fif_folder_entry.insert(0, folder)
+        ttk.Button(main_fr, text="Browse...", command=browse).grid(row=1, column=2, pady=2)
+
+        ttk.Label(main_fr, text="Include:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        self.fif_include_entry = ttk.Entry(main_fr)
+        self.fif_include_entry.grid(row=2, column=1, columnspan=2, sticky=tk.EW, pady=2, padx=5)
+        self.fif_include_entry.insert(0, config.get("find_in_files_include", ""))
+
+        ttk.Label(main_fr, text="Exclude:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        self.fif_exclude_entry = ttk.Entry(main_fr)
+        self.fif_exclude_entry.grid(row=3, column=1, columnspan=2, sticky=tk.EW, pady=2, padx=5)
+        self.fif_exclude_entry.insert(0, config.get("find_in_files_exclude", FIND_IN_FILES_DEFAULT_EXCLUDES))
+
+        options_frame = ttk.Frame(main_fr)
+        options_frame.grid(row=4, column=0, columnspan=3, pady=5, sticky=tk.W)
+        self.fif_match_case = tk.BooleanVar(value=self.current_find_options["match_case"].get())
+        ttk.Checkbutton(options_frame, text="Match Case", variable=self.fif_match_case).pack(side=tk.LEFT, padx=3)
+        self.fif_regex = tk.BooleanVar(value=self.current_find_options["regex"].get())
+        ttk.Checkbutton(options_frame, text="Regex", variable=self.fif_regex).pack(side=tk.LEFT, padx=3)
+        self.fif_open_tabs = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Include Open Tabs", variable=self.fif_open_tabs).pack(side=tk.LEFT, padx=3)
+        self.fif_use_index = tk.BooleanVar(value=config.get("find_in_files_use_index", True))
+        ttk.Checkbutton(options_frame, text="Use Index", variable=self.fif_use_index).pack(side=tk.LEFT, padx=3)
+
+        button_frame = ttk.Frame(main_fr)
+        button_frame.grid(row=5, column=0, columnspan=3, pady=(5,5), sticky=tk.EW)
+        ttk.Button(button_frame, text="Search", command=self.start_find_in_files).pack(side=tk.LEFT, padx=3)
+        ttk.Button(button_frame, text="Stop", command=self.stop_find_in_files).pack(side=tk.LEFT, padx=3)
+        self.fif_status_label = ttk.Label(button_frame, text="")
+        self.fif_status_label.pack(side=tk.LEFT, padx=10)
+
+        results_frame = ttk.Frame(main_fr)
+        results_frame.grid(row=6, column=0, columnspan=3, sticky=tk.NSEW)
+        main_fr.rowconfigure(6, weight=1)
+        self.fif_results = ttk.Treeview(results_frame, columns=("text",), show="tree headings")
+        self.fif_results.heading("#0", text="Location")
+        self.fif_results.heading("text", text="Text")
+        self.fif_results.column("#0", width=260, stretch=False)
+        scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.fif_results.yview)
+        self.fif_results.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.fif_results.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.fif_results.bind("<Double-1>", self._open_find_in_files_result)
+        self.fif_results.bind("<Return>", self._open_find_in_files_result)
+        self.fif_result_locations = {} # Treeview item: (path or tab id, line, column, match length)
+
+        self.fif_find_entry.bind("<Return>", lambda e: self.start_find_in_files())
+        self.fif_find_entry.focus_set()
+
+    def _close_find_in_files_dialog(self):
+        self.stop_find_in_files()
+        if self.find_in_files_dialog and self.find_in_files_dialog.winfo_exists():
+            self.find_in_files_dialog.destroy()
+        self.find_in_files_dialog = None
+
+    def stop_find_in_files(self):
+        if self.find_in_files_search: self.find_in_files_search["cancel"].set()
+
+    def start_find_in_files(self):
+        self.stop_find_in_files()
+        search_term = self.fif_find_entry.get()
+        root_dir = self.fif_folder_entry.get().strip()
+        if not search_term:
+            messagebox.showwarning("Find in Files", "Please enter text to find.", parent=self.find_in_files_dialog)
+            return
+        if root_dir and not os.path.isdir(root_dir):
+            messagebox.showwarning("Find in Files", f"{root_dir} is not a folder.", parent=self.find_in_files_dialog)
+            return
+        pattern = search_term if self.fif_regex.get() else re.escape(search_term)
+        flags = re.MULTILINE | (0 if self.fif_match_case.get() else re.IGNORECASE)
+        try:
+            regex = re.compile(pattern, flags)
+        except re.error as e:
+            messagebox.showerror("Regex Error", f"Invalid regular expression: {e}", parent=self.find_in_files_dialog)
+            return
+        includes = split_globs(self.fif_include_entry.get())
+        excludes = split_globs(self.fif_exclude_entry.get())
+        config["find_in_files_folder"] = root_dir
+        config["find_in_files_include"] = self.fif_include_entry.get()
+        config["find_in_files_exclude"] = self.fif_exclude_entry.get()
+
+        # Open tabs are searched from their buffers, which may hold unsaved edits,
+        # and their files are skipped on disk.
+        snapshots, open_paths = [], []
+        if self.fif_open_tabs.get():
+            for tab_id, text_area in self.iter_text_areas(): # Lazy tabs are clean, so disk is current
+                if getattr(text_area, 'viewer', None) or self.is_loading(text_area): continue
+                if text_area.file_path: open_paths.append(text_area.file_path)
+                snapshots.append((tab_id, text_area.document.snapshot()))
+
+        self.fif_results.delete(*self.fif_results.get_children())
+        self.fif_result_locations = {}
+        self.fif_file_nodes = {}
+        self.fif_status_label.config(text="Searching...")
+        search = {"cancel": threading.Event(), "queue": queue.Queue(), "hits": 0, "files": 0}
+        self.find_in_files_search = search
+        # The index skips its own excludes, so it only answers when the query excludes them too
+        index_excludes = split_globs(config.get("search_index_exclude", SEARCH_INDEX_DEFAULT_EXCLUDES))
+        use_index = bool(root_dir) and self.fif_use_index.get() and set(index_excludes) <= set(excludes)
+        config["find_in_files_use_index"] = self.fif_use_index.get()
+        threading.Thread(target=self._find_in_files_worker, daemon=True,
+                         args=(search, root_dir, includes, excludes, open_paths, snapshots, regex, use_index)).start()
+        self.root.after(50, lambda: self._poll_find_in_files(search))
+
+    def _find_in_files_worker(self, search, root_dir, includes, excludes, open_paths, snapshots, regex, use_index):
+        # Coordinator thread: feeds file batches to a process pool and streams hits to the UI queue
+        results, cancel = search["queue"], search["cancel"]
+        index_excludes = split_globs(config.get("search_index_exclude", SEARCH_INDEX_DEFAULT_EXCLUDES))
+        try:
+            for tab_id, snapshot in snapshots:
+                if cancel.is_set(): break
+                results.put(("hits", search_text_for_hits(tab_id, snapshot.text(), regex, FIND_IN_FILES_MAX_HITS), 0))
+            if not root_dir or cancel.is_set(): return
+            paths = None
+            if use_index:
+                # Always brought up to date first: a walk with one stat per file, re-reading only
+                # files created or changed outside the editor, so the candidates can't be stale
+                self.search_index.refresh(root_dir, index_excludes, cancel,
+                    lambda done, total: results.put(("indexing", (done, total), 0)))
+                if cancel.is_set(): return
+                candidates = self.search_index.candidates(root_dir, regex.pattern, regex.flags)
+                if candidates is not None:
+                    skip = {os.path.abspath(p) for p in open_paths}
+                    paths = [p for p in candidates
+                             if p not in skip and search_path_allowed(root_dir, p, includes, excludes)]
+            if paths is None:
+                paths = iter_search_files(root_dir, includes, excludes, open_paths)
+            pool = make_worker_pool()
+            try:
+                for hits, file_count in run_in_batches(pool, search_files_worker, paths, FIND_IN_FILES_BATCH,
+                                                       cancel, regex.pattern, regex.flags):
+                    results.put(("hits", hits, file_count))
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+        except Exception as e:
+            results.put(("error", e, 0))
+        finally:
+            results.put(("done", None, 0))
+
+    def _poll_find_in_files(self, search):
+        if search is not self.find_in_files_search: return # Superseded by a newer search
+        if not (self.find_in_files_dialog and self.find_in_files_dialog.winfo_exists()):
+            search["cancel"].set()
+            return
+        finished = False
+        try:
+            for _ in range(50): # Bound the UI work per tick
+                kind, payload, file_count = search["queue"].get_nowait()
+                search["files"] += file_count
+                if kind == "hits":
+                    self._add_find_in_files_hits(search, payload)
+                elif kind == "indexing":
+                    search["indexing"] = payload
+                elif kind == "error":
+                    messagebox.showerror("Find in Files", f"Search failed: {payload}", parent=self.find_in_files_dialog)
+                else:
+                    finished = True
+                    break
+        except queue.Empty:
+            pass
+        if search["hits"] >= FIND_IN_FILES_MAX_HITS: search["cancel"].set()
+        state = "Stopped" if search["cancel"].is_set() and finished else "Done" if finished else "Searching..."
+        if not finished and search.get("indexing") and not search["files"]:
+            state = "Indexing {} of {} files...".format(*search["indexing"])
+        self.fif_status_label.config(text=f"{state}  {search['hits']} matches in {search['files']} files")
+        if finished:
+            self.find_in_files_search = None
+        else:
+            self.root.after(50, lambda: self._poll_find_in_files(search))
+
+    def _add_find_in_files_hits(self, search, hits):
+        root_dir = self.fif_folder_entry.get().strip()
+        for location, line_no, col, line_text in hits:
+            if search["hits"] >= FIND_IN_FILES_MAX_HITS: return
+            node = self.fif_file_nodes.get(location)
+            if node is None:
+                if location in self.notebook.tabs(): # Hit from an open tab's buffer
+                    label = self.notebook.tab(location, "text")
+                else:
+                    label = os.path.relpath(location, root_dir) if root_dir else location
+                node = self.fif_results.insert("", tk.END, text=label, open=True)
+                self.fif_file_nodes[location] = node
+            item = self.fif_results.insert(node, tk.END, text=f"{line_no}:{col + 1}", values=(line_text.strip(),))
+            self.fif_result_locations[item] = (location, line_no, col)
+            search["hits"] += 1
+
+    def _open_find_in_files_result(self, event=None):
+        selection = self.fif_results.selection()
+        if not selection or selection[0] not in self.fif_result_locations: return
+        location, line_no, col = self.fif_result_locations[selection[0]]
+        if location in self.notebook.tabs():
+            text_area = self.select_tab(location)
+        else:
+            text_area = self.open_file_at(location)
+        if not text_area: return
+        viewer = getattr(text_area, 'viewer', None)
+        if viewer:
+            viewer.go_to_line(line_no)
+        else:
+            index = f"{line_no}.{col}"
+            text_area.mark_set(tk.INSERT, index)
+            text_area.see(index)
+        text_area.focus_set()
+        self.refresh_scheduler.mark_dirty("status", "gutter", "syntax", "brackets")
+
+    def open_file_at(self, filepath):
+        # Like open_file, but switches to an already open tab without a message
+        tab_id, _ = self.find_tab_for_path(filepath)
+        if tab_id: return self.select_tab(tab_id)
+        self.open_file(filepath=filepath)
+        return self.find_tab_for_path(filepath)[1]
+
+    def find_tab_for_path(self, filepath):
+        # The text area is None for a lazy tab
+        record = self.tabs.find_path(filepath)
+        if record is None: return None, None
+        return record.tab_id, record.text_area
+
     def _clear_find_highlights_and_close_dialog(self, event=None):
         text_area = self.get_current_text_area()
         if text_area:
             text_area.tag_remove("found", "1.0", tk.END) # Clear all "found" tags
+            text_area.tag_remove("search_hit", "1.0", tk.END)
+            text_area.find_engine.clear()
+            text_area.find_engine.has_hit_tags = False
+            self.refresh_scheduler.mark_dirty("status")
         if self.find_dialog and self.find_dialog.winfo_exists():
             self.find_dialog.destroy()
         self.find_dialog = None
@@ -1395,83 +5059,134 @@ class TextEditor:
         nocase = not self.current_find_options["match_case"].get()
         use_regex = self.current_find_options["regex"].get()
 
+        if getattr(text_area, 'viewer', None):
+            self.find_in_viewer(text_area, search_term, direction, nocase, use_regex, from_dialog)
+            return
+
+        engine = text_area.find_engine
+        parent = self.find_dialog if self.find_dialog and self.find_dialog.winfo_exists() else self.root
+        try:
+            match_count = engine.search(text_area.change_proxy, search_term, not nocase, use_regex)
+        except re.error as e:
+            messagebox.showerror("Regex Error", f"Invalid regular expression: {e}", parent=parent)
+            return
+        if not match_count:
+            if from_dialog: messagebox.showinfo("Find", f"'{search_term}' not found.", parent=parent)
+            else: self.root.bell()
+            self.refresh_scheduler.mark_dirty("status", "search_hits")
+            return
+
+        start_index = text_area.index(tk.INSERT)
         if direction == "down":
-            start_index = text_area.index(tk.INSERT)
             # If there's a selection and we're searching down, start after the selection
-            if text_area.tag_ranges(tk.SEL):
-                sel_end_index = text_area.index(tk.SEL_END)
-                # Check if current insert position is within or at start of selection, to avoid re-finding same.
-                if text_area.compare(start_index, "<", sel_end_index):
-                    start_index = sel_end_index
-            
-            end_index = tk.END
-            count_var = tk.IntVar()
-            pos = text_area.search(search_term, start_index, stopindex=end_index, nocase=nocase, regexp=use_regex, count=count_var)
-        else: # up
-            start_index = text_area.index(tk.INSERT)
+            if text_area.tag_ranges(tk.SEL) and text_area.compare(start_index, "<", tk.SEL_LAST):
+                start_index = text_area.index(tk.SEL_LAST)
+        else:
             # If there's a selection and we're searching up, start before the selection
-            if text_area.tag_ranges(tk.SEL):
-                 sel_start_index = text_area.index(tk.SEL_FIRST)
-                 # Check if current insert position is within or at end of selection
-                 if text_area.compare(start_index, ">", sel_start_index):
-                     start_index = sel_start_index
-
-            end_index = "1.0"
-            count_var = tk.IntVar()
-            pos = text_area.search(search_term, start_index, stopindex=end_index, nocase=nocase, regexp=use_regex, backwards=True, count=count_var)
-
-        if pos:
-            match_len = count_var.get()
-            if match_len == 0 and use_regex: # Regex might match zero-length string
-                 # Try to advance one char and search again if zero-length match
-                adv_idx = text_area.index(f"{pos}{'+1c' if direction == 'down' else '-1c'}")
-                if text_area.compare(adv_idx, "!=", pos): # Ensure we can advance
-                    return self.find_next_occurrence(direction=direction) # Recurse, starting from next char
-                else: # Cannot advance, probably at end/start of doc
-                    if from_dialog: messagebox.showinfo("Find", f"'{search_term}' not found.", parent=self.find_dialog)
-                    return
+            if text_area.tag_ranges(tk.SEL) and text_area.compare(start_index, ">", tk.SEL_FIRST):
+                start_index = text_area.index(tk.SEL_FIRST)
 
-            end_pos = f"{pos}+{match_len}c"
-            text_area.tag_remove(tk.SEL, "1.0", tk.END) # Remove current selection
-            text_area.tag_add(tk.SEL, pos, end_pos)    # Select the found text
-            text_area.tag_add("found", pos, end_pos)   # Optionally highlight it too (e.g., yellow bg)
-            text_area.mark_set(tk.INSERT, pos if direction=="up" else end_pos) # Move cursor to start/end of find
-            text_area.see(pos)
-            text_area.focus_set()
-            if hasattr(text_area.tag_cget("found", "background"),'string') and not text_area.tag_cget("found", "background"):
-                 text_area.tag_config("found", background=current_theme_settings.get('select_bg', "yellow"), 
-                                             foreground=current_theme_settings.get('select_fg', None)) # Ensure 'found' tag is visible
-        else:
-            if from_dialog:
-                messagebox.showinfo("Find", f"'{search_term}' not found.", parent=self.find_dialog if self.find_dialog and self.find_dialog.winfo_exists() else self.root)
-            # Optional: Beep or status bar message if not found from F3/Shift+F3
-            # Wrap search:
-            wrapped_search_msg_shown = getattr(self, "_wrapped_search_msg_shown", False) # Track if msg shown in this search session
-            if not wrapped_search_msg_shown:
-                if from_dialog:
-                    do_wrap = messagebox.askyesno("Find", "Reached end of document. Wrap around?", parent=self.find_dialog if self.find_dialog and self.find_dialog.winfo_exists() else self.root)
-                else: # F3/Shift+F3 - maybe just wrap automatically or based on a setting
-                    do_wrap = True # For now, auto-wrap for F3
-                
-                if do_wrap:
-                    new_start = "1.0" if direction == "down" else tk.END
-                    text_area.mark_set(tk.INSERT, new_start)
-                    setattr(self, "_wrapped_search_msg_shown", True) # Mark that we are now in a wrapped search attempt
-                    self.find_next_occurrence(direction=direction, from_dialog=from_dialog) # Try again from start/end
-                    return # Important: return after recursive call
-            
-            # If we reach here, it means either wrap was no, or wrap also found nothing.
-            if from_dialog: 
-                pass # Message already shown or will be by recursive call's end
-            elif wrapped_search_msg_shown : # F3/Shift+F3 and wrapped search failed
-                self.root.bell() # Simple feedback
-            
-            delattr(self, "_wrapped_search_msg_shown") # Reset for next fresh search
+        number, wrapped = engine.next_match(self.index_to_offset(text_area, start_index), direction == "down")
+        if wrapped and from_dialog:
+            if not messagebox.askyesno("Find", "Reached end of document. Wrap around?", parent=parent):
+                engine.current = 0
+                return
 
+        start_offset, end_offset = engine.span(number)
+        pos = self.offset_to_index(text_area, start_offset)
+        end_pos = self.offset_to_index(text_area, end_offset)
+        text_area.tag_remove(tk.SEL, "1.0", tk.END) # Remove current selection
+        text_area.tag_add(tk.SEL, pos, end_pos)    # Select the found text
+        text_area.tag_add("found", pos, end_pos)
+        text_area.mark_set(tk.INSERT, pos if direction=="up" else end_pos) # Move cursor to start/end of find
+        text_area.see(pos)
+        text_area.focus_set()
+        if not text_area.tag_cget("found", "background"):
+            text_area.tag_config("found", background=current_theme_settings.get('select_bg', "yellow"),
+                                 foreground=current_theme_settings.get('select_fg', None)) # Ensure 'found' tag is visible
+        self.refresh_scheduler.mark_dirty("status", "gutter", "syntax", "search_hits")
+
+    def refresh_search_hits(self):
+        text_area = self.get_current_text_area()
+        if not text_area or getattr(text_area, 'viewer', None): return
+        engine = text_area.find_engine
+        if engine.has_hit_tags:
+            text_area.tag_remove("search_hit", "1.0", tk.END)
+            engine.has_hit_tags = False
+        if not engine.active: return
+
+        if engine.is_stale(text_area.change_proxy):
+            # Edited since the last search: re-match just the visible lines instead of the whole
+            # buffer on every keystroke; the next Find Next/Previous recomputes all the spans
+            first_index = text_area.index("@0,0 linestart")
+            last_index = text_area.index(f"@{text_area.winfo_width()},{text_area.winfo_height()} lineend")
+            matches = engine.regex.finditer(text_area.change_proxy.get(first_index, last_index))
+            for match in itertools.islice(matches, engine.MAX_VIEWPORT_HITS):
+                if match.end() == match.start(): continue
+                text_area.tag_add("search_hit", f"{first_index}+{match.start()}c", f"{first_index}+{match.end()}c")
+                engine.has_hit_tags = True
+            return
+        first = self.index_to_offset(text_area, "@0,0")
+        last = self.index_to_offset(text_area, f"@{text_area.winfo_width()},{text_area.winfo_height()} lineend")
+        for i in engine.spans_between(first, last + 1):
+            text_area.tag_add("search_hit", self.offset_to_index(text_area, engine.starts[i]),
+                              self.offset_to_index(text_area, engine.ends[i]))
+            engine.has_hit_tags = True
+
+    def find_in_viewer(self, text_area, search_term, direction, nocase, use_regex, from_dialog):
+        viewer = text_area.viewer
+        forward = direction == "down"
+        parent = self.find_dialog if from_dialog and self.find_dialog and self.find_dialog.winfo_exists() else self.root
+        try:
+            regex = MappedFileView.compile_search(search_term, nocase, use_regex)
+        except re.error as e:
+            messagebox.showerror("Regex Error", f"Invalid regular expression: {e}", parent=parent)
+            return
+        line, col = map(int, text_area.index(tk.INSERT).split('.'))
+        offset = viewer.offset_of(line, col)
+        # The scan can cover gigabytes, so it runs on a worker like Find in Files
+        search = object()
+        viewer.search = search
+        results = queue.Queue()
+        def work():
+            try:
+                span = viewer.find(regex, offset, forward)
+                if span is None: # Wrap around
+                    span = viewer.find(regex, 0 if forward else viewer.size, forward)
+                results.put(span)
+            except Exception as e: # Includes the map being closed with its tab
+                results.put(e)
+        threading.Thread(target=work, daemon=True).start()
+
+        def poll():
+            try:
+                span = results.get_nowait()
+            except queue.Empty:
+                self.root.after(20, poll)
+                return
+            if viewer.search is not search or viewer.closed.is_set(): return # Superseded or tab closed
+            viewer.search = None
+            if isinstance(span, Exception):
+                messagebox.showerror("Find", f"Search failed: {span}", parent=parent)
+                return
+            if span is None:
+                if from_dialog: messagebox.showinfo("Find", f"'{search_term}' not found.", parent=parent)
+                else: self.root.bell()
+                return
+            viewer.select_span(span, forward)
+            if text_area.tag_cget("found", "background") == "":
+                text_area.tag_config("found", background=current_theme_settings.get('select_bg', "yellow"),
+                                     foreground=current_theme_settings.get('select_fg', None))
+            text_area.focus_set()
+            self.refresh_scheduler.mark_dirty("status", "gutter", "syntax")
+        self.root.after(20, poll)
 
     def replace_occurrence(self):
         text_area = self.get_current_text_area()
         if not text_area: return
+        if getattr(text_area, 'viewer', None):
+            messagebox.showinfo("Replace", "This file is open in the read-only viewer.", parent=self.find_dialog)
+            return
         self._update_find_options_from_dialog() # Get latest text
 
         replace_term = self.replace_entry.get()
@@ -1483,7 +5198,7 @@ class TextEditor:
 
         if text_area.tag_ranges(tk.SEL): # If something is selected
             sel_start = text_area.index(tk.SEL_FIRST)
-            sel_end = text_area.index(tk.SEL_END)
+            sel_end = text_area.index(tk.SEL_LAST)
             selected_text = text_area.get(sel_start, sel_end)
             
             # Verify if selected text actually matches the search criteria (important for regex, case)
@@ -1516,6 +5231,10 @@ class TextEditor:
     def replace_all_occurrences(self):
         text_area = self.get_current_text_area()
         if not text_area: return
+        if getattr(text_area, 'viewer', None):
+            messagebox.showinfo("Replace All", "This file is open in the read-only viewer.", parent=self.find_dialog)
+            return
+        if getattr(text_area, 'replace_all_pending', False): return # One at a time per tab
         self._update_find_options_from_dialog()
 
         search_term = self.current_find_options["text"]
@@ -1525,68 +5244,89 @@ class TextEditor:
             messagebox.showwarning("Replace All", "Please enter text to find.", parent=self.find_dialog)
             return
 
-        content = text_area.get("1.0", tk.END)
-        nocase = not self.current_find_options["match_case"].get()
+        match_case = self.current_find_options["match_case"].get()
         use_regex = self.current_find_options["regex"].get()
-        
-        replacements_count = 0
-        if use_regex:
+        try:
+            regex = text_area.find_engine.compile(search_term, match_case, use_regex)
+        except re.error as e:
+            messagebox.showerror("Regex Error", f"Invalid regular expression: {e}", parent=self.find_dialog)
+            return
+
+        text_area.replace_all_pending = True
+        self.refresh_scheduler.mark_dirty("status")
+        self._start_replace_all(text_area, regex, replace_term, use_regex, attempts_left=3)
+
+    def _start_replace_all(self, text_area, regex, replace_term, use_regex, attempts_left):
+        # Matching runs on a worker; only the snapshot and the final edit touch the UI thread
+        proxy = text_area.change_proxy
+        snapshot, version = text_area.document.snapshot(), proxy.version
+        results = queue.Queue()
+        def work():
+            try: results.put(compute_replacement_spans(snapshot.text(), regex, replace_term, use_regex))
+            except Exception as e: results.put(e)
+        threading.Thread(target=work, daemon=True).start()
+
+        def poll():
             try:
-                flags = 0 if nocase else re.IGNORECASE # re.IGNORECASE means nocase=True
-                # When using re.sub with user input for replacement_string,
-                # be mindful of backreferences like \1, \g<name>.
-                # For simple replacement, this is fine. For complex, might need to escape replace_term.
-                new_content, replacements_count = re.subn(search_term, replace_term, content, flags=flags)
-            except re.error as e:
-                messagebox.showerror("Regex Error", f"Invalid regular expression: {e}", parent=self.find_dialog)
+                outcome = results.get_nowait()
+            except queue.Empty:
+                self.root.after(20, poll)
                 return
-        else:
-            # Manual replace for non-regex to handle nocase
-            new_content = []
-            last_pos = 0
-            search_len = len(search_term)
-            
-            s_term_to_use = search_term if nocase else search_term.lower()
-            c_to_use_for_search = content if nocase else content.lower()
-
-            start_find_idx = 0
-            while True:
-                idx = c_to_use_for_search.find(s_term_to_use, start_find_idx)
-                if idx == -1:
-                    new_content.append(content[last_pos:])
-                    break
-                new_content.append(content[last_pos:idx])
-                new_content.append(replace_term)
-                last_pos = idx + search_len
-                start_find_idx = idx + search_len # search from after this match
-                replacements_count += 1
-            new_content = "".join(new_content)
-
-
-        if replacements_count > 0:
-            # Preserve cursor and scroll position if possible (tricky with full replace)
-            # current_cursor = text_area.index(tk.INSERT)
-            # current_scroll = text_area.yview()
-
-            text_area.delete("1.0", tk.END)
-            text_area.insert("1.0", new_content)
-            text_area.edit_modified(True) # Mark as modified
-            self.on_text_change() # Update status, line numbers etc.
-            messagebox.showinfo("Replace All", f"Replaced {replacements_count} occurrence(s).", parent=self.find_dialog)
-            
-            # text_area.mark_set(tk.INSERT, current_cursor) # May not be valid
-            # text_area.yview_moveto(current_scroll[0])
-        else:
-            messagebox.showinfo("Replace All", "No occurrences found.", parent=self.find_dialog)
-        
+            if not text_area.winfo_exists(): return
+            if isinstance(outcome, Exception):
+                text_area.replace_all_pending = False
+                messagebox.showerror("Replace All", f"Replace All failed: {outcome}", parent=self.find_dialog)
+            elif proxy.version != version and attempts_left > 1:
+                # The buffer was edited while matching; the spans are stale
+                self._start_replace_all(text_area, regex, replace_term, use_regex, attempts_left - 1)
+            elif proxy.version != version:
+                text_area.replace_all_pending = False
+                messagebox.showwarning("Replace All", "The document kept changing, Replace All was not applied.", parent=self.find_dialog)
+            else:
+                self._apply_replacements(text_area, outcome)
+            self.refresh_scheduler.mark_dirty("status")
+        self.root.after(20, poll)
+
+    def _apply_replacements(self, text_area, spans):
+        text_area.replace_all_pending = False
+        parent = self.find_dialog if self.find_dialog and self.find_dialog.winfo_exists() else self.root
+        if not spans:
+            messagebox.showinfo("Replace All", "No occurrences found.", parent=parent)
+            return
+
+        proxy = text_area.change_proxy
+        # Marks follow the text, so the cursor stays put; one for the top of the view too
+        text_area.mark_set("replace_all_top", "@0,0")
+        text_area.mark_gravity("replace_all_top", tk.LEFT)
+        text_area.config(autoseparators=False)
+        text_area.edit_separator()
+        proxy.suspended = True
+        try:
+            # Back to front, so the indices computed from the snapshot stay valid
+            for start, end, replacement in reversed(spans):
+                text_area.replace(start, end, replacement)
+        finally:
+            proxy.suspended = False
+            text_area.edit_separator()
+            text_area.config(autoseparators=True)
+        proxy.invalidate() # Resync stats, line and bracket indices in one go
+        text_area.yview("replace_all_top")
+        text_area.mark_unset("replace_all_top")
         text_area.tag_remove("found", "1.0", tk.END) # Clear any highlights
+        text_area.edit_modified(True) # Mark as modified
+        self.on_text_change() # Update status, line numbers etc.
+        messagebox.showinfo("Replace All", f"Replaced {len(spans)} occurrence(s).", parent=parent)
 
 
 if __name__ == "__main__":
+    profiler = StartupProfiler() if "--profile-startup" in sys.argv[1:] else None
+    load_settings() # Creates the theme file on first run
+    if profiler: profiler.mark("config and themes")
     root = tk.Tk()
-    # Ensure config and theme files can be loaded/created before app starts
-    if not os.path.exists(THEME_FILE): load_themes_definition()
-    if not os.path.exists(CONFIG_FILE): load_config()
-    
-    app = TextEditor(root)
+    if profiler: profiler.mark("Tk root")
+    app = TextEditor(root, profiler=profiler, instrument=True if "--instrument" in sys.argv[1:] else None)
+    if profiler:
+        root.update() # First paint
+        profiler.mark("first paint")
+        print(profiler.report())
     root.mainloop()
\ No newline at end of file